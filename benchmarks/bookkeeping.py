@@ -0,0 +1,103 @@
+import time
+import logging
+
+import click
+
+from slurm_utils.convenience.log import init_logging
+from slurm_utils.execution.trial_state import TrialRegistry, RUNNING
+
+
+class SyntheticProcess:
+    """Stand-in for a Popen object which exits after a fixed number of polls."""
+    __slots__ = ("polls_left", "returncode")
+
+    def __init__(self, num_polls: int):
+        self.polls_left = num_polls
+        self.returncode = None
+
+    def poll(self):
+        self.polls_left -= 1
+        if self.polls_left <= 0:
+            self.returncode = 0
+        return self.returncode
+
+
+class SyntheticTrial:
+    __slots__ = ("id",)
+
+    def __init__(self, trial_id: int):
+        self.id = trial_id
+
+
+def run_dict_scheduler(num_trials: int, num_slots: int, num_polls: int):
+    """Bookkeeping of the JobScheduler before the TrialRegistry, one dict per trial which is scanned every tick."""
+    processes = {}
+
+    def num_processes_running():
+        return sum([1 for proc in processes.values() if proc["is_active"] == "is_running"])
+
+    def poll_processes():
+        for run_id, process_dict in processes.items():
+            if process_dict["process"].poll() is not None and process_dict["is_active"] == "is_running":
+                process_dict["is_active"] = "is_finished"
+
+    for run_id in range(num_trials):
+        while num_processes_running() >= num_slots:
+            poll_processes()
+        processes[run_id] = {
+            "process": SyntheticProcess(num_polls),
+            "file": None,
+            "start_time": time.time(),
+            "trial": SyntheticTrial(run_id),
+            "is_active": "is_running"
+        }
+
+    while not all([proc["is_active"] == "is_finished" for proc in processes.values()]):
+        poll_processes()
+
+
+def run_registry_scheduler(num_trials: int, num_slots: int, num_polls: int):
+    processes = TrialRegistry()
+
+    def poll_processes():
+        for entry in processes.running():
+            if entry.process.poll() is not None and entry.is_active == RUNNING:
+                processes.finish(entry.run_id, time_in_secs=0.0, returncode=entry.process.returncode)
+
+    for run_id in range(num_trials):
+        while processes.num_running >= num_slots:
+            poll_processes()
+        processes.add(
+            run_id=run_id, trial=SyntheticTrial(run_id), process=SyntheticProcess(num_polls), file=None,
+            start_time=time.time()
+        )
+
+    while processes.num_active() > 0:
+        poll_processes()
+
+
+@click.command()
+@click.option("--sizes", "sizes", default="1000,10000,100000", help="Comma separated numbers of trials.")
+@click.option("--slots", "num_slots", default=64, help="Number of concurrent slots.")
+@click.option("--polls", "num_polls", default=3, help="Number of polls until a synthetic trial exits.")
+@click.option("--dict_max_size", "dict_max_size", default=10000, help="Largest sweep run with the dict bookkeeping.")
+def benchmark_bookkeeping(sizes, num_slots, num_polls, dict_max_size):
+    """Scheduler CPU time spent on trial bookkeeping for growing sweeps."""
+    init_logging(logging.INFO)
+
+    for num_trials in [int(size) for size in sizes.split(",")]:
+        start_time = time.process_time()
+        run_registry_scheduler(num_trials, num_slots, num_polls)
+        registry_time = time.process_time() - start_time
+        logging.info(f"{num_trials} trials, registry: {registry_time:.3f}s CPU")
+
+        if num_trials > dict_max_size:
+            continue
+        start_time = time.process_time()
+        run_dict_scheduler(num_trials, num_slots, num_polls)
+        dict_time = time.process_time() - start_time
+        logging.info(f"{num_trials} trials, dict scan: {dict_time:.3f}s CPU ({dict_time / registry_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    benchmark_bookkeeping()
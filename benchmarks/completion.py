@@ -0,0 +1,71 @@
+import time
+import logging
+import subprocess
+
+import click
+
+from slurm_utils.convenience.log import init_logging
+from slurm_utils.execution.completion import CompletionWatcher
+
+
+def run_trials(num_trials: int, num_slots: int, duration: float, watcher: CompletionWatcher = None):
+    """Runs `num_trials` sleeping processes on `num_slots` slots and returns the makespan.
+
+    Without a watcher the slots are refilled by the polling loop the JobScheduler used before,
+    i.e. poll all processes and sleep one second.
+    """
+    pending = list(range(num_trials))
+    running = {}
+
+    start_time = time.time()
+    while len(pending) > 0 or len(running) > 0:
+        while len(pending) > 0 and len(running) < num_slots:
+            trial_id = pending.pop(0)
+            process = subprocess.Popen(["sleep", str(duration)])
+            running[trial_id] = process
+            if watcher is not None:
+                watcher.register(trial_id, process)
+
+        if watcher is not None:
+            watcher.wait()
+        else:
+            time.sleep(1)
+
+        for trial_id, process in list(running.items()):
+            if process.poll() is not None:
+                running.pop(trial_id)
+                if watcher is not None:
+                    watcher.unregister(trial_id)
+
+    return time.time() - start_time
+
+
+def summarize(name: str, makespan: float, num_trials: int, num_slots: int, duration: float):
+    busy_time = num_trials * duration
+    idle_time = num_slots * makespan - busy_time
+    logging.info(
+        f"{name}: makespan {makespan:.2f}s, slot idle time {idle_time:.2f}s "
+        f"({100 * idle_time / (num_slots * makespan):.1f}% of the allocation), "
+        f"{idle_time / num_trials:.3f}s per trial"
+    )
+
+
+@click.command()
+@click.option("--trials", "num_trials", default=40, help="Number of synthetic trials.")
+@click.option("--slots", "num_slots", default=4, help="Number of concurrent slots.")
+@click.option("--duration", "duration", default=0.5, help="Runtime of a single trial in seconds.")
+def benchmark_completion(num_trials, num_slots, duration):
+    """Compare slot idle time of the polling loop with the pidfd based completion watcher."""
+    init_logging(logging.INFO)
+
+    makespan = run_trials(num_trials, num_slots, duration)
+    summarize("polling loop", makespan, num_trials, num_slots, duration)
+
+    watcher = CompletionWatcher()
+    makespan = run_trials(num_trials, num_slots, duration, watcher=watcher)
+    watcher.close()
+    summarize("completion watcher", makespan, num_trials, num_slots, duration)
+
+
+if __name__ == '__main__':
+    benchmark_completion()
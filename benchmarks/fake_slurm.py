@@ -0,0 +1,75 @@
+import os
+import sys
+
+from slurm_utils.execution import nodes
+from slurm_utils.execution.workspace import TrialWorkspace
+
+# runs the step on the node of --nodelist, exports the variables of --export, `FAKE_SRUN_DELAY` seconds of step
+# creation are simulated before the command starts
+SRUN = """#!/bin/bash
+# stand-in for srun, see benchmarks.fake_slurm
+NODE=${FAKE_SLURM_NODE:-node1}
+while [ $# -gt 0 ]; do
+    case "$1" in
+        --export=*)
+            IFS=',' read -ra VARIABLES <<< "${1#--export=}"
+            for VARIABLE in "${VARIABLES[@]}"; do
+                [ "$VARIABLE" != "ALL" ] && export "$VARIABLE"
+            done
+            ;;
+        --nodelist=*) NODE="${1#--nodelist=}" ;;
+        -*) ;;
+        *) break ;;
+    esac
+    shift
+done
+[ -n "$FAKE_SLURM_LOG" ] && echo "srun $NODE $*" >> "$FAKE_SLURM_LOG"
+[ -n "$FAKE_SRUN_DELAY" ] && sleep "$FAKE_SRUN_DELAY"
+export SLURMD_NODENAME=$NODE
+export SLURM_STEP_ID=$$
+exec "$@"
+"""
+
+# prints "Submitted batch job <id>" and runs the script right away in the background, as if the allocation started
+SBATCH = """#!{python}
+# stand-in for sbatch, see benchmarks.fake_slurm
+import os, sys, subprocess
+
+state_dir = os.environ.get("FAKE_SLURM_DIR", os.getcwd())
+os.makedirs(state_dir, exist_ok=True)
+counter = os.path.join(state_dir, "last_job_id")
+job_id = int(open(counter).read()) + 1 if os.path.isfile(counter) else 1
+with open(counter, "w") as f:
+    f.write(str(job_id))
+
+script = [arg for arg in sys.argv[1:] if not arg.startswith("-")][-1]
+env = dict(os.environ, SLURM_JOB_ID=str(job_id), SLURM_JOB_NODELIST=os.environ.get("FAKE_SLURM_NODELIST", "node1"))
+with open(os.path.join(state_dir, f"slurm-{job_id}.out"), "w") as out:
+    subprocess.Popen(["bash", script], stdout=out, stderr=out, env=env, start_new_session=True)
+print(f"Submitted batch job {job_id}")
+"""
+
+# only `scontrol show hostnames <nodelist>`, which the run files use
+SCONTROL = """#!{python}
+# stand-in for scontrol, see benchmarks.fake_slurm
+import sys
+import importlib.util
+
+# loaded from its file, importing the slurm_utils package takes seconds
+spec = importlib.util.spec_from_file_location("su_nodes", "{nodes_file}")
+nodes = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(nodes)
+
+if sys.argv[1:3] == ["show", "hostnames"]:
+    nodelist = sys.argv[3] if len(sys.argv) > 3 else ""
+    print("\\n".join(nodes.expand_nodelist(nodelist)))
+"""
+
+
+def install_fake_slurm(bin_dir: str):
+    """Writes `srun`, `sbatch` and `scontrol` stand-ins to `bin_dir`, which is put first on the PATH."""
+    os.makedirs(bin_dir, exist_ok=True)
+    for name, script in [("srun", SRUN), ("sbatch", SBATCH), ("scontrol", SCONTROL)]:
+        script = script.replace("{python}", sys.executable).replace("{nodes_file}", os.path.abspath(nodes.__file__))
+        TrialWorkspace.write_file(os.path.join(bin_dir, name), script, executable=True)
+    return bin_dir
@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import logging
+import tempfile
+
+import click
+import invoke
+import numpy as np
+
+from slurm_utils.convenience.log import init_logging
+from slurm_utils.execution.workspace import TrialWorkspace
+
+
+def render_run_file(work_dir: str, run_id):
+    # the header and command of a single_run.sh, as written by the local scheduler
+    return f"""#!/bin/bash
+
+# Prepare environment
+source $SU_STORAGE/server_setup/init_slurm.sh
+
+MAIN_FILE={os.path.join(work_dir, "scripts", "main.py")}
+FLAG_FILE={os.path.join(work_dir, f"run_{run_id}", "config.cfg")}
+
+# exec, such that signals of the scheduler, e.g. for early stopping, reach the trial
+exec python $MAIN_FILE --flagfile=$FLAG_FILE
+"""
+
+
+def trial_config(work_dir: str, run_id):
+    run_dir = os.path.join(work_dir, f"run_{run_id}")
+    return {"lr": 0.001 * run_id, "layers": 4, "data_dir": "/data", "work_dir": run_dir, "log_dir": run_dir}
+
+
+def prepare_with_shell(work_dir: str, run_id):
+    """Trial setup of the JobScheduler before the TrialWorkspace: rendering per trial and `chmod` in a shell."""
+    run_dir = os.path.join(work_dir, f"run_{run_id}")
+    os.makedirs(run_dir, exist_ok=True)
+
+    config = trial_config(work_dir, run_id)
+    with open(os.path.join(run_dir, "config.cfg"), "w") as f:
+        for k, v in config.items():
+            f.write(f"--{k}={v} \n")
+    with open(os.path.join(run_dir, "config.json"), "w") as f:
+        json.dump(config, f)
+
+    single_run_path = os.path.join(run_dir, "single_run.sh")
+    with open(single_run_path, "w") as f:
+        f.write(render_run_file(work_dir, run_id))
+    invoke.run(f"chmod 700 {single_run_path}")
+
+    run_command_path = os.path.join(run_dir, "run_command.sh")
+    with open(run_command_path, "w") as f:
+        f.write(f"sh {single_run_path}")
+    invoke.run(f"chmod 700 {run_command_path}")
+
+
+def prepare_with_workspace(workspace: TrialWorkspace, run_id):
+    run_dir = workspace.make_run_dir(run_id)
+
+    config = trial_config(workspace.work_dir, run_id)
+    workspace.write_file(os.path.join(run_dir, "config.cfg"), "".join(f"--{k}={v} \n" for k, v in config.items()))
+    workspace.write_file(os.path.join(run_dir, "config.json"), json.dumps(config))
+
+    single_run_path = os.path.join(run_dir, "single_run.sh")
+    file = workspace.render("single_run", lambda token: render_run_file(workspace.work_dir, token), run_id)
+    workspace.write_file(single_run_path, file, executable=True)
+    workspace.write_file(os.path.join(run_dir, "run_command.sh"), f"sh {single_run_path}", executable=True)
+
+
+def summarize(name: str, latencies):
+    latencies = np.array(latencies) * 1000
+    logging.info(
+        f"{name}: mean {latencies.mean():.2f}ms, p50 {np.percentile(latencies, 50):.2f}ms, "
+        f"p95 {np.percentile(latencies, 95):.2f}ms, total {latencies.sum() / 1000:.2f}s per {len(latencies)} trials"
+    )
+    return latencies.mean()
+
+
+@click.command()
+@click.option("--trials", "num_trials", default=200, help="Number of trials to set up.")
+@click.option("--work_dir", "work_dir", default=None, help="Directory on the file system to measure, e.g. Lustre.")
+def benchmark_launch(num_trials, work_dir):
+    """Per-trial setup latency before the launch, with shell chmod calls and with the TrialWorkspace."""
+    init_logging(logging.INFO)
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp_dir:
+        shell_dir = os.path.join(tmp_dir, "shell")
+        latencies = []
+        for run_id in range(1, num_trials + 1):
+            start_time = time.perf_counter()
+            prepare_with_shell(shell_dir, run_id)
+            latencies.append(time.perf_counter() - start_time)
+        shell_mean = summarize("render per trial, chmod in a shell", latencies)
+
+        workspace = TrialWorkspace(os.path.join(tmp_dir, "workspace"))
+        workspace.create_ahead(range(1, num_trials + 1))
+        latencies = []
+        for run_id in range(1, num_trials + 1):
+            start_time = time.perf_counter()
+            prepare_with_workspace(workspace, run_id)
+            latencies.append(time.perf_counter() - start_time)
+        workspace.close()
+        workspace_mean = summarize("trial workspace", latencies)
+        logging.info(f"The trial workspace sets up trials {shell_mean / workspace_mean:.1f}x faster.")
+
+
+if __name__ == '__main__':
+    benchmark_launch()
@@ -0,0 +1,293 @@
+import os
+import sys
+import json
+import time
+import logging
+import resource
+import tempfile
+from contextlib import contextmanager
+
+import click
+
+import slurm_utils
+from slurm_utils.convenience.log import init_logging
+from benchmarks.fake_slurm import install_fake_slurm
+
+# a trial which sleeps, reports steps and its objective, and fails with exit code 3 for a share of the trials,
+# --log_dir and --verbosity are flags of absl.logging
+FAIL_EXIT_CODE = 3
+TRIAL_MAIN = """import os
+import sys
+import json
+import time
+import zlib
+
+from absl import app, flags
+
+flags.DEFINE_string("data_dir", "", "")
+flags.DEFINE_string("work_dir", "", "")
+flags.DEFINE_string("objective", "", "")
+flags.DEFINE_integer("x", 0, "")
+FLAGS = flags.FLAGS
+
+
+def main(argv):
+    # deterministic per trial, such that runs of the benchmark are comparable
+    draw = zlib.crc32(str(FLAGS.x).encode()) / 2 ** 32
+    jitter = float(os.environ.get("BENCH_JITTER", "0"))
+    duration = float(os.environ.get("BENCH_TRIAL_SECS", "0.5")) * (1 + jitter * (draw - 0.5))
+    num_steps = int(os.environ.get("BENCH_STEPS", "0"))
+    for step in range(1, num_steps + 1):
+        time.sleep(duration / (num_steps + 1))
+        with open(os.path.join(FLAGS.work_dir, "step_metrics.jsonl"), "a") as f:
+            f.write(json.dumps({"step": step, FLAGS.objective: step * draw}) + "\\n")
+    time.sleep(duration / (num_steps + 1))
+
+    if draw < float(os.environ.get("BENCH_FAIL_RATE", "0")):
+        sys.exit(3)
+    with open(os.path.join(FLAGS.work_dir, "test_metrics.json"), "w") as f:
+        json.dump({FLAGS.objective: draw}, f)
+
+
+if __name__ == '__main__':
+    app.run(main)
+"""
+
+# file system calls seen by the audit hook, see `count_fs_ops`
+FS_EVENTS = {
+    "open", "os.mkdir", "os.rename", "os.remove", "os.rmdir", "os.chmod", "os.listdir", "os.scandir", "os.truncate",
+    "os.link", "os.symlink", "os.utime", "shutil.copyfile", "shutil.rmtree"
+}
+fs_ops = {"enabled": False, "count": 0}
+
+
+def count_fs_op(event, args):
+    if fs_ops["enabled"] and event in FS_EVENTS:
+        fs_ops["count"] += 1
+
+
+@contextmanager
+def count_fs_ops():
+    # audit hooks cannot be removed, the hook is installed once and switched on while the scheduler runs
+    if not fs_ops.get("installed"):
+        sys.addaudithook(count_fs_op)
+        fs_ops["installed"] = True
+    fs_ops["count"] = 0
+    fs_ops["enabled"] = True
+    try:
+        yield fs_ops
+    finally:
+        fs_ops["enabled"] = False
+
+
+def rss_bytes():
+    with open("/proc/self/statm", "r") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def experiment_config(num_trials: int, num_nodes: int, tasks_per_node: int, gpus_per_node: int, algorithm: str,
+                      run_settings: dict):
+    config = {
+        "project_name": "benchmark",
+        "experiment_name": "scheduler",
+        "server_settings": {
+            "hostname": "fake",
+            "sbatch_required": {
+                "nodes": num_nodes, "n_tasks_per_node": tasks_per_node, "cpus-per-task": 1,
+                "gres": f"gpu:{gpus_per_node}"
+            },
+            "host_specific": {"fake": {}}
+        },
+        "run_settings": {
+            "objective": "acc",
+            "hyperparam_algorithm": algorithm,
+            "hyperparameter_params": {"max_num_trials": num_trials},
+            # the benchmark measures the scheduler, not the reuse of earlier results
+            "result_cache": False,
+            "tracing": True,
+        },
+        "parameters": {"x": list(range(num_trials))},
+    }
+    if algorithm == "random":
+        config["parameters"] = [{"name": "x", "type": "discrete", "range": [0, 1000000]}]
+    config["run_settings"].update(run_settings)
+    return config
+
+
+def prepare_environment(tmp_dir: str, num_nodes: int, tasks_per_node: int, trial_secs: float, jitter: float,
+                        fail_rate: float, num_steps: int, srun_delay: float):
+    storage_dir = os.path.join(tmp_dir, "storage")
+    os.makedirs(os.path.join(storage_dir, "server_setup"))
+    with open(os.path.join(storage_dir, "server_setup", "init_slurm.sh"), "w") as f:
+        f.write("# the benchmark needs no environment setup\n")
+
+    bin_dir = install_fake_slurm(os.path.join(tmp_dir, "bin"))
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(slurm_utils.__file__)))
+    env = {
+        "PATH": f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}",
+        "PYTHONPATH": os.pathsep.join(p for p in [package_root, os.environ.get("PYTHONPATH")] if p),
+        "SU_STORAGE": storage_dir,
+        "SLURM_JOB_ID": "1",
+        "SLURM_JOB_NODELIST": f"node[1-{num_nodes}]" if num_nodes > 1 else "node1",
+        "SLURM_JOB_CPUS_PER_NODE": f"{tasks_per_node}(x{num_nodes})",
+        "FAKE_SLURM_DIR": os.path.join(tmp_dir, "slurm"),
+        "FAKE_SRUN_DELAY": str(srun_delay),
+        "BENCH_TRIAL_SECS": str(trial_secs),
+        "BENCH_JITTER": str(jitter),
+        "BENCH_FAIL_RATE": str(fail_rate),
+        "BENCH_STEPS": str(num_steps),
+        # the allocation ends in a day, walltime aware scheduling would otherwise ask squeue
+        "SLURM_JOB_END_TIME": str(int(time.time()) + 24 * 3600),
+    }
+    return env
+
+
+@contextmanager
+def patched_environ(env: dict):
+    previous = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def run_benchmark(scheduler: str, config: dict, env: dict, tmp_dir: str):
+    from slurm_utils.execution.main import schedule_and_run_jobs
+
+    work_dir = os.path.join(tmp_dir, "experiment")
+    os.makedirs(os.path.join(work_dir, "scripts"))
+    with open(os.path.join(work_dir, "scripts", "main.py"), "w") as f:
+        f.write(TRIAL_MAIN)
+    config_file = os.path.join(work_dir, "scripts", "config.json")
+    with open(config_file, "w") as f:
+        json.dump(config, f)
+
+    rss_before = rss_bytes()
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    start_time = time.perf_counter()
+    with patched_environ(env), count_fs_ops() as ops:
+        schedule_and_run_jobs(
+            executable="local" if scheduler == "local" else "srun",
+            run_file="main",
+            work_dir=work_dir,
+            data_dir=os.path.join(tmp_dir, "data"),
+            config_file=config_file
+        )
+    wall_secs = time.perf_counter() - start_time
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+
+    with open(os.path.join(work_dir, "study", "trace_summary.json"), "r") as f:
+        trace = json.load(f)
+    return {
+        "returncodes": trial_returncodes(work_dir),
+        "wall_secs": wall_secs,
+        "cpu_secs": (usage_after.ru_utime + usage_after.ru_stime) - (usage_before.ru_utime + usage_before.ru_stime),
+        "rss_growth_bytes": rss_bytes() - rss_before,
+        "fs_ops": ops["count"],
+        "trace": trace,
+    }
+
+
+def trial_returncodes(work_dir: str):
+    # return codes of the trials by run directory, None for trials without process_stats.json
+    from slurm_utils.execution.resume import load_json
+
+    returncodes = {}
+    for dir_name in sorted(os.listdir(work_dir)):
+        if dir_name.startswith("run_") and os.path.isdir(os.path.join(work_dir, dir_name)):
+            process_stats = load_json(os.path.join(work_dir, dir_name, "process_stats.json"))
+            returncodes[dir_name] = None if process_stats is None else process_stats.get("returncode")
+    return returncodes
+
+
+def phase_stat(trace: dict, phase: str, stat: str):
+    return trace.get("phases", {}).get(phase, {}).get(stat, 0)
+
+
+def report(results: dict, num_trials: int):
+    trace = results["trace"]
+    returncodes = list(results["returncodes"].values())
+    summary = {
+        "trials": num_trials,
+        "trials_failed": sum(returncode != 0 for returncode in returncodes),
+        # failures which were not injected with --fail_rate, e.g. trials which could not start
+        "trials_failed_unexpectedly": sum(returncode not in (0, FAIL_EXIT_CODE) for returncode in returncodes),
+        "wall_secs": results["wall_secs"],
+        "trials_per_min": 60 * num_trials / results["wall_secs"],
+        "launch_p50_ms": 1000 * phase_stat(trace, "launch", "p50_secs"),
+        "launch_p95_ms": 1000 * phase_stat(trace, "launch", "p95_secs"),
+        "startup_p50_ms": 1000 * phase_stat(trace, "startup", "p50_secs"),
+        "finalize_p50_ms": 1000 * phase_stat(trace, "finalize", "p50_secs"),
+        "finalize_p95_ms": 1000 * phase_stat(trace, "finalize", "p95_secs"),
+        "slot_idle_percent": 100 - trace.get("slot_busy_percent", 0),
+        "scheduler_cpu_ms_per_trial": 1000 * results["cpu_secs"] / num_trials,
+        "rss_growth_mib": results["rss_growth_bytes"] / 2 ** 20,
+        "fs_ops_per_trial": results["fs_ops"] / num_trials,
+    }
+    for key, value in summary.items():
+        logging.info(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
+    return summary
+
+
+@click.command()
+@click.option("--scheduler", "scheduler", type=click.Choice(["local", "slurm"]), default="slurm",
+              help="LocalJobScheduler, or SlurmJobScheduler with the fake srun.")
+@click.option("--trials", "num_trials", default=50, help="Number of trials of the synthetic study.")
+@click.option("--algorithm", "algorithm", type=click.Choice(["grid", "random"]), default="grid")
+@click.option("--nodes", "num_nodes", default=1, help="Nodes of the simulated allocation.")
+@click.option("--tasks_per_node", "tasks_per_node", default=4, help="Trials running at the same time per node.")
+@click.option("--gpus_per_node", "gpus_per_node", default=4)
+@click.option("--trial_secs", "trial_secs", default=0.5, help="Runtime of a trial.")
+@click.option("--jitter", "jitter", default=0.0, help="Trial runtimes vary by this share around trial_secs.")
+@click.option("--fail_rate", "fail_rate", default=0.0, help="Share of the trials which exit with code 3.")
+@click.option("--steps", "num_steps", default=0, help="Intermediate results reported per trial.")
+@click.option("--srun_delay", "srun_delay", default=0.0, help="Seconds of simulated step creation per srun.")
+@click.option("--run_settings", "run_settings", default="{}", help="JSON of run settings, e.g. '{\"bundle_size\": 4}'.")
+@click.option("--output", "output", default=None, help="Write the results as JSON, e.g. to compare two commits.")
+@click.option("--verbose", "verbose", is_flag=True, default=False, help="Keep the INFO logs of the scheduler.")
+def benchmark_scheduler(scheduler, num_trials, algorithm, num_nodes, tasks_per_node, gpus_per_node, trial_secs, jitter,
+                        fail_rate, num_steps, srun_delay, run_settings, output, verbose):
+    """Overhead of the schedulers on a synthetic study, with stand-ins for srun, sbatch and scontrol.
+
+    Reports launch latency, slot idle time, CPU time of the scheduler, growth of its memory and the file system
+    calls of the scheduler process per trial. The trial runtimes are known, so everything else is overhead.
+    """
+    init_logging(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = prepare_environment(
+            tmp_dir, num_nodes=num_nodes, tasks_per_node=tasks_per_node, trial_secs=trial_secs, jitter=jitter,
+            fail_rate=fail_rate, num_steps=num_steps, srun_delay=srun_delay
+        )
+        config = experiment_config(
+            num_trials, num_nodes=num_nodes, tasks_per_node=tasks_per_node, gpus_per_node=gpus_per_node,
+            algorithm=algorithm, run_settings=json.loads(run_settings)
+        )
+        # the logs of the scheduler are part of its overhead, but not of the benchmark output
+        if not verbose:
+            logging.getLogger().setLevel(logging.WARNING)
+        results = run_benchmark(scheduler, config, env, tmp_dir)
+        logging.getLogger().setLevel(logging.INFO)
+
+    summary = report(results, num_trials)
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump(dict(summary, scheduler=scheduler, run_settings=json.loads(run_settings)), f, indent=2)
+    # the timings of trials which did not run are meaningless
+    if summary["trials_failed_unexpectedly"] > 0:
+        failed = [
+            f"{dir_name} ({returncode})" for dir_name, returncode in results["returncodes"].items()
+            if returncode not in (0, FAIL_EXIT_CODE)
+        ]
+        raise click.ClickException(
+            f"{len(failed)} of {num_trials} trials failed without being asked to: {', '.join(failed[:10])}"
+        )
+
+
+if __name__ == '__main__':
+    benchmark_scheduler()
@@ -0,0 +1,112 @@
+import os
+import sys
+import time
+import logging
+import tempfile
+import subprocess
+
+import click
+
+from slurm_utils.convenience.log import init_logging
+from slurm_utils.execution.worker_pool import WorkerPool, WORKER_FILE
+
+
+def write_main_file(tmp_dir: str, import_modules):
+    # a trial which does no work, its runtime is the start of python and the imports of the project
+    imports = "".join(f"import {module}\n" for module in import_modules)
+    main_file = os.path.join(tmp_dir, "main.py")
+    with open(main_file, "w") as f:
+        f.write(f"""{imports}from absl import app
+
+
+def main(argv):
+    pass
+
+
+if __name__ == '__main__':
+    app.run(main)
+""")
+    return main_file
+
+
+def write_flag_file(tmp_dir: str, run_id):
+    run_dir = os.path.join(tmp_dir, f"run_{run_id}")
+    os.makedirs(run_dir, exist_ok=True)
+    flag_file = os.path.join(run_dir, "config.cfg")
+    with open(flag_file, "w") as f:
+        f.write("")
+    return run_dir, flag_file
+
+
+def run_processes(tmp_dir: str, main_file: str, num_trials: int, num_slots: int):
+    running = []
+    for run_id in range(num_trials):
+        if len(running) == num_slots:
+            running.pop(0).wait()
+        run_dir, flag_file = write_flag_file(tmp_dir, run_id)
+        with open(os.path.join(run_dir, "output.out"), "w") as f:
+            running.append(subprocess.Popen(
+                [sys.executable, main_file, f"--flagfile={flag_file}"], stdout=f, stderr=f
+            ))
+    for process in running:
+        process.wait()
+
+
+def run_pool(pool: WorkerPool, tmp_dir: str, num_trials: int, num_slots: int):
+    running = []
+    for run_id in range(num_trials):
+        if len(running) == num_slots:
+            running.pop(0).wait()
+        run_dir, flag_file = write_flag_file(tmp_dir, run_id)
+        running.append(pool.submit(run_id, flag_file, os.path.join(run_dir, "output.out"), env={}))
+    for process in running:
+        process.wait()
+
+
+@click.command()
+@click.option("--trials", "num_trials", default=100, help="Number of trials to run.")
+@click.option("--slots", "num_slots", default=4, help="Number of trials which run at the same time.")
+@click.option("--import_module", "import_modules", multiple=True, default=["numpy"],
+              help="Modules the trial imports, e.g. torch.")
+def benchmark_worker_pool(num_trials, num_slots, import_modules):
+    """Trials per minute of short trials started as new processes and forked from warm pool workers."""
+    init_logging(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        main_file = write_main_file(tmp_dir, import_modules)
+
+        start_time = time.perf_counter()
+        run_processes(os.path.join(tmp_dir, "processes"), main_file, num_trials, num_slots)
+        process_rate = num_trials / (time.perf_counter() - start_time) * 60
+        logging.info(f"new process per trial: {process_rate:.0f} trials/min")
+
+        pool = WorkerPool(
+            command=[sys.executable, WORKER_FILE, f"--main_file={main_file}"],
+            num_workers=num_slots,
+            log_dir=os.path.join(tmp_dir, "workers")
+        )
+        # the workers start once per experiment, their startup is reported and included in the total rate
+        start_time = time.perf_counter()
+        pool.start()
+        for worker in pool.workers:
+            worker.ready.wait()
+        startup_secs = time.perf_counter() - start_time
+        if not all(worker.is_alive for worker in pool.workers):
+            raise click.ClickException(f"Pool workers exited during their startup, see {pool.log_dir}.")
+
+        start_time = time.perf_counter()
+        run_pool(pool, os.path.join(tmp_dir, "pool"), num_trials, num_slots)
+        trials_secs = time.perf_counter() - start_time
+        pool.close()
+        pool_rate = num_trials / trials_secs * 60
+        total_rate = num_trials / (startup_secs + trials_secs) * 60
+        logging.info(f"worker pool startup: {startup_secs:.2f}s")
+        logging.info(f"worker pool: {pool_rate:.0f} trials/min, {total_rate:.0f} trials/min with the startup")
+        logging.info(
+            f"The worker pool runs {pool_rate / process_rate:.1f}x more trials per minute, "
+            f"{total_rate / process_rate:.1f}x with the startup."
+        )
+
+
+if __name__ == '__main__':
+    benchmark_worker_pool()
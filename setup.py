@@ -26,7 +26,8 @@ setup(
     long_description=long_description,
     author_email="andreas.stephan@univie.ac.at",
     license="Apache License 2.0",
-    packages=find_packages(),
+    # the benchmarks and tests are run from the repository, they are not installed
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*", "tests", "tests.*"]),
     include_package_data=True,
     install_requires=requirements,
     tests_require=test_requirements,
@@ -38,5 +39,6 @@ setup(
         su_sbatch=slurm_utils.scripts.managers:su_sbatch
         su_remote=slurm_utils.scripts.managers:su_remote
         su_create=slurm_utils.scripts.create:create_proj
+        su_slurm_sim=slurm_utils.scripts.simulator:su_slurm_sim
     ''',
 )
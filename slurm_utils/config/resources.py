@@ -48,6 +48,37 @@ class ResourceConfig:
 #SBATCH --cpus-per-task={self.cpus_per_task}    ## number of cores for the job - max 80
 #SBATCH --gres={self.gres}    ## number of GPU's per node
 
+"""
+        for key, val in self.host_specific.items():
+            setup += f"#SBATCH --{key}={val} \n"
+        return setup
+
+    def get_array_sbatch_setup_string(self, num_tasks: int, max_concurrent: int):
+        # resources of a single array task, i.e. of one trial
+        setup = f"""#!/bin/bash 
+
+#SBATCH --nodes=1
+#SBATCH --job-name={self.proj_name}_{self.experiment_name}        ## name you give to your job
+
+#SBATCH --ntasks=1
+#SBATCH --cpus-per-task={self.cpus_per_task}    ## number of cores per trial
+#SBATCH --gres=gpu:{self.gpus_per_task}    ## number of GPU's per trial
+#SBATCH --array=0-{num_tasks - 1}%{max_concurrent}    ## one task per trial
+
+"""
+        for key, val in self.host_specific.items():
+            setup += f"#SBATCH --{key}={val} \n"
+        return setup
+
+    def get_gather_sbatch_setup_string(self):
+        setup = f"""#!/bin/bash 
+
+#SBATCH --nodes=1
+#SBATCH --job-name={self.proj_name}_{self.experiment_name}_gather        ## name you give to your job
+
+#SBATCH --ntasks=1
+#SBATCH --cpus-per-task=1
+
 """
         for key, val in self.host_specific.items():
             setup += f"#SBATCH --{key}={val} \n"
@@ -10,3 +10,13 @@ def save_scheduler_info(objective, additional_info=None):
 
     with open(os.path.join(FLAGS.work_dir, "test_metrics.json"), "w") as f:
         json.dump(save_dict, f)
+
+
+def report_step(step, objective, additional_info=None):
+    # intermediate results, e.g. per epoch, the scheduler may stop the trial early based on them
+    report_dict = {"step": step, FLAGS.objective: objective}
+    if additional_info is not None:
+        report_dict.update({"additional_information": additional_info})
+
+    with open(os.path.join(FLAGS.work_dir, "step_metrics.jsonl"), "a") as f:
+        f.write(json.dumps(report_dict) + "\n")
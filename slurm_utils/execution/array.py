@@ -0,0 +1,83 @@
+import os
+import json
+import logging
+
+from sherpa import Trial
+
+from slurm_utils.execution.server_scheduler import SlurmJobScheduler
+from slurm_utils.execution.resume import load_json
+
+
+class ArrayJobScheduler(SlurmJobScheduler):
+    """Runs the trials of a pre-enumerable sweep as one SLURM job array instead of srun steps of one allocation.
+
+    `prepare_array` writes the work directories of all trials and the list of their run ids, array task i runs the
+    trial in line i + 1 of `array_trials.txt`. `gather_results` adds the results of all array tasks to the study.
+    """
+    trials_file_name = "array_trials.txt"
+
+    def prepare_array(self):
+        if not self.config.is_pre_enumerable():
+            raise ValueError(
+                f"Job arrays need all trials upfront, which {self.config.algorithm_name} search does not support."
+            )
+
+        run_ids = []
+        for trial in iter(self.next_trial, None):
+            self.prepare_trial(run_id=trial.id, trial=trial)
+            run_ids.append(trial.id)
+
+        with open(os.path.join(self.work_dir, self.trials_file_name), "w") as f:
+            f.writelines(f"{run_id}\n" for run_id in run_ids)
+
+        logging.info(f"Prepared {len(run_ids)} trials for the job array.")
+        return run_ids
+
+    def array_trial(self, run_id):
+        with open(os.path.join(self.work_dir, f"run_{run_id}", "config.json"), "r") as f:
+            trial_config = json.load(f)
+        parameter_names = [parameter.name for parameter in self.config.parameters]
+        return Trial(id=run_id, parameters={name: trial_config.get(name) for name in parameter_names})
+
+    def check_array_results(self, run_ids):
+        # resume() reads successful trials without checking them, so they are validated and cached before
+        for run_id in run_ids:
+            work_dir = os.path.join(self.work_dir, f"run_{run_id}")
+            process_stats = load_json(os.path.join(work_dir, "process_stats.json"))
+            if process_stats is None or process_stats.get("returncode") != 0:
+                continue
+
+            metrics = load_json(os.path.join(work_dir, "test_metrics.json"))
+            if metrics is not None and self.config.objective not in metrics:
+                raise RuntimeError(
+                    f"You have to write a file called test_metrics.json which holds a key {self.config.objective}"
+                )
+            self.cache_result(run_id, self.array_trial(run_id), time_in_secs=process_stats.get("time_in_secs"))
+
+    def gather_results(self):
+        with open(os.path.join(self.work_dir, self.trials_file_name), "r") as f:
+            run_ids = [int(line) for line in f if line.strip() != ""]
+        self.check_array_results(run_ids)
+
+        # successful trials, of the array and of previous runs, are read like for a resumed experiment, unless the
+        # scheduler was already resumed when it was created
+        if self.resume_state is None:
+            self.resume()
+        observed = set(self.study.results["Trial-ID"]) if len(self.study.results) > 0 else set()
+
+        for run_id in run_ids:
+            if run_id in observed:
+                continue
+            work_dir = os.path.join(self.work_dir, f"run_{run_id}")
+            trial = self.array_trial(run_id)
+
+            process_stats = load_json(os.path.join(work_dir, "process_stats.json"))
+            if process_stats is None:
+                logging.warning(f"Array task of trial {run_id} did not finish, it is recorded as failed.")
+                returncode = None
+            else:
+                returncode = process_stats.get("returncode")
+
+            self.observe_trial(run_id, trial, returncode)
+
+        self.persistence.save()
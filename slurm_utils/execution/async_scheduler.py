@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import os
+import signal
+
+import threading
+import time
+
+from slurm_utils.execution.job_scheduler import JobScheduler
+from slurm_utils.execution.local_scheduler import LocalJobScheduler
+from slurm_utils.execution.server_scheduler import SlurmJobScheduler
+
+
+class AsyncJobScheduler(JobScheduler):
+    """Variant of the JobScheduler which drives all trials from one asyncio event loop.
+
+    Suggesting trials, preparing their work directories, launching, finalizing and saving the study run as
+    concurrent tasks, so starting new trials never waits for the bookkeeping of finished ones.
+    Blocking work is done in worker threads, accesses to the study are serialized by `study_lock`.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+        # reentrant, as deferring the remaining trials takes the suggestions under the lock as well
+        self.study_lock = threading.RLock()
+        # trials which hold a slot, i.e. which are launched or running
+        self.num_slots_used = 0
+
+        if self.config.bundle_size != 1:
+            logging.warning("Trial bundling is only supported by the sync scheduler, trials are not bundled.")
+        if self.use_worker_pool:
+            logging.warning("The worker pool is only supported by the sync scheduler, trials run as processes.")
+            self.use_worker_pool = False
+
+        # notified from the finalizing worker threads whenever resources like GPUs are released
+        self.loop = None
+        self.resources_released = None
+
+    def save_study_locked(self):
+        with self.study_lock:
+            self.save_study()
+
+    def next_trial(self):
+        with self.study_lock:
+            self.request_suggestions(self.max_processes - self.num_slots_used)
+            return super().next_trial()
+
+    def admit_trials_locked(self, trials):
+        with self.study_lock:
+            return self.admit_trials(trials)
+
+    def defer_remaining_trials(self):
+        with self.study_lock:
+            super().defer_remaining_trials()
+
+    def register_launch(self, run_id, trial, process, file, launch_start_ns):
+        with self.study_lock:
+            self.processes.add(run_id=run_id, trial=trial, process=process, file=file, start_time=time.time())
+            self.tracer.trial_launched(run_id, launch_start_ns)
+            self.report_launch(launch_start_ns)
+            if self.resource_sampler is not None:
+                self.resource_sampler.register(run_id)
+
+    def release_failed_launch(self, run_id):
+        # the trial never started, its GPUs and port are free again
+        with self.study_lock:
+            self.release_resources(run_id, {})
+        asyncio.run_coroutine_threadsafe(self.notify_resources_released(), self.loop)
+
+    def finalize_trial(self, run_id):
+        with self.study_lock:
+            self.processes.mark_stopped(run_id)
+            self.finish_process(run_id)
+        asyncio.run_coroutine_threadsafe(self.notify_resources_released(), self.loop)
+
+    async def notify_resources_released(self):
+        async with self.resources_released:
+            self.resources_released.notify_all()
+
+    def allocate_if_available(self, run_id, trial):
+        # checked and allocated in one step under the lock, the release runs in the finalizing threads
+        with self.study_lock:
+            if not self.can_allocate(self.trial_gpus(trial), excluded=self.retries.excluded_nodes(trial.id)):
+                return False
+            self.allocate_resources(run_id, trial)
+            return True
+
+    async def allocate_when_available(self, run_id, trial):
+        # the allocation leases a port from a locked file, it runs in a worker thread, one launch at a time, such
+        # that no release is missed between a failed check and waiting
+        async with self.resources_released:
+            while not await asyncio.to_thread(self.allocate_if_available, run_id, trial):
+                await self.resources_released.wait()
+
+    def check_steps_locked(self):
+        with self.study_lock:
+            self.check_steps()
+
+    def terminate_trial(self, entry):
+        # called from a worker thread, so the asyncio process object is not used
+        try:
+            os.kill(entry.process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    async def check_steps_periodically(self):
+        while True:
+            await asyncio.sleep(self.config.step_interval)
+            await asyncio.to_thread(self.check_steps_locked)
+
+    async def save_periodically(self):
+        while True:
+            await asyncio.sleep(self.config.save_interval)
+            await asyncio.to_thread(self.save_study_locked)
+
+    async def launch_trial(self, run_id, trial):
+        with self.tracer.span("wait_for_slot", run_id=run_id):
+            await self.allocate_when_available(run_id, trial)
+
+        f = None
+        try:
+            prepare_start_ns = self.tracer.now()
+            await asyncio.to_thread(self.prepare_trial, run_id=run_id, trial=trial)
+            self.tracer.trial_span(run_id, "prepare", prepare_start_ns, self.tracer.now())
+
+            logging.info(f"Start Trial {trial.id}, with parameters {trial.parameters}")
+            launch_start_ns = self.tracer.now()
+            execution_sh_command = self.create_run_command(run_id)
+            await asyncio.to_thread(self.save_run_command, run_id, execution_sh_command)
+
+            f = open(os.path.join(self.work_dir, f"run_{run_id}", "output.out"), "w")
+            process = await asyncio.create_subprocess_exec(
+                *execution_sh_command, stderr=f, stdout=f, env=self.trial_environment(run_id)
+            )
+        except BaseException:
+            if f is not None:
+                f.close()
+            await asyncio.to_thread(self.release_failed_launch, run_id)
+            raise
+
+        await asyncio.to_thread(self.register_launch, run_id, trial, process, f, launch_start_ns)
+        return process
+
+    async def run_trial(self, trial, slots: asyncio.Semaphore):
+        run_id = trial.id
+        while True:
+            try:
+                process = await self.launch_trial(run_id, trial)
+                try:
+                    await process.wait()
+                except asyncio.CancelledError:
+                    # cancelled because the task of another trial failed
+                    try:
+                        process.terminate()
+                    except ProcessLookupError:
+                        pass
+                    raise
+            finally:
+                # the slot is free again as soon as the process exited, finalization runs concurrently
+                self.num_slots_used -= 1
+                slots.release()
+
+            await asyncio.to_thread(self.finalize_trial, run_id)
+
+            # a failed trial which is retried waits for its backoff and a free slot again
+            delay = self.retries.claim(trial.id)
+            if delay is None:
+                return
+            await asyncio.sleep(delay)
+            await slots.acquire()
+            self.num_slots_used += 1
+
+    @staticmethod
+    async def acquire_slot(slots: asyncio.Semaphore, trial_failed: asyncio.Event):
+        # stops waiting as soon as a trial task failed, the slots of the other trials may stay taken for long
+        acquire = asyncio.create_task(slots.acquire())
+        failure = asyncio.create_task(trial_failed.wait())
+        await asyncio.wait([acquire, failure], return_when=asyncio.FIRST_COMPLETED)
+        failure.cancel()
+        if not trial_failed.is_set():
+            return True
+        if not acquire.cancel():
+            slots.release()
+        return False
+
+    async def run_trials(self):
+        self.loop = asyncio.get_running_loop()
+        self.resources_released = asyncio.Condition()
+
+        slots = asyncio.Semaphore(self.max_processes)
+        saver = asyncio.create_task(self.save_periodically())
+        step_checker = asyncio.create_task(self.check_steps_periodically())
+
+        trial_tasks = []
+        trial_failed = asyncio.Event()
+
+        def check_trial_task(task):
+            if not task.cancelled() and task.exception() is not None:
+                trial_failed.set()
+
+        try:
+            while await self.acquire_slot(slots, trial_failed):
+                self.loop_wakes()
+                with self.tracer.span("suggest"):
+                    trial = await asyncio.to_thread(self.next_trial)
+                if trial is None:
+                    slots.release()
+                    break
+                if not await asyncio.to_thread(self.admit_trials_locked, [trial]):
+                    slots.release()
+                    await asyncio.to_thread(self.defer_remaining_trials)
+                    break
+                self.num_slots_used += 1
+                task = asyncio.create_task(self.run_trial(trial, slots))
+                task.add_done_callback(check_trial_task)
+                trial_tasks.append(task)
+                self.loop_waits()
+            logging.info("Started all trials")
+
+            await asyncio.gather(*trial_tasks)
+        except BaseException:
+            # a failed trial task must not leave the other trials running unsupervised
+            for task in trial_tasks:
+                task.cancel()
+            await asyncio.gather(*trial_tasks, return_exceptions=True)
+            raise
+        finally:
+            saver.cancel()
+            step_checker.cancel()
+
+    def loop_hyperparams(self):
+        asyncio.run(self.run_trials())
+
+
+class AsyncLocalJobScheduler(AsyncJobScheduler, LocalJobScheduler):
+    pass
+
+
+class AsyncSlurmJobScheduler(AsyncJobScheduler, SlurmJobScheduler):
+    pass
@@ -0,0 +1,235 @@
+from collections import Counter
+
+import numpy as np
+from scipy.stats import norm
+
+from sherpa.core import Continuous, Discrete, Choice, Ordinal
+from sherpa.algorithms import Algorithm, RandomSearch
+
+
+class ParameterEncoding:
+    """Maps parameter values to points of the unit cube and back.
+
+    Continuous and discrete parameters get one dimension (in log space for log scales), ordinal parameters one
+    dimension for the index of their value, choice parameters one dimension per value (one-hot).
+    """
+
+    def __init__(self, parameters):
+        self.parameters = parameters
+        self.slices = []
+        dim = 0
+        for parameter in parameters:
+            width = len(parameter.range) if isinstance(parameter, Choice) else 1
+            self.slices.append(slice(dim, dim + width))
+            dim += width
+        self.dim = dim
+
+    @staticmethod
+    def transform(parameter, value):
+        return np.log(value) if getattr(parameter, "scale", "linear") == "log" else value
+
+    def encode(self, values: dict):
+        x = np.zeros(self.dim)
+        for parameter, dims in zip(self.parameters, self.slices):
+            value = values[parameter.name]
+            if isinstance(parameter, Choice):
+                x[dims.start + list(parameter.range).index(value)] = 1
+            elif isinstance(parameter, Ordinal):
+                x[dims.start] = list(parameter.range).index(value) / max(1, len(parameter.range) - 1)
+            else:
+                low, high = (self.transform(parameter, bound) for bound in parameter.range)
+                x[dims.start] = (self.transform(parameter, value) - low) / (high - low)
+        return x
+
+    def decode(self, x):
+        values = {}
+        for parameter, dims in zip(self.parameters, self.slices):
+            if isinstance(parameter, Choice):
+                values[parameter.name] = parameter.range[int(np.argmax(x[dims]))]
+            elif isinstance(parameter, Ordinal):
+                values[parameter.name] = parameter.range[int(round(x[dims.start] * (len(parameter.range) - 1)))]
+            else:
+                low, high = (self.transform(parameter, bound) for bound in parameter.range)
+                value = low + np.clip(x[dims.start], 0, 1) * (high - low)
+                if getattr(parameter, "scale", "linear") == "log":
+                    value = np.exp(value)
+                if isinstance(parameter, Discrete):
+                    value = int(np.clip(round(value), *parameter.range))
+                values[parameter.name] = float(value) if isinstance(parameter, Continuous) else value
+        return values
+
+    def sample(self, num_points: int, rng):
+        x = rng.random((num_points, self.dim))
+        for parameter, dims in zip(self.parameters, self.slices):
+            if isinstance(parameter, Choice):
+                x[:, dims] = np.eye(len(parameter.range))[rng.integers(len(parameter.range), size=num_points)]
+        return x
+
+    def perturb(self, x, num_points: int, scale: float, rng):
+        # candidates around good points, choice parameters switch their value with probability `scale`
+        points = x[rng.integers(len(x), size=num_points)].copy()
+        random_points = self.sample(num_points, rng)
+        for parameter, dims in zip(self.parameters, self.slices):
+            if isinstance(parameter, Choice):
+                switch = rng.random(num_points) < scale
+                points[switch, dims] = random_points[switch, dims]
+            else:
+                points[:, dims] = np.clip(points[:, dims] + rng.normal(0, scale, (num_points, 1)), 0, 1)
+        return points
+
+
+def matern52(a, b, lengthscale: float):
+    squared_distances = np.maximum(
+        np.sum(a ** 2, axis=1)[:, None] + np.sum(b ** 2, axis=1)[None, :] - 2 * a @ b.T, 0
+    )
+    d = np.sqrt(5 * squared_distances) / lengthscale
+    return (1 + d + d ** 2 / 3) * np.exp(-d)
+
+
+class GaussianProcess:
+    """Gaussian process with a Matern 5/2 kernel on standardized objectives, for a few hundred observations."""
+    lengthscales = (0.05, 0.1, 0.2, 0.4, 0.8, 1.6)
+    noises = (1e-4, 1e-2, 1e-1)
+
+    def __init__(self, x, y):
+        self.mean = y.mean()
+        self.std = y.std() if y.std() > 0 else 1.0
+
+        # kernel hyperparameters with the highest marginal likelihood on the grid
+        y_standardized = (y - self.mean) / self.std
+        best = None
+        for lengthscale in self.lengthscales:
+            for noise in self.noises:
+                try:
+                    cholesky, alpha = self.factorize(x, y_standardized, lengthscale, noise)
+                except np.linalg.LinAlgError:
+                    continue
+                log_likelihood = -0.5 * y_standardized @ alpha - np.sum(np.log(np.diag(cholesky)))
+                if best is None or log_likelihood > best[0]:
+                    best = (log_likelihood, lengthscale, noise)
+        _, self.lengthscale, self.noise = best if best is not None else (None, 0.2, 1e-1)
+
+        self.fit(x, y)
+
+    @staticmethod
+    def factorize(x, y, lengthscale: float, noise: float):
+        cholesky = np.linalg.cholesky(matern52(x, x, lengthscale) + noise * np.eye(len(x)))
+        alpha = np.linalg.solve(cholesky.T, np.linalg.solve(cholesky, y))
+        return cholesky, alpha
+
+    def fit(self, x, y):
+        # keeps the kernel hyperparameters, e.g. to add lies to the data
+        self.x = x
+        self.cholesky, self.alpha = self.factorize(x, (y - self.mean) / self.std, self.lengthscale, self.noise)
+
+    def predict(self, x):
+        k = matern52(x, self.x, self.lengthscale)
+        mu = k @ self.alpha
+        v = np.linalg.solve(self.cholesky, k.T)
+        sigma = np.sqrt(np.maximum(1 - np.sum(v ** 2, axis=0), 1e-12))
+        return mu * self.std + self.mean, sigma * self.std
+
+
+def expected_improvement(mu, sigma, best: float, xi: float = 0.01):
+    # for minimization
+    improvement = best - mu - xi
+    z = improvement / sigma
+    return improvement * norm.cdf(z) + sigma * norm.pdf(z)
+
+
+class ConstantLiarBO(Algorithm):
+    """Batch Bayesian optimization with a Gaussian process and expected improvement, in NumPy.
+
+    Batches of `max_concurrent` trials are chosen with the constant liar heuristic: every chosen point is added to
+    the data with a fake objective (the minimum, mean or maximum of the observed objectives) before the next point
+    is chosen, so a batch spreads over the search space. Suggested trials which did not finish yet are added as
+    lies as well. The expected improvement is maximized over random and locally perturbed candidate points.
+    The scheduler may change `max_concurrent` to the number of free slots before asking for suggestions.
+    """
+
+    def __init__(self, max_num_trials: int = None, num_initial_points: int = None, max_concurrent: int = 1,
+                 liar: str = "min", num_candidates: int = 2000, seed: int = None):
+        assert liar in ("min", "mean", "max"), "liar needs to be min, mean or max."
+        self.max_num_trials = max_num_trials
+        self.num_initial_points = num_initial_points
+        self.max_concurrent = max_concurrent
+        self.liar = liar
+        self.num_candidates = num_candidates
+
+        self.rng = np.random.default_rng(seed)
+        self.random_search = RandomSearch()
+
+        self.count = 0
+        self.encoding = None
+        self.next_trials = []
+        self.num_points_seen = 0
+        self.suggested = Counter()
+        self.suggested_values = {}
+
+    def key(self, values: dict):
+        # identifies parameter values independent of their python / numpy types
+        return tuple(np.round(self.encoding.encode(values), 6))
+
+    def observed(self, parameters, results):
+        if results is None or len(results) == 0:
+            return [], np.zeros(0), Counter()
+        finalized = results.loc[results["Status"] != "INTERMEDIATE"]
+        finished = Counter(self.key(row) for row in finalized[[p.name for p in parameters]].to_dict("records"))
+        completed = finalized.loc[(finalized["Status"] == "COMPLETED") & finalized["Objective"].notna()]
+        rows = completed[[p.name for p in parameters]].to_dict("records")
+        return rows, completed["Objective"].to_numpy(dtype=float), finished
+
+    def get_suggestion(self, parameters, results, lower_is_better):
+        self.count += 1
+        if self.max_num_trials and self.count > self.max_num_trials:
+            return None
+        if self.encoding is None:
+            self.encoding = ParameterEncoding(parameters)
+
+        rows, y, finished = self.observed(parameters, results)
+        num_initial_points = self.num_initial_points or len(parameters) + 1
+
+        if len(y) < num_initial_points:
+            suggestion = self.random_search.get_suggestion(parameters, results, lower_is_better)
+        else:
+            if len(y) != self.num_points_seen or len(self.next_trials) == 0:
+                # a new batch once new results are available
+                pending = [self.suggested_values[key] for key in (self.suggested - finished).elements()]
+                self.next_trials = self.batch(rows, y if lower_is_better else -y, pending)
+                self.num_points_seen = len(y)
+            suggestion = self.next_trials.pop(0)
+
+        key = self.key(suggestion)
+        self.suggested[key] += 1
+        self.suggested_values[key] = suggestion
+        return suggestion
+
+    def batch(self, rows, y, pending):
+        x = np.array([self.encoding.encode(row) for row in rows])
+        lie = {"min": y.min(), "mean": y.mean(), "max": y.max()}[self.liar]
+
+        gp = GaussianProcess(x, y)
+        x_lied = np.vstack([x] + [self.encoding.encode(values)[None, :] for values in pending])
+        y_lied = np.concatenate([y, np.full(len(pending), lie)])
+        if len(pending) > 0:
+            gp.fit(x_lied, y_lied)
+
+        good_points = x[np.argsort(y)[:5]]
+        candidates = np.vstack([
+            self.encoding.sample(self.num_candidates, self.rng),
+            self.encoding.perturb(good_points, self.num_candidates // 4, 0.05, self.rng),
+            self.encoding.perturb(good_points, self.num_candidates // 4, 0.2, self.rng)
+        ])
+
+        suggestions = []
+        for _ in range(max(1, self.max_concurrent)):
+            mu, sigma = gp.predict(candidates)
+            ei = expected_improvement(mu, sigma, best=y.min())
+            values = self.encoding.decode(candidates[int(np.argmax(ei))])
+            suggestions.append(values)
+
+            # the chosen point, snapped to valid parameter values, is lied about for the next point
+            x_lied = np.vstack([x_lied, self.encoding.encode(values)[None, :]])
+            y_lied = np.append(y_lied, lie)
+            gp.fit(x_lied, y_lied)
+        return suggestions
@@ -0,0 +1,44 @@
+import os
+import statistics
+
+from slurm_utils.execution.resume import load_json
+
+
+class BundleSizer:
+    """Decides how many trials are run back to back in one step.
+
+    A fixed `bundle_size` is used as is. In the "auto" mode trials are bundled such that a bundle runs about
+    `target_secs` seconds, based on the median `time_in_secs` of the finished trials. Until the first trials
+    finished, trials are not bundled.
+    """
+
+    def __init__(self, bundle_size=1, target_secs: float = 300, max_size: int = 16):
+        self.bundle_size = bundle_size
+        self.target_secs = target_secs
+        self.max_size = max_size
+
+        self.times_in_secs = []
+
+    def observe(self, time_in_secs: float):
+        if time_in_secs is not None and time_in_secs > 0:
+            self.times_in_secs.append(time_in_secs)
+
+    def size(self):
+        if self.bundle_size != "auto":
+            return max(1, int(self.bundle_size))
+        if len(self.times_in_secs) == 0:
+            return 1
+        median_time = statistics.median(self.times_in_secs[-100:])
+        return max(1, min(self.max_size, int(self.target_secs // median_time)))
+
+
+def read_bundle_status(run_dir: str):
+    """Returns exit code and runtime of a bundled trial, as written by bundle_run.sh, or None if it did not run."""
+    status = load_json(os.path.join(run_dir, "bundle_status.json"))
+    if status is None:
+        return None
+    return {
+        "time_in_secs": (status["end_ns"] - status["start_ns"]) / 1e9,
+        "returncode": status["returncode"]
+    }
+
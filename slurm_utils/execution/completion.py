@@ -0,0 +1,63 @@
+import os
+import time
+import logging
+
+import selectors
+
+
+class CompletionWatcher:
+    """Wakes up the scheduler as soon as one of the registered trial processes exits.
+
+    Every process gets a pidfd (Linux >= 5.3) which becomes readable once the process terminates.
+    Where pidfds are not available, `wait` falls back to sleeping `poll_interval` seconds.
+    """
+
+    def __init__(self, poll_interval: float = 1.0):
+        self.poll_interval = poll_interval
+
+        self.use_pidfd = hasattr(os, "pidfd_open")
+        self.selector = selectors.DefaultSelector()
+        self.fds = {}
+
+    def register(self, run_id, process):
+        if not self.use_pidfd:
+            return
+
+        try:
+            # trials of the worker pool are not child processes, their handles provide a descriptor instead
+            fd = process.completion_fd() if hasattr(process, "completion_fd") else os.pidfd_open(process.pid)
+        except OSError as e:
+            logging.debug(f"pidfd_open not usable ({e}), fall back to polling every {self.poll_interval}s.")
+            self.use_pidfd = False
+            return
+
+        self.fds[run_id] = fd
+        self.selector.register(fd, selectors.EVENT_READ, run_id)
+
+    def unregister(self, run_id):
+        fd = self.fds.pop(run_id, None)
+        if fd is None:
+            return
+        self.selector.unregister(fd)
+        os.close(fd)
+
+    def wait(self, timeout: float = None):
+        """Block until a registered process exited, returns the run ids of all exited processes.
+
+        An empty list means that the timeout passed (or that the fallback polling interval passed),
+        so callers should poll their processes anyway.
+        """
+        if timeout is None:
+            timeout = self.poll_interval
+
+        if not self.use_pidfd or len(self.fds) == 0:
+            time.sleep(min(timeout, self.poll_interval))
+            return []
+
+        events = self.selector.select(timeout=timeout)
+        return [key.data for key, _ in events]
+
+    def close(self):
+        for run_id in list(self.fds.keys()):
+            self.unregister(run_id)
+        self.selector.close()
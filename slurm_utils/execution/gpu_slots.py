@@ -0,0 +1,41 @@
+class GpuSlotAllocator:
+    """Hands out the GPUs of an allocation to trials.
+
+    GPUs are identified by their position 0..num_gpus-1 in the allocation. Trials may ask for different numbers of
+    GPUs, a trial gets a block of neighbouring free GPUs if there is one, otherwise the free GPUs with the lowest
+    positions.
+    """
+
+    def __init__(self, num_gpus: int):
+        self.num_gpus = num_gpus
+        self.free = set(range(num_gpus))
+        self.leases = {}
+
+    def num_free(self):
+        return len(self.free)
+
+    def can_allocate(self, num_gpus: int):
+        return num_gpus <= len(self.free)
+
+    def find_block(self, num_gpus: int):
+        free = sorted(self.free)
+        for i in range(len(free) - num_gpus + 1):
+            if free[i + num_gpus - 1] - free[i] == num_gpus - 1:
+                return free[i: i + num_gpus]
+        return free[:num_gpus]
+
+    def allocate(self, run_id, num_gpus: int):
+        if num_gpus > self.num_gpus:
+            raise ValueError(f"Trial {run_id} needs {num_gpus} GPUs, but the allocation only has {self.num_gpus}.")
+        if not self.can_allocate(num_gpus):
+            raise RuntimeError(f"Only {len(self.free)} GPUs are free, trial {run_id} needs {num_gpus}.")
+
+        gpus = self.find_block(num_gpus)
+        self.free.difference_update(gpus)
+        self.leases[run_id] = gpus
+        return gpus
+
+    def release(self, run_id):
+        gpus = self.leases.pop(run_id, [])
+        self.free.update(gpus)
+        return gpus
@@ -5,12 +5,30 @@ import time
 import json
 
 import subprocess
-import invoke
 
-from sherpa import Study
+from sherpa import Study, Trial
+from sherpa.algorithms import GridSearch
 from slurm_utils.config.resources import ResourceConfig
 
 from slurm_utils.execution.parameters import RunConfig
+from slurm_utils.execution.completion import CompletionWatcher
+from slurm_utils.execution.trial_state import TrialRegistry, RUNNING
+from slurm_utils.execution.persistence import StudyPersistence
+from slurm_utils.execution.resume import load_completed_trials, ResumeState, load_json
+from slurm_utils.execution.gpu_slots import GpuSlotAllocator
+from slurm_utils.execution.bundles import BundleSizer, read_bundle_status
+from slurm_utils.execution.step_metrics import StepMetricsReader
+from slurm_utils.execution.result_cache import ResultCache, project_code_version
+from slurm_utils.execution.walltime import AllocationClock, RuntimeEstimator, DeferredTrials
+from slurm_utils.execution.resource_sampler import ResourceSampler, RUN_ID_VARIABLE
+from slurm_utils.execution.retries import TrialRetries
+from slurm_utils.execution.ordering import RuntimeModel, LongestFirstOrder
+from slurm_utils.execution.workspace import TrialWorkspace
+from slurm_utils.execution.worker_pool import WorkerPool, WORKER_FILE
+from slurm_utils.execution import staging
+from slurm_utils.execution.staging import STAGED_DATA_VARIABLE
+from slurm_utils.execution.tracing import Tracer, TRIAL_START_FILE
+from slurm_utils.execution.metrics_export import PrometheusExporter, metrics_path
 
 
 class JobScheduler:
@@ -35,7 +53,163 @@ class JobScheduler:
 
         self.executable = executable  # either local, or otherwise accelerate is used
 
-        self.processes = {}
+        self.processes = TrialRegistry()
+        self.completion_watcher = CompletionWatcher(poll_interval=config.poll_interval)
+        self.persistence = StudyPersistence(
+            study=study,
+            study_dir=study.output_dir,
+            save_every=config.save_every,
+            save_interval=config.save_interval
+        )
+        self.resume_state = None
+
+        self.gpu_allocator = None
+        if config.gpu_packing:
+            if resource_config.nodes > 1:
+                logging.warning("GPU packing is only supported for single node allocations, it is disabled.")
+            else:
+                self.gpu_allocator = GpuSlotAllocator(num_gpus=resource_config.gpus_per_node)
+                self.max_processes = resource_config.gpus_per_node
+
+        # set by schedulers whose trials need a network port, e.g. for `accelerate launch`
+        self.port_leases = None
+
+        # trials of the running bundles, by the run id of the bundle (the run id of its first trial)
+        self.bundles = {}
+        self.bundle_sizer = BundleSizer(
+            bundle_size=config.bundle_size, target_secs=config.bundle_target_secs, max_size=config.bundle_max_size
+        )
+
+        # intermediate results reported by the trials, see `report_step`
+        self.step_reader = StepMetricsReader()
+        self.last_steps = {}
+        self.stopped_early = set()
+        self.last_step_check = time.time()
+
+        self.result_cache = None
+        if config.result_cache:
+            self.result_cache = self.create_result_cache()
+
+        # trials are only admitted if they are expected to finish within the allocation
+        self.allocation_clock = AllocationClock() if config.walltime_aware else None
+        self.runtime_estimator = RuntimeEstimator(
+            quantile=config.runtime_quantile,
+            min_samples=config.runtime_min_samples,
+            default_secs=config.expected_trial_secs
+        )
+        self.deferred_trials = DeferredTrials(work_dir)
+        self.deferred_queue = []
+        self.admission_closed = False
+
+        self.trial_order = None
+        if config.trial_ordering == "longest_first":
+            if config.is_pre_enumerable():
+                self.trial_order = LongestFirstOrder(
+                    model=RuntimeModel(
+                        parameter_names=[parameter.name for parameter in config.parameters],
+                        expression=config.trial_cost,
+                        min_samples=config.runtime_min_samples
+                    ),
+                    num_slots=self.max_processes,
+                    study_dir=study.output_dir
+                )
+            else:
+                logging.warning("Trials can only be ordered for grid and random search, they run as suggested.")
+        self.workspace = TrialWorkspace(work_dir)
+        # created on the first launch, see create_worker_pool
+        self.use_worker_pool = config.executor == "worker_pool"
+        self.worker_pool = None
+        if self.trial_order is not None:
+            self.suggestions = self.ordered_trials()
+        elif config.is_pre_enumerable() and config.prepare_run_dirs_ahead:
+            self.suggestions = self.prepared_trials()
+        else:
+            self.suggestions = self.suggested_trials()
+        self.retries = TrialRetries(
+            max_attempts=config.max_attempts,
+            returncodes=config.retry_returncodes,
+            log_patterns=config.retry_log_patterns,
+            backoff_secs=config.retry_backoff_secs,
+            backoff_factor=config.retry_backoff_factor,
+            max_backoff_secs=config.retry_max_backoff_secs,
+            exclude_failed_nodes=config.retry_exclude_nodes
+        )
+        if config.retry_exclude_nodes and not self.can_exclude_nodes():
+            logging.warning("Retries can only avoid failed nodes in allocations with several nodes, they run anywhere.")
+            self.retries.exclude_failed_nodes = False
+
+        # spans of the scheduler and the trials, written to study/trace.json on close
+        self.tracer = Tracer(enabled=config.tracing)
+
+        # live metrics for the textfile collector of the node exporter, written from the first launch on
+        self.metrics_exporter = None
+        if config.metrics_file is not None:
+            self.metrics_exporter = self.create_metrics_exporter()
+        # when the scheduler loop last woke up, None while it waits
+        self.loop_woken_ns = None
+
+        self.resource_sampler = None
+        if config.resource_sampling:
+            if resource_config.nodes > 1:
+                logging.warning("Resource sampling only sees the trials on the node of the scheduler.")
+            self.resource_sampler = ResourceSampler(
+                interval=config.resource_sample_interval,
+                gpu_interval=config.gpu_sample_interval,
+                gpu_probe_command=config.gpu_probe_command,
+                keep_timeseries=config.resource_timeseries
+            )
+
+    def create_result_cache(self):
+        code_version = self.config.code_version or project_code_version(self.resource_config.proj_name)
+        if code_version is None:
+            logging.warning(
+                f"Code version of project {self.resource_config.proj_name} is unknown, the result cache is disabled."
+            )
+            return None
+
+        cache_dir = self.config.result_cache_dir
+        if cache_dir is None:
+            cache_dir = os.path.join(os.environ.get("SU_STORAGE", self.work_dir), "cache", "results")
+        return ResultCache(
+            cache_dir=cache_dir,
+            code_version=code_version,
+            max_entries=self.config.result_cache_max_entries,
+            max_age_days=self.config.result_cache_max_age_days
+        )
+
+    def create_metrics_exporter(self):
+        experiment = os.path.basename(os.path.normpath(self.work_dir))
+        labels = {"experiment": experiment}
+        if "SLURM_JOB_ID" in os.environ:
+            labels["job_id"] = os.environ["SLURM_JOB_ID"]
+        exporter = PrometheusExporter(
+            path=metrics_path(self.config.metrics_file, experiment),
+            interval=self.config.metrics_interval,
+            labels=labels
+        )
+        exporter.lower_is_better = self.study.lower_is_better
+        return exporter
+
+    def report_launch(self, launch_start_ns: int):
+        if self.metrics_exporter is None:
+            return
+        # subclasses may limit the number of processes after __init__
+        self.metrics_exporter.num_slots = self.max_processes
+        self.metrics_exporter.start()
+        self.metrics_exporter.process_started(launch_secs=(self.tracer.now() - launch_start_ns) / 1e9)
+
+    def loop_waits(self):
+        # the iteration of the loop ends when the scheduler waits again
+        if self.metrics_exporter is not None and self.loop_woken_ns is not None:
+            self.metrics_exporter.loop_iteration((self.tracer.now() - self.loop_woken_ns) / 1e9)
+        self.loop_woken_ns = None
+
+    def loop_wakes(self):
+        self.loop_woken_ns = self.tracer.now()
+
+    def result_cache_key(self, trial):
+        parameter_names = [parameter.name for parameter in self.config.parameters]
+        return self.result_cache.key(trial.parameters, parameter_names=parameter_names, data_dir=self.data_dir)
 
     def write_job_config(self, run_id: int, trial):
         work_dir = os.path.join(self.work_dir, f"run_{run_id}")
@@ -49,13 +223,8 @@ class JobScheduler:
         config["verbosity"] = 0
 
         config_file = os.path.join(work_dir, "config.cfg")
-        with open(config_file, "w") as f:
-            for k, v in config.items():
-                f.write(f"--{k}={v} \n")
-
-        config_json = os.path.join(work_dir, "config.json")
-        with open(config_json, "w") as f:
-            json.dump(config, f)
+        self.workspace.write_file(config_file, "".join(f"--{k}={v} \n" for k, v in config.items()))
+        self.workspace.write_file(os.path.join(work_dir, "config.json"), json.dumps(config))
 
         return config_file
 
@@ -64,94 +233,486 @@ class JobScheduler:
 MAIN_FILE={os.path.join(self.work_dir, "scripts", "main.py")}
 FLAG_FILE={os.path.join(self.work_dir, f"run_{run_id}", "config.cfg")}
 
-{executable} $MAIN_FILE --flagfile=$FLAG_FILE
+{self.write_trace_start(run_id)}# exec, such that signals of the scheduler, e.g. for early stopping, reach the trial
+exec {executable} $MAIN_FILE --flagfile=$FLAG_FILE{self.data_dir_flag()}
 """
         return file
 
+    def write_trace_start(self, run_id):
+        # the end of the startup of the trial in its timeline, see Tracer
+        if not self.tracer.enabled:
+            return ""
+        return f"date +%s%N > {os.path.join(self.work_dir, f'run_{run_id}', TRIAL_START_FILE)}\n\n"
+
     def save_single_run_file(self, run_id, file):
         single_run_path = os.path.join(self.work_dir, f"run_{run_id}", "single_run.sh")
-        with open(single_run_path, "w") as f:
-            f.write(file)
-        invoke.run(f"chmod 700 {single_run_path}")
+        self.workspace.write_file(single_run_path, file, executable=True)
 
-    def write_trial_run_file(self, run_id):
+    def write_bundled_run_command(self, run_id, executable):
+        # the exit code and runtime of every trial are written to its run directory, see read_bundle_status
+        run_dir = os.path.join(self.work_dir, f"run_{run_id}")
+        file = f"""
+# trial {run_id}
+START_NS=$(date +%s%N)
+{executable} $MAIN_FILE --flagfile={os.path.join(run_dir, "config.cfg")}{self.data_dir_flag()} > {os.path.join(run_dir, "output.out")} 2>&1
+RETURNCODE=$?
+echo "{{\\"returncode\\": $RETURNCODE, \\"start_ns\\": $START_NS, \\"end_ns\\": $(date +%s%N)}}" > {os.path.join(run_dir, "bundle_status.json")}
+"""
+        return file
+
+    def run_file_header(self):
         raise NotImplementedError("Please Implement this method.")
 
+    def trial_executable(self):
+        return "python"
+
+    def stages_data(self):
+        return self.config.data_staging and self.data_dir is not None
+
+    def write_data_staging(self):
+        # the first trial on a node copies the data directory, the others wait for it, see DataStager
+        if not self.stages_data():
+            return ""
+        options = f"--source={self.data_dir}"
+        if self.config.data_staging_dir is not None:
+            options += f" --staging_root={self.config.data_staging_dir}"
+        if self.config.data_staging_hardlink:
+            options += " --hardlink"
+        # staging.py is run by its path, `python -m` would import the whole package for every trial
+        return f"""
+# Stage the data on this node
+{STAGED_DATA_VARIABLE}=$(python {os.path.abspath(staging.__file__)} {options}) || {STAGED_DATA_VARIABLE}={self.data_dir}
+export {STAGED_DATA_VARIABLE}
+"""
+
+    def data_dir_flag(self):
+        # flags after the flag file override it, config.cfg keeps the data directory of the shared storage
+        if not self.stages_data():
+            return ""
+        return f" --data_dir=${STAGED_DATA_VARIABLE}"
+
+    def write_trial_run_file(self, run_id):
+        # the header and command only differ in the run id, they are rendered once per experiment
+        file = self.workspace.render(
+            "single_run",
+            lambda token: self.run_file_header() + self.write_data_staging() + self.write_run_command(token, self.trial_executable()),
+            run_id
+        )
+        self.save_single_run_file(run_id, file)
+
+    def write_bundle_run_file(self, bundle_id, run_ids):
+        # the environment is set up once, then the trials run one after the other
+        file = self.workspace.render(
+            "bundle_header",
+            lambda token: self.run_file_header() + self.write_data_staging() + f"""
+MAIN_FILE={os.path.join(self.work_dir, "scripts", "main.py")}
+""",
+            bundle_id
+        )
+        for run_id in run_ids:
+            file += self.workspace.render(
+                "bundled_trial", lambda token: self.write_bundled_run_command(token, self.trial_executable()), run_id
+            )
+
+        bundle_run_path = os.path.join(self.work_dir, f"run_{bundle_id}", "bundle_run.sh")
+        self.workspace.write_file(bundle_run_path, file, executable=True)
+
+    def run_script(self, run_id):
+        if run_id in self.bundles:
+            return os.path.join(self.work_dir, f"run_{run_id}", "bundle_run.sh")
+        return os.path.join(self.work_dir, f"run_{run_id}", "single_run.sh")
+
     def num_processes_running(self):
-        nr = sum([1 for proc in self.processes.values() if proc["is_active"] == "is_running"])
-        return nr
+        return self.processes.num_running
 
     def num_finished_running(self):
-        nr = sum([1 for proc in self.processes.values() if proc["is_active"] == "is_finished"])
-        return nr
-
-    def wait_until_resources_available(self):
-        while self.num_processes_running() >= self.max_processes:
-            self.poll_processes()
-            time.sleep(1)
+        return len(self.processes.finished)
+
+    def wait_for_processes(self):
+        # on a timeout no run ids are returned, then all running processes are polled
+        self.loop_waits()
+        finished_run_ids = self.completion_watcher.wait()
+        self.loop_wakes()
+        self.poll_processes(run_ids=finished_run_ids or None)
+        if time.time() - self.last_step_check >= self.config.step_interval:
+            self.check_steps()
+        self.save_study()
+
+    def trial_gpus(self, trial):
+        if self.config.gpus_parameter is not None:
+            return int(trial.parameters.get(self.config.gpus_parameter, self.resource_config.gpus_per_task))
+        return self.resource_config.gpus_per_task
+
+    def can_exclude_nodes(self):
+        # all trials run on the node of the scheduler
+        return False
+
+    def can_allocate(self, num_gpus: int = 0, excluded: list = ()):
+        # `excluded` are the nodes the trial must not run on, see NodeInventory
+        return self.gpu_allocator is None or self.gpu_allocator.can_allocate(num_gpus)
+
+    def resources_available(self, num_gpus: int = 0, excluded: list = ()):
+        if self.num_processes_running() >= self.max_processes:
+            return False
+        return self.can_allocate(num_gpus, excluded=excluded)
+
+    def wait_until_resources_available(self, num_gpus: int = 0, excluded: list = ()):
+        if self.resources_available(num_gpus, excluded=excluded):
+            return
+        with self.tracer.span("wait_for_slot"):
+            while not self.resources_available(num_gpus, excluded=excluded):
+                self.wait_for_processes()
 
     def wait_until_all_finished(self):
         logging.info("Waiting until processes are finished.")
-        while not all([proc["is_active"] == "is_finished" for proc in self.processes.values()]):
-            self.poll_processes()
-            time.sleep(1)
+        while self.processes.num_active() > 0:
+            self.wait_for_processes()
+            self.finish_processes()
         logging.info("All processes are finished.")
 
     def create_run_command(self, run_id):
         raise NotImplementedError("Please Implement this method.")
 
+    def trial_environment(self, run_id):
+        # all processes of the trial inherit the run id, the resource sampler finds them by it
+        env = os.environ.copy()
+        env[RUN_ID_VARIABLE] = str(run_id)
+        return env
+
+    def pool_environment(self, run_id):
+        # the variables a forked trial sets on top of the environment of its worker
+        return {
+            key: value for key, value in self.trial_environment(run_id).items() if os.environ.get(key) != value
+        }
+
+    def write_worker_run_file(self):
+        # the environment is set up once per worker, then the worker imports the main file
+        worker_run_path = os.path.join(self.work_dir, "workers", "worker_run.sh")
+        os.makedirs(os.path.dirname(worker_run_path), exist_ok=True)
+        file = self.run_file_header() + self.write_data_staging()
+        file += f"""
+MAIN_FILE={os.path.join(self.work_dir, "scripts", "main.py")}
+
+exec {self.trial_executable()} {WORKER_FILE} --main_file=$MAIN_FILE
+"""
+        self.workspace.write_file(worker_run_path, file, executable=True)
+        return worker_run_path
+
+    def create_worker_command(self, worker_run_path: str):
+        raise NotImplementedError("Please Implement this method.")
+
+    def create_worker_pool(self):
+        return WorkerPool(
+            command=self.create_worker_command(self.write_worker_run_file()),
+            num_workers=self.max_processes,
+            log_dir=os.path.join(self.work_dir, "workers")
+        )
+
+    def allocate_resources(self, run_id, trial):
+        if self.gpu_allocator is not None:
+            # the trials of a bundle run one after the other on the GPUs of the bundle
+            trials = self.bundles.get(run_id, [trial])
+            gpus = self.gpu_allocator.allocate(run_id, max(self.trial_gpus(t) for t in trials))
+            logging.debug(f"Trial {trial.id} is pinned to GPUs {gpus}")
+        if self.port_leases is not None:
+            # leased on the node the trial runs on, placed schedulers choose it before
+            self.port_leases.lease(run_id, node=self.trial_node(run_id))
+
+    def trial_node(self, run_id):
+        # None for the node of the scheduler
+        return None
+
+    def release_resources(self, run_id, process_stats: dict):
+        if self.gpu_allocator is not None:
+            process_stats["gpus"] = self.gpu_allocator.release(run_id)
+        if self.port_leases is not None:
+            process_stats["port"] = self.port_leases.release(run_id)
+
+    def save_run_command(self, run_id, execution_sh_command):
+        work_dir = os.path.join(self.work_dir, f"run_{run_id}")
+        execution_sh_file = os.path.join(work_dir, "run_command.sh")
+        self.workspace.write_file(execution_sh_file, " ".join(execution_sh_command), executable=True)
+
     def submit_process(self, run_id, trial):
         logging.info(f"Start Trial {trial.id}, with parameters {trial.parameters}")
+        launch_start_ns = self.tracer.now()
 
         # write command
+        self.allocate_resources(run_id, trial)
         execution_sh_command = self.create_run_command(run_id)
 
         # save command to file
         work_dir = os.path.join(self.work_dir, f"run_{run_id}")
-        execution_sh_file = os.path.join(work_dir, "run_command.sh")
-        with open(execution_sh_file, "w") as f:
-            f.write(" ".join(execution_sh_command))
-        invoke.run(f"chmod 700 {execution_sh_file}")
-
-        # open process
-        f = open(os.path.join(work_dir, 'output.out'), 'w')
-        process = subprocess.Popen(execution_sh_command, stderr=f, stdout=f)
+        self.save_run_command(run_id, execution_sh_command)
+
+        if self.use_worker_pool and run_id not in self.bundles:
+            # the command is kept to rerun the trial by hand, the trial itself is forked by a warm worker
+            if self.worker_pool is None:
+                self.worker_pool = self.create_worker_pool()
+            f = None
+            process = self.worker_pool.submit(
+                run_id,
+                flag_file=os.path.join(work_dir, "config.cfg"),
+                output_file=os.path.join(work_dir, "output.out"),
+                env=self.pool_environment(run_id)
+            )
+        else:
+            # open process, trials of a bundle write their output to their own run directories
+            output_file = "bundle.out" if run_id in self.bundles else "output.out"
+            f = open(os.path.join(work_dir, output_file), 'w')
+            process = subprocess.Popen(execution_sh_command, stderr=f, stdout=f, env=self.trial_environment(run_id))
+        self.completion_watcher.register(run_id, process)
+        if self.resource_sampler is not None:
+            self.resource_sampler.register(run_id, process=process if f is None else None)
 
         # set statistics
-        self.processes[run_id] = {
-            "process": process,
-            "file": f,
-            "start_time": time.time(),
-            "trial": trial,
-            "is_active": "is_running"
-        }
+        self.processes.add(run_id=run_id, trial=trial, process=process, file=f, start_time=time.time())
+        self.tracer.trial_launched(run_id, launch_start_ns)
+        self.report_launch(launch_start_ns)
 
-    def poll_processes(self):
-        for run_id, process_dict in self.processes.items():
-            process = process_dict["process"]
-            is_finished = process.poll()
+    def poll_processes(self, run_ids=None):
+        if run_ids is None:
+            entries = self.processes.running()
+        else:
+            entries = [self.processes.active[run_id] for run_id in run_ids if run_id in self.processes.active]
+
+        for entry in entries:
+            is_finished = entry.process.poll()
 
-            if is_finished is not None and self.processes[run_id]["is_active"] == "is_running":
-                self.processes[run_id]["is_active"] = "stopped_running"
-                self.finish_process(run_id)
+            if is_finished is not None and entry.is_active == RUNNING:
+                self.processes.mark_stopped(entry.run_id)
+                self.finish_process(entry.run_id)
 
     def finish_process(self, run_id: str):
-        if run_id not in self.processes:
+        if run_id not in self.processes.active:
             return
 
-        work_dir = os.path.join(self.work_dir, f"run_{run_id}")
+        self.completion_watcher.unregister(run_id)
+        exited_ns = self.tracer.now()
 
-        process_dict = self.processes[run_id]
-        process_dict["file"].close()
+        entry = self.processes.active[run_id]
+        if entry.file is not None:
+            entry.file.close()
 
-        returncode = process_dict["process"].returncode
+        returncode = entry.process.returncode
         process_stats = {
-            "time_in_secs": time.time() - process_dict["start_time"],
+            "time_in_secs": time.time() - entry.start_time,
             "returncode": returncode
         }
+        self.release_resources(run_id, process_stats)
+        if self.resource_sampler is not None:
+            process_stats["resources"] = self.resource_sampler.finish(
+                run_id, work_dir=os.path.join(self.work_dir, f"run_{run_id}")
+            )
+
+        runs = None
+        if run_id in self.bundles and self.tracer.enabled:
+            runs = [self.tracer.read_bundled_run(trial.id, self.run_dir(trial.id)) for trial in self.bundles[run_id]]
+            runs = [run for run in runs if run is not None]
+        self.tracer.trial_exited(run_id, exited_ns, run_dir=self.run_dir(run_id), runs=runs)
+
+        if run_id in self.bundles:
+            # every trial of a bundle is finalized with its own exit code and runtime
+            for trial in self.bundles.pop(run_id):
+                trial_stats = self.bundled_trial_stats(trial.id, process_stats)
+                trial_stats["bundle_id"] = run_id
+                self.finish_trial(trial.id, trial, trial_stats)
+                if trial.id != run_id:
+                    self.processes.add_finished(
+                        run_id=trial.id,
+                        trial_id=trial.id,
+                        start_time=entry.start_time,
+                        time_in_secs=trial_stats["time_in_secs"],
+                        returncode=trial_stats["returncode"]
+                    )
+                else:
+                    process_stats = trial_stats
+        else:
+            self.finish_trial(run_id, entry.trial, process_stats)
+        self.save_study()
+
+        self.processes.finish(
+            run_id, time_in_secs=process_stats["time_in_secs"], returncode=process_stats["returncode"]
+        )
+        self.tracer.trial_finished(run_id, exited_ns)
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.process_finished(finalize_secs=(self.tracer.now() - exited_ns) / 1e9)
+
+    def bundled_trial_stats(self, run_id, bundle_stats: dict):
+        trial_stats = read_bundle_status(os.path.join(self.work_dir, f"run_{run_id}"))
+        if trial_stats is None:
+            # the step was terminated before the trial ran
+            logging.warning(f"Bundled trial {run_id} did not run, it is recorded as failed.")
+            trial_stats = {"time_in_secs": 0, "returncode": bundle_stats["returncode"] or -1}
+        for key, value in bundle_stats.items():
+            trial_stats.setdefault(key, value)
+        return trial_stats
+
+    def finish_trial(self, run_id, trial, process_stats: dict):
+        work_dir = os.path.join(self.work_dir, f"run_{run_id}")
+        process_stats["attempt"] = self.retries.attempt(trial.id)
         with open(os.path.join(work_dir, "process_stats.json"), "w") as f:
             json.dump(process_stats, f)
 
+        if self.retry_trial(run_id, trial, process_stats):
+            if self.metrics_exporter is not None:
+                self.metrics_exporter.trial_retried()
+            return
+
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.trial_ran(process_stats["time_in_secs"])
+        if process_stats["returncode"] == 0:
+            self.bundle_sizer.observe(process_stats["time_in_secs"])
+            self.runtime_estimator.observe(process_stats["time_in_secs"])
+            if self.trial_order is not None:
+                self.trial_order.model.observe(trial.parameters, process_stats["time_in_secs"])
+        self.observe_trial(run_id, trial, process_stats["returncode"])
+        if process_stats["returncode"] == 0:
+            self.cache_result(run_id, trial, time_in_secs=process_stats["time_in_secs"])
+
+    def failed_node(self, run_id, process_stats: dict):
+        # the node a failed trial ran on, to exclude it from the retries
+        return None
+
+    def retry_trial(self, run_id, trial, process_stats: dict):
+        # returns True if the failed trial runs again, its failure does not reach the study then
+        if process_stats["returncode"] == 0 or run_id in self.stopped_early or self.admission_closed:
+            return False
+
+        work_dir = os.path.join(self.work_dir, f"run_{run_id}")
+        delay = self.retries.retry(
+            trial,
+            returncode=process_stats["returncode"],
+            log_file=os.path.join(work_dir, "output.out"),
+            node=self.failed_node(run_id, process_stats)
+        )
+        if delay is None:
+            return False
+
+        # the files of the failed attempt are kept next to the ones of the retry
+        for file_name in ("output.out", "process_stats.json", "test_metrics.json", "step_metrics.jsonl",
+                          "bundle_status.json"):
+            path = os.path.join(work_dir, file_name)
+            if os.path.isfile(path):
+                name, extension = os.path.splitext(path)
+                os.replace(path, f"{name}.attempt{process_stats['attempt']}{extension}")
+        # the retry reports its steps from the start, the steps of the failed attempt are dropped from the study
+        self.step_reader.forget(run_id)
+        if self.last_steps.pop(run_id, None) is not None:
+            self.persistence.discard_observations(trial)
+        return True
+
+    def cache_result(self, run_id, trial, time_in_secs: float):
+        work_dir = os.path.join(self.work_dir, f"run_{run_id}")
+        test_metrics = load_json(os.path.join(work_dir, "test_metrics.json"))
+        if self.result_cache is None or test_metrics is None:
+            return
+        self.result_cache.store(
+            self.result_cache_key(trial), test_metrics=test_metrics, source=work_dir, time_in_secs=time_in_secs
+        )
+
+    def observe_cached_trial(self, trial):
+        # returns False if the trial has to be run
+        entry = self.result_cache.lookup(self.result_cache_key(trial), objective=self.config.objective)
+        if entry is None:
+            return False
+
+        run_id = trial.id
+        work_dir = self.workspace.make_run_dir(run_id)
+        self.write_job_config(run_id=run_id, trial=trial)
+        with open(os.path.join(work_dir, "test_metrics.json"), "w") as f:
+            json.dump(entry["test_metrics"], f)
+        with open(os.path.join(work_dir, "process_stats.json"), "w") as f:
+            json.dump({"time_in_secs": 0, "returncode": 0, "cached_from": entry.get("source")}, f)
+
+        logging.info(f"Trial {trial.id} is taken from the result cache, it ran in {entry.get('source')}.")
+        self.result_cache.record_hit(run_id, entry)
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.trial_cached()
+        self.observe_trial(run_id, trial, returncode=0)
+        self.processes.add_finished(
+            run_id=run_id, trial_id=trial.id, start_time=time.time(), time_in_secs=0, returncode=0
+        )
+        return True
+
+    def fail_oversized_trial(self, trial):
+        # a trial which asks for more GPUs than the node has would wait for them forever, it fails without a launch
+        num_gpus = self.trial_gpus(trial)
+        if self.gpu_allocator is None or num_gpus <= self.gpu_allocator.num_gpus:
+            return False
+
+        run_id = trial.id
+        work_dir = self.workspace.make_run_dir(run_id)
+        self.write_job_config(run_id=run_id, trial=trial)
+        message = f"Trial {trial.id} needs {num_gpus} GPUs, but the node only has {self.gpu_allocator.num_gpus}."
+        with open(os.path.join(work_dir, "output.out"), "w") as f:
+            f.write(message + "\n")
+        with open(os.path.join(work_dir, "process_stats.json"), "w") as f:
+            json.dump({"time_in_secs": 0, "returncode": -1, "error": message}, f)
+
+        logging.error(f"{message} It fails without being started.")
+        self.observe_trial(run_id, trial, returncode=-1)
+        self.processes.add_finished(
+            run_id=run_id, trial_id=trial.id, start_time=time.time(), time_in_secs=0, returncode=-1
+        )
+        return True
+
+    def observe_steps(self, run_id, trial):
+        # adds the new intermediate results of a trial to the study, returns how many were added
+        num_observed = 0
+        for metrics in self.step_reader.read(run_id, os.path.join(self.work_dir, f"run_{run_id}")):
+            step = metrics.pop("step", None)
+            if step is None or self.config.objective not in metrics:
+                logging.warning(f"Trial {trial.id} reported a step without step or {self.config.objective}.")
+                continue
+            if run_id in self.last_steps and step <= self.last_steps[run_id]:
+                continue
+
+            self.persistence.add_observation(
+                trial, iteration=step, objective=metrics[self.config.objective], context=metrics
+            )
+            self.last_steps[run_id] = step
+            num_observed += 1
+        return num_observed
+
+    def check_steps(self):
+        self.last_step_check = time.time()
+        with self.tracer.span("check_steps"):
+            self.stop_losing_trials()
+
+    def stop_losing_trials(self):
+        for entry in self.processes.running():
+            # a bundle runs several trials in one process, they are not stopped early
+            if entry.run_id in self.bundles or entry.run_id in self.stopped_early:
+                continue
+            if self.observe_steps(entry.run_id, entry.trial) == 0:
+                continue
+
+            if self.study.should_trial_stop(entry.trial):
+                logging.info(f"Stop trial {entry.trial.id} early, after step {self.last_steps[entry.run_id]}.")
+                self.stopped_early.add(entry.run_id)
+                self.terminate_trial(entry)
+
+    def terminate_trial(self, entry):
+        entry.process.terminate()
+
+    def observe_trial(self, run_id, trial, returncode):
+        work_dir = os.path.join(self.work_dir, f"run_{run_id}")
+
+        # the final results are observed after the last reported step
+        self.observe_steps(run_id, trial)
+        self.step_reader.forget(run_id)
+        iteration = self.last_steps.pop(run_id, 0) + 1
+
+        if run_id in self.stopped_early:
+            self.stopped_early.discard(run_id)
+            if returncode != 0:
+                logging.info(f"Finalize trial {trial.id}, it was stopped early.")
+                self.persistence.finalize(trial, status="STOPPED")
+                if self.metrics_exporter is not None:
+                    self.metrics_exporter.trial_finished("stopped")
+                return
+
         test_metrics_file = os.path.join(work_dir, "test_metrics.json")
         if returncode == 0 and os.path.isfile(test_metrics_file):
             with open(test_metrics_file, "r") as f:
@@ -162,40 +723,266 @@ FLAG_FILE={os.path.join(self.work_dir, f"run_{run_id}", "config.cfg")}
                     )
                 result = metrics.get(self.config.objective)
 
-            self.study.add_observation(process_dict["trial"], iteration=1, objective=result, context=metrics)
+            self.persistence.add_observation(trial, iteration=iteration, objective=result, context=metrics)
         elif returncode == 0:
-            self.study.add_observation(
-                process_dict["trial"], iteration=1, objective=0, context={"help": "No metrics provided"}
+            self.persistence.add_observation(
+                trial, iteration=iteration, objective=0, context={"help": "No metrics provided"}
             )
             result = "No result"
         else:
-            self.study.add_observation(process_dict["trial"], iteration=1, objective=0, context={"error": returncode})
+            self.persistence.add_observation(trial, iteration=iteration, objective=0, context={"error": returncode})
             result = "No result"
 
-        logging.info(f"Finalize trial {process_dict['trial'].id}, {self.config.objective}: {result}")
+        logging.info(f"Finalize trial {trial.id}, {self.config.objective}: {result}")
 
-        self.study.finalize(process_dict["trial"])
-        self.study.save()
+        self.persistence.finalize(trial)
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.trial_finished(
+                "completed" if returncode == 0 else "failed", objective=result if returncode == 0 else None
+            )
 
-        self.processes[run_id]["is_active"] = "is_finished"
+    def save_study(self):
+        # the full results table is only rewritten every few trials, see StudyPersistence
+        with self.tracer.span("save_study"):
+            self.persistence.maybe_save()
 
     def finish_processes(self):
-        for run_id, process_dict in self.processes.items():
-            if process_dict["is_active"] == "stopped_running":
-                self.finish_process(run_id=run_id)
+        for run_id in list(self.processes.stopped):
+            self.finish_process(run_id=run_id)
+
+    def run_dir(self, run_id):
+        return os.path.join(self.work_dir, f"run_{run_id}")
+
+    def prepare_trial(self, run_id, trial):
+        self.workspace.make_run_dir(run_id)
+        self.write_job_config(run_id=run_id, trial=trial)
+        self.write_trial_run_file(run_id=run_id)
+
+    def resume(self):
+        completed, max_run_id = load_completed_trials(
+            work_dir=self.work_dir, study_dir=self.study.output_dir, objective=self.config.objective
+        )
+        parameter_names = [parameter.name for parameter in self.config.parameters]
+
+        # feed the finished trials back into the study, such that the algorithm knows about them
+        for run_id, result in sorted(completed.items()):
+            parameters = {name: result["parameters"].get(name) for name in parameter_names}
+            trial = Trial(id=run_id, parameters=parameters)
+            self.study.add_observation(trial, iteration=1, objective=result["objective"], context=result["context"])
+            self.study.finalize(trial, status=result.get("status", "COMPLETED"))
+
+        # new trials must not reuse the run directories of previous trials
+        self.study.num_trials = max(self.study.num_trials, max_run_id)
+        self.resume_state = ResumeState(completed=completed, parameter_names=parameter_names)
+        self.persistence.save()
+
+        self.runtime_estimator.load(self.work_dir)
+        if self.trial_order is not None:
+            self.trial_order.model.load(self.work_dir)
+        # deferred trials are run first, a grid search suggests them again anyway
+        deferred = self.deferred_trials.pop_previous()
+        if not isinstance(self.config.algorithm, GridSearch):
+            self.deferred_queue = [
+                {name: trial["parameters"].get(name) for name in parameter_names} for trial in deferred
+            ]
+
+        logging.info(f"Resume experiment, {len(completed)} trials were completed before.")
+
+    def suggested_trials(self):
+        while len(self.deferred_queue) > 0:
+            self.study.num_trials += 1
+            yield Trial(id=self.study.num_trials, parameters=self.deferred_queue.pop(0))
+        yield from self.study
+
+    def enumerated_trials(self):
+        # all trials are known upfront, their run directories are created in the background meanwhile
+        trials = [
+            trial for trial in self.suggested_trials()
+            if self.resume_state is None or not self.resume_state.is_completed(trial)
+        ]
+        if self.config.prepare_run_dirs_ahead:
+            self.workspace.create_ahead([trial.id for trial in trials])
+        return trials
+
+    def prepared_trials(self):
+        # a generator, so the trials are enumerated after a resume
+        yield from self.enumerated_trials()
+
+    def ordered_trials(self):
+        # trials completed in a previous run are not planned
+        trials = self.enumerated_trials()
+        # subclasses may limit the number of processes after the order was created
+        self.trial_order.num_slots = self.max_processes
+        yield from self.trial_order.order(trials)
+
+    def admit_trials(self, trials):
+        # trials which would not finish before the end of the allocation are deferred to a resumed run
+        if self.allocation_clock is None:
+            return True
+        if not self.admission_closed:
+            remaining_secs = self.allocation_clock.remaining_secs()
+            expected_secs = self.runtime_estimator.estimate()
+            if remaining_secs is None or expected_secs is None:
+                return True
+            # the trials of a bundle run one after the other
+            expected_secs *= len(trials)
+            if expected_secs + self.config.walltime_margin_secs <= remaining_secs:
+                return True
+
+            logging.info(
+                f"Stop starting trials, they need about {expected_secs:.0f}s but the allocation ends in "
+                f"{remaining_secs:.0f}s. Deferred trials are listed in {self.deferred_trials.path}."
+            )
+            self.admission_closed = True
+
+        for trial in trials:
+            self.deferred_trials.add(
+                trial, expected_secs=self.runtime_estimator.estimate(), remaining_secs=self.allocation_clock.remaining_secs()
+            )
+        return False
+
+    def next_trial(self):
+        for trial in self.suggestions:
+            if self.resume_state is not None and self.resume_state.is_completed(trial):
+                logging.info(f"Skip trial with parameters {trial.parameters}, it was completed before.")
+                continue
+            # cached results are observed right away, nothing is launched for them
+            if self.result_cache is not None and self.observe_cached_trial(trial):
+                continue
+            if self.fail_oversized_trial(trial):
+                continue
+            return trial
+        return None
+
+    def num_free_slots(self):
+        return max(0, self.max_processes - self.num_processes_running())
+
+    def request_suggestions(self, num_trials: int):
+        # batch algorithms then suggest the next `num_trials` trials together, spread over the search space
+        if self.config.batch_suggestions:
+            self.study.algorithm.max_concurrent = max(1, num_trials)
+
+    def next_bundles(self, num_bundles: int):
+        # retries run as single trials, before any new trial
+        bundles = [[trial] for trial in self.retries.pop_ready(num_bundles)]
+        self.request_suggestions((num_bundles - len(bundles)) * self.bundle_sizer.size())
+        while len(bundles) < num_bundles:
+            bundle = self.next_bundle()
+            if bundle is None:
+                break
+            bundles.append(bundle)
+        return bundles
+
+    def next_bundle(self):
+        bundle = []
+        bundle_size = self.bundle_sizer.size()
+        while len(bundle) < bundle_size:
+            trial = self.next_trial()
+            if trial is None:
+                break
+            bundle.append(trial)
+        return bundle or None
+
+    def submit_bundle(self, bundle):
+        bundle_id = bundle[0].id
+        prepare_start_ns = self.tracer.now()
+        for trial in bundle:
+            self.prepare_trial(run_id=trial.id, trial=trial)
+
+        logging.info(f"Bundle trials {[trial.id for trial in bundle]} into one step.")
+        self.bundles[bundle_id] = bundle
+        self.write_bundle_run_file(bundle_id, [trial.id for trial in bundle])
+        self.tracer.trial_span(bundle_id, "prepare", prepare_start_ns, self.tracer.now())
+        self.submit_process(run_id=bundle_id, trial=bundle[0])
+
+    def launch_bundle(self, bundle):
+        # wait for free resources
+        self.wait_until_resources_available(
+            num_gpus=max(self.trial_gpus(trial) for trial in bundle), excluded=self.retries.excluded_nodes(bundle[0].id)
+        )
+
+        # run clean up routines for finished jobs
+        self.finish_processes()
+
+        if not self.admit_trials(bundle):
+            return
+
+        if len(bundle) > 1:
+            self.submit_bundle(bundle)
+            return
+
+        trial = bundle[0]
+        run_id = trial.id
+        prepare_start_ns = self.tracer.now()
+        self.prepare_trial(run_id=run_id, trial=trial)
+        self.tracer.trial_span(run_id, "prepare", prepare_start_ns, self.tracer.now())
+        self.submit_process(run_id=run_id, trial=trial)
 
     def loop_hyperparams(self):
-        for trial in self.study:
-            # wait for free resources
+        self.loop_wakes()
+        while not self.admission_closed:
+            # trials are suggested once slots are free, for all free slots at once
             self.wait_until_resources_available()
-
-            # run clean up routines for finished jobs
             self.finish_processes()
 
-            run_id = trial.id
-            os.makedirs(os.path.join(self.work_dir, f"run_{run_id}"), exist_ok=True)
-            self.write_job_config(run_id=run_id, trial=trial)
-            self.write_trial_run_file(run_id=run_id)
-            self.submit_process(run_id=run_id, trial=trial)
-
+            with self.tracer.span("suggest"):
+                bundles = self.next_bundles(self.num_free_slots())
+            if len(bundles) == 0:
+                # running trials may still fail and be retried
+                if self.retries.num_pending == 0 and not (self.retries.enabled and self.processes.num_active() > 0):
+                    break
+                self.wait_for_retries()
+                continue
+            for bundle in bundles:
+                self.launch_bundle(bundle)
+
+        if self.admission_closed:
+            # retries which are not started anymore are deferred like new trials
+            self.admit_trials(self.retries.pop_all())
+            self.defer_remaining_trials()
         logging.info("Started all trials")
+
+    def defer_remaining_trials(self):
+        # a resumed grid search suggests its remaining points again, other algorithms only start the deferred trials
+        if isinstance(self.config.algorithm, GridSearch):
+            return
+        remaining = list(iter(self.next_trial, None))
+        if len(remaining) > 0:
+            logging.info(f"Defer the {len(remaining)} trials which were not suggested yet.")
+            self.admit_trials(remaining)
+
+    def wait_for_retries(self):
+        if self.processes.num_running > 0:
+            self.wait_for_processes()
+        else:
+            self.loop_waits()
+            time.sleep(self.retries.secs_until_ready() or 0)
+            self.loop_wakes()
+
+    def write_result_cache_report(self):
+        self.result_cache.evict()
+        report = self.result_cache.report()
+        logging.info(
+            f"Result cache: {report['hits']} hits, {report['misses']} misses, {report['stored']} stored, "
+            f"{report['evicted']} evicted, {report['saved_secs']:.0f} seconds of trial runtime saved."
+        )
+        with open(os.path.join(self.study.output_dir, "result_cache_report.json"), "w") as f:
+            json.dump(report, f)
+
+    def close(self):
+        if self.result_cache is not None:
+            self.write_result_cache_report()
+        if self.trial_order is not None:
+            self.trial_order.report(self.processes.finished.values())
+        self.persistence.close()
+        if self.port_leases is not None:
+            self.port_leases.close()
+        self.completion_watcher.close()
+        self.workspace.close()
+        if self.worker_pool is not None:
+            self.worker_pool.close()
+        if self.resource_sampler is not None:
+            self.resource_sampler.close()
+        self.tracer.write(self.study.output_dir, num_slots=self.max_processes)
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.close()
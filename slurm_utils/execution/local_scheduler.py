@@ -7,10 +7,10 @@ class LocalJobScheduler(JobScheduler):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
-        self.max_processes = 1
+        if self.gpu_allocator is None:
+            self.max_processes = 1
 
-    def write_trial_run_file(self, run_id):
-        executable = "python"
+    def run_file_header(self):
         file = f"""#!/bin/bash
 
 # environment setup
@@ -26,11 +26,24 @@ source $SU_STORAGE/server_setup/init_slurm.sh
 """
 # workon $PROJ_NAME
 # """
+        return file
 
-        file += self.write_run_command(run_id, executable)
-        self.save_single_run_file(run_id, file)
+    def trial_environment(self, run_id):
+        env = super().trial_environment(run_id)
+        if self.gpu_allocator is None:
+            return env
+
+        # the allocator hands out positions within the GPUs visible to the scheduler
+        visible_gpus = os.environ.get("CUDA_VISIBLE_DEVICES", "")
+        visible_gpus = visible_gpus.split(",") if visible_gpus != "" else None
+        gpus = [visible_gpus[i] if visible_gpus else str(i) for i in self.gpu_allocator.leases[run_id]]
+
+        env["CUDA_VISIBLE_DEVICES"] = ",".join(gpus)
+        return env
+
+    def create_worker_command(self, worker_run_path: str):
+        return ["sh", worker_run_path]
 
     def create_run_command(self, run_id):
-        work_dir = os.path.join(self.work_dir, f"run_{run_id}")
-        execution_sh_command = ["sh", os.path.join(work_dir, "single_run.sh")]
+        execution_sh_command = ["sh", self.run_script(run_id)]
         return execution_sh_command
@@ -8,6 +8,8 @@ import json
 from slurm_utils.config.load import load_config
 from slurm_utils.execution.server_scheduler import SlurmJobScheduler
 from slurm_utils.execution.local_scheduler import LocalJobScheduler
+from slurm_utils.execution.async_scheduler import AsyncSlurmJobScheduler, AsyncLocalJobScheduler
+from slurm_utils.execution.array import ArrayJobScheduler
 
 from sherpa import Study
 
@@ -15,26 +17,18 @@ from slurm_utils.config.resources import ResourceConfig
 from slurm_utils.execution.parameters import RunConfig
 
 
-def log_best_results(study, config):
+def log_best_results(study, config, work_dir: str = None):
     best = study.get_best_result()
     logging.info(f"Best trial run - ID: {best.get('Trial-ID')}, {config.objective}: {best.get('Objective')} ")
-    logging.info(f"Find all related data at {best.get('work_dir')}")
 
+    # trials restored from a previous run do not carry their work_dir as parameter
+    best_work_dir = best.get('work_dir')
+    if not isinstance(best_work_dir, str) and work_dir is not None:
+        best_work_dir = os.path.join(work_dir, f"run_{best.get('Trial-ID')}")
+    logging.info(f"Find all related data at {best_work_dir}")
 
-def schedule_and_run_jobs(executable: str, run_file: str, work_dir: str, data_dir: str, config_file: str):
-
-    logging.debug(f"Start hyperparameter optimization with")
-    logging.debug(f"executable: {executable}")
-    logging.debug(f"train_file: {run_file}")
-    logging.debug(f"work_dir: {work_dir}")
-    logging.debug(f"data_dir: {data_dir}")
-    logging.debug(f"config_file: {config_file}")
-
-    experiment_config = load_config(config_file)
-
-    config = RunConfig(experiment_config=experiment_config)
-    resource_config = ResourceConfig(experiment_config=experiment_config)
 
+def create_study(config: RunConfig, work_dir: str):
     parameter_names = [parameter.name for parameter in config.parameters]
     with open(os.path.join(work_dir, "parameters.json"), "w") as f:
         json.dump(parameter_names, f)
@@ -46,34 +40,93 @@ def schedule_and_run_jobs(executable: str, run_file: str, work_dir: str, data_di
         parameters=config.parameters,
         algorithm=config.algorithm,
         lower_is_better=False,
+        stopping_rule=config.stopping_rule,
         disable_dashboard=True,
         output_dir=study_dir
     )
+    return study
+
+
+def schedule_and_run_jobs(
+        executable: str, run_file: str, work_dir: str, data_dir: str, config_file: str, resume: bool = False
+):
+
+    logging.debug(f"Start hyperparameter optimization with")
+    logging.debug(f"executable: {executable}")
+    logging.debug(f"train_file: {run_file}")
+    logging.debug(f"work_dir: {work_dir}")
+    logging.debug(f"data_dir: {data_dir}")
+    logging.debug(f"config_file: {config_file}")
+    logging.debug(f"resume: {resume}")
+
+    experiment_config = load_config(config_file)
+
+    config = RunConfig(experiment_config=experiment_config)
+    resource_config = ResourceConfig(experiment_config=experiment_config)
+
+    study = create_study(config=config, work_dir=work_dir)
     if executable == "local":
-        process_manager = LocalJobScheduler(
-            study=study,
-            config=config,
-            executable=executable,
-            work_dir=work_dir,
-            data_dir=data_dir,
-            resource_config=resource_config
-        )
+        scheduler_class = AsyncLocalJobScheduler if config.scheduler == "async" else LocalJobScheduler
     else:
-        process_manager = SlurmJobScheduler(
-            study=study,
-            config=config,
-            executable=executable,
-            work_dir=work_dir,
-            data_dir=data_dir,
-            resource_config=resource_config
-        )
+        scheduler_class = AsyncSlurmJobScheduler if config.scheduler == "async" else SlurmJobScheduler
+
+    process_manager = scheduler_class(
+        study=study,
+        config=config,
+        executable=executable,
+        work_dir=work_dir,
+        data_dir=data_dir,
+        resource_config=resource_config
+    )
+
+    if resume or config.resume:
+        process_manager.resume()
 
     start_time = time.time()
     process_manager.loop_hyperparams()
     process_manager.wait_until_all_finished()
+    process_manager.close()
     end_time = time.time()
 
     # TODO - summary write
     # writer pandas frame and JOSN of time / objective per run, sort py objective
 
-    log_best_results(study=process_manager.study, config=config)
+    log_best_results(study=process_manager.study, config=config, work_dir=work_dir)
+
+
+def create_array_scheduler(executable: str, work_dir: str, data_dir: str, config_file: str, resume: bool = False):
+    experiment_config = load_config(config_file)
+
+    config = RunConfig(experiment_config=experiment_config)
+    resource_config = ResourceConfig(experiment_config=experiment_config)
+
+    array_scheduler = ArrayJobScheduler(
+        study=create_study(config=config, work_dir=work_dir),
+        config=config,
+        executable=executable,
+        work_dir=work_dir,
+        data_dir=data_dir,
+        resource_config=resource_config
+    )
+    if resume or config.resume:
+        array_scheduler.resume()
+    return array_scheduler
+
+
+def prepare_array_jobs(executable: str, work_dir: str, data_dir: str, config_file: str, resume: bool = False):
+    array_scheduler = create_array_scheduler(
+        executable=executable, work_dir=work_dir, data_dir=data_dir, config_file=config_file, resume=resume
+    )
+    run_ids = array_scheduler.prepare_array()
+    array_scheduler.close()
+    return len(run_ids)
+
+
+def gather_array_results(executable: str, work_dir: str, data_dir: str, config_file: str):
+    array_scheduler = create_array_scheduler(
+        executable=executable, work_dir=work_dir, data_dir=data_dir, config_file=config_file
+    )
+    array_scheduler.gather_results()
+    array_scheduler.close()
+
+    log_best_results(study=array_scheduler.study, config=array_scheduler.config, work_dir=work_dir)
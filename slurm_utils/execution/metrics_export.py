@@ -0,0 +1,215 @@
+import os
+import math
+import time
+import socket
+import logging
+import threading
+
+# upper bounds of the histogram buckets, in seconds
+TRIAL_DURATION_BUCKETS = [10, 60, 300, 900, 1800, 3600, 7200, 14400, 43200, 86400]
+SCHEDULER_STEP_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60]
+
+
+class Histogram:
+    def __init__(self, buckets: list):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def lines(self, name: str, labels: str):
+        bucket_labels = f"{labels}," if labels else ""
+        lines = [
+            f'{name}_bucket{{{bucket_labels}le="{bound}"}} {count}' for bound, count in zip(self.buckets, self.counts)
+        ]
+        lines.append(f'{name}_bucket{{{bucket_labels}le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class PrometheusExporter:
+    """Writes the state of a running sweep for the textfile collector of the node exporter.
+
+    The scheduler reports started and finished trials and the time it works in each iteration of its loop, from
+    waking up until it waits again. A background thread writes all metrics every `interval` seconds to a temporary
+    file which replaces the `.prom` file, so the collector never reads a partial file.
+    `su_scheduler_last_activity_timestamp_seconds` only moves while the scheduler launches or finalizes trials, a
+    hanging scheduler is noticed by it. The file is removed when the sweep ends.
+    """
+
+    def __init__(self, path: str, interval: float = 15, num_slots: int = 1, labels: dict = None):
+        self.path = path
+        self.interval = interval
+        self.num_slots = num_slots
+        self.labels = ",".join(f'{key}="{escape_label(value)}"' for key, value in (labels or {}).items())
+
+        self.lock = threading.Lock()
+        self.num_running = 0
+        self.num_started = 0
+        self.finished = {"completed": 0, "failed": 0, "stopped": 0}
+        self.num_cached = 0
+        self.num_retried = 0
+        self.best_objective = None
+        self.lower_is_better = False
+        self.trial_durations = Histogram(TRIAL_DURATION_BUCKETS)
+        self.scheduler_steps = {
+            "launch": Histogram(SCHEDULER_STEP_BUCKETS), "finalize": Histogram(SCHEDULER_STEP_BUCKETS)
+        }
+        self.loop_iterations = Histogram(SCHEDULER_STEP_BUCKETS)
+
+        self.start_time = time.time()
+        self.last_activity = self.start_time
+        # slot seconds in use, integrated whenever the number of running processes changes
+        self.busy_secs = 0.0
+        self.last_change = time.monotonic()
+
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="prometheus-exporter", daemon=True)
+
+    def start(self):
+        if self.thread.is_alive():
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.thread.start()
+
+    def integrate_busy_secs(self):
+        now = time.monotonic()
+        self.busy_secs += self.num_running * (now - self.last_change)
+        self.last_change = now
+
+    def process_started(self, launch_secs: float):
+        with self.lock:
+            self.integrate_busy_secs()
+            self.num_running += 1
+            self.num_started += 1
+            self.scheduler_steps["launch"].observe(launch_secs)
+            self.last_activity = time.time()
+
+    def process_finished(self, finalize_secs: float):
+        with self.lock:
+            self.integrate_busy_secs()
+            self.num_running = max(0, self.num_running - 1)
+            self.scheduler_steps["finalize"].observe(finalize_secs)
+            self.last_activity = time.time()
+
+    def loop_iteration(self, secs: float):
+        with self.lock:
+            self.loop_iterations.observe(secs)
+
+    def trial_finished(self, status: str, objective=None):
+        with self.lock:
+            self.finished[status] += 1
+            if isinstance(objective, (int, float)) and not math.isnan(objective):
+                is_better = self.best_objective is None or (
+                    objective < self.best_objective if self.lower_is_better else objective > self.best_objective
+                )
+                if is_better:
+                    self.best_objective = objective
+
+    def trial_ran(self, time_in_secs: float):
+        with self.lock:
+            self.trial_durations.observe(time_in_secs)
+
+    def trial_cached(self):
+        with self.lock:
+            self.num_cached += 1
+
+    def trial_retried(self):
+        with self.lock:
+            self.num_retried += 1
+
+    def metric(self, lines: list, name: str, metric_type: str, help_text: str, values: list):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for extra_labels, value in values:
+            labels = ",".join(label for label in [self.labels, extra_labels] if label)
+            lines.append(f"{name}{{{labels}}} {value}")
+
+    def render(self):
+        with self.lock:
+            self.integrate_busy_secs()
+            lines = []
+            self.metric(lines, "su_trials_running", "gauge", "Trial processes running.", [("", self.num_running)])
+            self.metric(lines, "su_trials_started_total", "counter", "Trial processes started.", [("", self.num_started)])
+            self.metric(
+                lines, "su_trials_finished_total", "counter", "Trials finalized in the study, by status.",
+                [(f'status="{status}"', count) for status, count in self.finished.items()]
+            )
+            self.metric(lines, "su_trials_cached_total", "counter", "Trials taken from the result cache.",
+                        [("", self.num_cached)])
+            self.metric(lines, "su_trials_retried_total", "counter", "Failed trials which run again.",
+                        [("", self.num_retried)])
+            self.metric(lines, "su_slots", "gauge", "Trials which can run at the same time.", [("", self.num_slots)])
+            self.metric(lines, "su_slot_utilization", "gauge", "Share of the slots running a trial.",
+                        [("", self.num_running / max(1, self.num_slots))])
+            self.metric(lines, "su_slot_busy_seconds_total", "counter", "Slot seconds used by trial processes.",
+                        [("", self.busy_secs)])
+            if self.best_objective is not None:
+                self.metric(lines, "su_best_objective", "gauge", "Best objective of the finished trials.",
+                            [("", self.best_objective)])
+
+            lines.append("# HELP su_trial_duration_seconds Runtime of finished trials.")
+            lines.append("# TYPE su_trial_duration_seconds histogram")
+            lines.extend(self.trial_durations.lines("su_trial_duration_seconds", self.labels))
+            lines.append("# HELP su_scheduler_step_seconds Time the scheduler spends launching and finalizing a trial.")
+            lines.append("# TYPE su_scheduler_step_seconds histogram")
+            for step, histogram in self.scheduler_steps.items():
+                step_labels = ",".join(label for label in [self.labels, f'step="{step}"'] if label)
+                lines.extend(histogram.lines("su_scheduler_step_seconds", step_labels))
+            lines.append(
+                "# HELP su_scheduler_loop_iteration_seconds Time the scheduler works in one iteration of its loop, "
+                "without waiting."
+            )
+            lines.append("# TYPE su_scheduler_loop_iteration_seconds histogram")
+            lines.extend(self.loop_iterations.lines("su_scheduler_loop_iteration_seconds", self.labels))
+
+            self.metric(lines, "su_scheduler_last_activity_timestamp_seconds", "gauge",
+                        "Last time the scheduler launched or finalized a trial.", [("", self.last_activity)])
+            self.metric(lines, "su_scheduler_start_timestamp_seconds", "gauge", "Start of the scheduler.",
+                        [("", self.start_time)])
+            self.metric(lines, "su_exporter_timestamp_seconds", "gauge", "Time the metrics were written.",
+                        [("", time.time())])
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                f.write(self.render())
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Could not write the metrics to {self.path}: {e}")
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.write()
+            self.stopped.wait(self.interval)
+
+    def close(self):
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def metrics_path(metrics_file: str, experiment: str):
+    # a directory, e.g. the one of the textfile collector, gets one file per experiment and job
+    if not (metrics_file.endswith(os.sep) or os.path.isdir(metrics_file)):
+        return metrics_file
+    job_id = os.environ.get("SLURM_JOB_ID", str(os.getpid()))
+    return os.path.join(metrics_file, f"su_{experiment}_{socket.gethostname()}_{job_id}.prom")
@@ -0,0 +1,114 @@
+import re
+
+
+def split_outside_brackets(text: str):
+    parts, depth, current = [], 0, ""
+    for char in text:
+        if char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        depth += {"[": 1, "]": -1}.get(char, 0)
+        current += char
+    if current:
+        parts.append(current)
+    return parts
+
+
+def expand_nodelist(nodelist: str):
+    """Expands SLURM host lists like `gpu[01-03,07],cpu1` to `[gpu01, gpu02, gpu03, gpu07, cpu1]`."""
+    nodes = []
+    for part in split_outside_brackets(nodelist.strip()):
+        match = re.fullmatch(r"([^\[\]]*)\[([^\]]+)\](.*)", part)
+        if match is None:
+            nodes.append(part)
+            continue
+        prefix, ranges, suffix = match.groups()
+        for suffix_node in expand_nodelist(suffix) if suffix else [""]:
+            for item in ranges.split(","):
+                if "-" in item:
+                    start, end = item.split("-")
+                    # zero padded ranges keep their width, e.g. 08-10
+                    nodes.extend(f"{prefix}{i:0{len(start)}d}{suffix_node}" for i in range(int(start), int(end) + 1))
+                else:
+                    nodes.append(f"{prefix}{item}{suffix_node}")
+    return nodes
+
+
+def expand_cpus_per_node(cpus_per_node: str, num_nodes: int):
+    """Expands `SLURM_JOB_CPUS_PER_NODE` like `32(x2),16` to one number per node, None if it does not fit."""
+    cpus = []
+    for item in cpus_per_node.split(","):
+        match = re.fullmatch(r"(\d+)(?:\(x(\d+)\))?", item.strip())
+        if match is None:
+            return None
+        cpus.extend([int(match.group(1))] * int(match.group(2) or 1))
+    return cpus if len(cpus) == num_nodes else None
+
+
+class NodeInventory:
+    """Free GPUs and CPUs of every node of a multi-node allocation.
+
+    A trial is placed on the node with the most free GPUs, then CPUs, which can hold it, such that steps spread over
+    the allocation instead of piling up on the node SLURM picks first. Excluded nodes are skipped, unless every node
+    which could hold the trial is excluded.
+    """
+
+    def __init__(self, nodes: list, gpus_per_node: int, cpus_per_node: list):
+        self.nodes = list(nodes)
+        self.gpus_per_node = gpus_per_node
+        self.free_gpus = {node: gpus_per_node for node in self.nodes}
+        self.total_cpus = dict(zip(self.nodes, cpus_per_node))
+        self.free_cpus = dict(self.total_cpus)
+        self.max_cpus = max(cpus_per_node, default=0)
+        # run id -> (node, gpus, cpus)
+        self.leases = {}
+
+    def fits(self, node, num_gpus: int, num_cpus: int):
+        return self.free_gpus[node] >= num_gpus and self.free_cpus[node] >= num_cpus
+
+    def allowed_nodes(self, num_gpus: int, num_cpus: int, excluded: list = ()):
+        # nodes which can hold the trial once they are free, excluded ones only if there is no other node
+        nodes = [node for node in self.nodes if num_gpus <= self.gpus_per_node and num_cpus <= self.total_cpus[node]]
+        allowed = [node for node in nodes if node not in excluded]
+        return allowed or nodes
+
+    def find_node(self, num_gpus: int, num_cpus: int, excluded: list = ()):
+        candidates = [
+            node for node in self.allowed_nodes(num_gpus, num_cpus, excluded) if self.fits(node, num_gpus, num_cpus)
+        ]
+        if len(candidates) == 0:
+            return None
+        return max(candidates, key=lambda node: (self.free_gpus[node], self.free_cpus[node]))
+
+    def is_placeable(self, num_gpus: int, num_cpus: int):
+        # larger trials are not placed, SLURM decides for them
+        return num_gpus <= self.gpus_per_node and num_cpus <= self.max_cpus
+
+    def can_allocate(self, num_gpus: int, num_cpus: int, excluded: list = ()):
+        return not self.is_placeable(num_gpus, num_cpus) or self.find_node(num_gpus, num_cpus, excluded) is not None
+
+    def allocate(self, run_id, num_gpus: int, num_cpus: int, excluded: list = ()):
+        """Returns the node of the trial, None if it is left to SLURM."""
+        if not self.is_placeable(num_gpus, num_cpus):
+            return None
+        node = self.find_node(num_gpus, num_cpus, excluded=excluded)
+        if node is None:
+            raise RuntimeError(f"No node has {num_gpus} GPUs and {num_cpus} CPUs free for trial {run_id}.")
+
+        self.free_gpus[node] -= num_gpus
+        self.free_cpus[node] -= num_cpus
+        self.leases[run_id] = (node, num_gpus, num_cpus)
+        return node
+
+    def node(self, run_id):
+        lease = self.leases.get(run_id)
+        return None if lease is None else lease[0]
+
+    def release(self, run_id):
+        if run_id not in self.leases:
+            return None
+        node, num_gpus, num_cpus = self.leases.pop(run_id)
+        self.free_gpus[node] += num_gpus
+        self.free_cpus[node] += num_cpus
+        return node
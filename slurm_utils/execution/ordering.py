@@ -0,0 +1,213 @@
+import os
+import re
+import json
+import math
+import heapq
+import logging
+import numbers
+
+import numpy as np
+
+from slurm_utils.execution.persistence import to_json
+from slurm_utils.execution.resume import load_json
+
+# functions available in cost expressions, besides the trial parameters
+EXPRESSION_FUNCTIONS = {
+    name: getattr(math, name) for name in ("log", "log2", "exp", "sqrt", "ceil", "floor", "pow")
+}
+EXPRESSION_FUNCTIONS.update({"min": min, "max": max, "abs": abs})
+
+
+def simulate_makespan(durations, num_slots: int):
+    """Makespan of running trials with the given durations in this order on `num_slots` slots (list scheduling)."""
+    slots = [0.0] * max(1, num_slots)
+    for duration in durations:
+        heapq.heapreplace(slots, slots[0] + duration)
+    return max(slots)
+
+
+class RuntimeModel:
+    """Predicts the runtime of a trial from its parameters.
+
+    With an `expression`, e.g. `epochs * hidden_size`, the runtime is a multiple of the expression, the factor is
+    fitted to the runtimes of finished trials. Otherwise the runtime is a linear function of the numeric parameters
+    and of one indicator per value of the other parameters, fitted by ridge regression.
+    """
+
+    def __init__(self, parameter_names: list, expression: str = None, min_samples: int = 3):
+        self.parameter_names = parameter_names
+        self.expression = compile(expression, "<trial_cost>", "eval") if expression else None
+        self.min_samples = min_samples
+
+        self.observations = []
+        self.categories = {}
+        self.coefficients = None
+        # changes whenever the model is fitted again
+        self.version = 0
+
+    def cost(self, parameters: dict):
+        # the value of the cost expression, in units of the expression
+        try:
+            return float(eval(self.expression, {"__builtins__": {}, **EXPRESSION_FUNCTIONS}, dict(parameters)))
+        except Exception as e:
+            raise ValueError(f"Could not evaluate trial_cost for parameters {parameters}: {e}")
+
+    def features(self, parameters: dict):
+        if self.expression is not None:
+            return np.array([self.cost(parameters)])
+
+        features = [1.0]
+        for name in self.parameter_names:
+            value = parameters.get(name)
+            if isinstance(value, numbers.Number) and not isinstance(value, bool):
+                features.append(float(value))
+            else:
+                categories = self.categories.setdefault(name, [])
+                features.extend(float(value == category) for category in categories)
+        return np.array(features)
+
+    def observe(self, parameters: dict, time_in_secs: float):
+        if time_in_secs is None or time_in_secs <= 0:
+            return
+        for name in self.parameter_names:
+            value = parameters.get(name)
+            if not isinstance(value, numbers.Number) or isinstance(value, bool):
+                categories = self.categories.setdefault(name, [])
+                if value not in categories:
+                    categories.append(value)
+        self.observations.append((parameters, time_in_secs))
+        self.fit()
+
+    def fit(self):
+        if len(self.observations) < self.min_samples:
+            return
+        x = np.array([self.features(parameters) for parameters, _ in self.observations])
+        y = np.array([time_in_secs for _, time_in_secs in self.observations])
+        if self.expression is not None:
+            # runtime = factor * cost
+            self.coefficients = np.array([x[:, 0] @ y / max(x[:, 0] @ x[:, 0], 1e-12)])
+        else:
+            ridge = 1e-3 * np.eye(x.shape[1])
+            ridge[0, 0] = 0
+            self.coefficients = np.linalg.solve(x.T @ x + ridge, x.T @ y)
+        self.version += 1
+
+    def predict(self, parameters: dict):
+        """Expected runtime in seconds, None as long as too few trials finished."""
+        if self.coefficients is None:
+            return None
+        return max(0.0, float(self.features(parameters) @ self.coefficients))
+
+    def priority(self, parameters: dict):
+        # trials with a higher priority start first, the expression orders trials before any trial finished
+        if self.expression is not None:
+            return self.cost(parameters)
+        return self.predict(parameters) or 0.0
+
+    @property
+    def priority_version(self):
+        # changes whenever the priorities of trials change
+        return 0 if self.expression is not None else self.version
+
+    def load(self, work_dir: str):
+        # runtimes and parameters of a previous run of the experiment
+        for dir_name in sorted(os.listdir(work_dir)):
+            if re.fullmatch(r"run_\d+", dir_name) is None:
+                continue
+            process_stats = load_json(os.path.join(work_dir, dir_name, "process_stats.json"))
+            parameters = load_json(os.path.join(work_dir, dir_name, "config.json"))
+            if process_stats is None or parameters is None:
+                continue
+            if process_stats.get("returncode") == 0 and "cached_from" not in process_stats:
+                self.observe(parameters, process_stats.get("time_in_secs"))
+
+
+class LongestFirstOrder:
+    """Orders all trials of a pre-enumerable algorithm such that the longest expected trials start first.
+
+    Starting the longest trials first (LPT) keeps few long trials from running alone at the end of an experiment.
+    The not yet started trials are ordered again whenever the learned runtime model changed. The plan is written
+    to `trial_plan.json`, the predicted and actual makespan to `makespan_report.json` in the study directory.
+    """
+
+    def __init__(self, model: RuntimeModel, num_slots: int, study_dir: str):
+        self.model = model
+        self.num_slots = num_slots
+        self.study_dir = study_dir
+
+        self.planned = []
+        self.predicted_makespan = None
+
+    def predicted_secs(self, parameters_list):
+        secs = [self.model.predict(parameters) for parameters in parameters_list]
+        return None if any(s is None for s in secs) else secs
+
+    def plan(self, trials):
+        self.planned = [(trial.id, dict(trial.parameters)) for trial in trials]
+        ordered = sorted(trials, key=lambda trial: -self.model.priority(trial.parameters))
+
+        predicted_secs = self.predicted_secs([trial.parameters for trial in ordered])
+        if predicted_secs is not None:
+            self.predicted_makespan = simulate_makespan(predicted_secs, self.num_slots)
+        logging.info(
+            f"Planned {len(trials)} trials longest first"
+            + (f", predicted makespan {self.predicted_makespan:.0f}s." if self.predicted_makespan else ".")
+        )
+
+        with open(os.path.join(self.study_dir, "trial_plan.json"), "w") as f:
+            json.dump({
+                "num_slots": self.num_slots,
+                "predicted_makespan_secs": self.predicted_makespan,
+                "trials": [
+                    {
+                        "trial_id": trial.id,
+                        "parameters": trial.parameters,
+                        "priority": self.model.priority(trial.parameters),
+                        "predicted_secs": None if predicted_secs is None else predicted_secs[i]
+                    } for i, trial in enumerate(ordered)
+                ]
+            }, f, default=to_json)
+
+    def order(self, trials):
+        # orders the not yet started trials, the model may have learned from finished trials in between
+        self.plan(trials)
+
+        pending = list(trials)
+        version = None
+        while len(pending) > 0:
+            if version != self.model.priority_version:
+                pending.sort(key=lambda trial: -self.model.priority(trial.parameters))
+                version = self.model.priority_version
+            yield pending.pop(0)
+
+    def report(self, finished):
+        """Compares the makespan of the experiment to the predicted one and to the one of the suggested order."""
+        records = [record for record in finished if record.time_in_secs and record.time_in_secs > 0]
+        actual = None
+        if len(records) > 0:
+            actual = (
+                max(record.start_time + record.time_in_secs for record in records)
+                - min(record.start_time for record in records)
+            )
+
+        # with the model after all trials finished
+        suggested_secs = self.predicted_secs([parameters for _, parameters in self.planned])
+        report = {
+            "num_slots": self.num_slots,
+            "num_trials": len(self.planned),
+            "predicted_makespan_secs_at_plan": self.predicted_makespan,
+            "actual_makespan_secs": actual,
+            "predicted_makespan_secs": None,
+            "predicted_suggested_order_makespan_secs": None
+        }
+        if suggested_secs is not None:
+            report["predicted_makespan_secs"] = simulate_makespan(sorted(suggested_secs, reverse=True), self.num_slots)
+            report["predicted_suggested_order_makespan_secs"] = simulate_makespan(suggested_secs, self.num_slots)
+
+        logging.info(
+            "Makespan: "
+            + ", ".join(f"{key} {value:.0f}" for key, value in report.items() if key.endswith("secs") and value)
+        )
+        with open(os.path.join(self.study_dir, "makespan_report.json"), "w") as f:
+            json.dump(report, f)
+        return report
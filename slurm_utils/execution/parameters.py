@@ -1,7 +1,10 @@
 from typing import Dict
 
 from sherpa import Parameter
-from sherpa.algorithms import GridSearch, GPyOpt
+from sherpa.algorithms import GridSearch, RandomSearch, GPyOpt, MedianStoppingRule
+
+from slurm_utils.execution.stopping import SuccessiveHalvingStoppingRule
+from slurm_utils.execution.batch_bo import ConstantLiarBO
 
 
 class RunConfig:
@@ -14,15 +17,162 @@ class RunConfig:
         self.algorithm_name = run_settings.get("hyperparam_algorithm", "grid")
         self.algorithm_params = run_settings.get("hyperparameter_params")
 
+        # seconds between two status checks, if no completion notification is available
+        self.poll_interval = run_settings.get("poll_interval", 1)
+
+        # "sync" runs the polling JobScheduler, "async" the AsyncJobScheduler
+        self.scheduler = run_settings.get("scheduler", "sync")
+        # the study results are rewritten after `save_every` finished trials or `save_interval` seconds
+        self.save_every = run_settings.get("save_every", 50)
+        self.save_interval = run_settings.get("save_interval", 60)
+
+        # continue a previous run of the experiment, finished trials are not run again
+        self.resume = run_settings.get("resume", False)
+
+        # pin trials to GPUs of the allocation, trials may need different numbers of GPUs
+        self.gpu_packing = run_settings.get("gpu_packing", False)
+        # name of the trial parameter holding the number of GPUs of a trial, defaults to gpus per task
+        self.gpus_parameter = run_settings.get("gpus_parameter")
+
+        # ports handed out to trials (RUN_PORT), leases are shared between schedulers via the lease file. Ports are
+        # only leased for `accelerate launch` or if a `port_range` is given, other trials take any free port
+        self.port_range = tuple(run_settings["port_range"]) if "port_range" in run_settings else None
+        self.port_lease_file = run_settings.get("port_lease_file")
+
+        # "scheduler" runs all trials from one sbatch allocation, "array" submits them as a SLURM job array
+        self.execution_mode = run_settings.get("execution_mode", "scheduler")
+        # maximal number of array tasks running at the same time
+        self.array_max_concurrent = run_settings.get("array_max_concurrent")
+
+        # number of trials run back to back in one step, or "auto" to derive it from the runtime of finished trials
+        self.bundle_size = run_settings.get("bundle_size", 1)
+        # in the auto mode, bundles are sized to run about `bundle_target_secs` seconds, with at most `bundle_max_size` trials
+        self.bundle_target_secs = run_settings.get("bundle_target_secs", 300)
+        self.bundle_max_size = run_settings.get("bundle_max_size", 16)
+
+        # results of earlier trials with the same parameters, data directory and code are reused, see ResultCache,
+        # off by default as changes of the files in the data directory are not noticed
+        self.result_cache = run_settings.get("result_cache", False)
+        self.result_cache_dir = run_settings.get("result_cache_dir")
+        self.result_cache_max_entries = run_settings.get("result_cache_max_entries", 10000)
+        self.result_cache_max_age_days = run_settings.get("result_cache_max_age_days", 90)
+        # identifies the code of the project, defaults to a hash of the installed project package
+        self.code_version = run_settings.get("code_version")
+
+        # trials are only started if they are expected to finish before the end of the SLURM allocation
+        self.walltime_aware = run_settings.get("walltime_aware", True)
+        self.walltime_margin_secs = run_settings.get("walltime_margin_secs", 120)
+        # the expected runtime is this quantile of the runtimes of finished trials, or `expected_trial_secs` before
+        self.runtime_quantile = run_settings.get("runtime_quantile", 0.9)
+        self.runtime_min_samples = run_settings.get("runtime_min_samples", 3)
+        self.expected_trial_secs = run_settings.get("expected_trial_secs")
+
+        # CPU, memory and I/O of the trial processes are sampled every `resource_sample_interval` seconds, GPUs
+        # every `gpu_sample_interval` seconds with nvidia-smi or `gpu_probe_command`. Only the processes on the node
+        # of the scheduler are seen, trials on other nodes of the allocation are not sampled
+        self.resource_sampling = run_settings.get("resource_sampling", False)
+        self.resource_sample_interval = run_settings.get("resource_sample_interval", 10)
+        self.gpu_sample_interval = run_settings.get("gpu_sample_interval", 30)
+        self.gpu_probe_command = run_settings.get("gpu_probe_command")
+        # additionally write all samples of a trial to resources.json in its run directory
+        self.resource_timeseries = run_settings.get("resource_timeseries", False)
+
+        # failed trials are run up to `max_attempts` times before the failure reaches the study, see TrialRetries
+        self.max_attempts = run_settings.get("max_attempts", 1)
+        # retryable failures, by default every failure is retried
+        self.retry_returncodes = run_settings.get("retry_returncodes")
+        self.retry_log_patterns = run_settings.get("retry_log_patterns")
+        # the n-th retry waits retry_backoff_secs * retry_backoff_factor ** (n - 1) seconds
+        self.retry_backoff_secs = run_settings.get("retry_backoff_secs", 30)
+        self.retry_backoff_factor = run_settings.get("retry_backoff_factor", 2)
+        self.retry_max_backoff_secs = run_settings.get("retry_max_backoff_secs", 600)
+        # retries do not run on the nodes the trial failed on (srun --exclude), only in allocations with several nodes
+        self.retry_exclude_nodes = run_settings.get("retry_exclude_nodes", False)
+
+        # "suggested" starts trials in the order of the algorithm, "longest_first" the longest expected trials first
+        self.trial_ordering = run_settings.get("trial_ordering", "suggested")
+        if self.trial_ordering not in ("suggested", "longest_first"):
+            raise ValueError(f"Unknown trial_ordering {self.trial_ordering}, use suggested or longest_first.")
+        # expression of the trial parameters proportional to the runtime, otherwise the runtime is learned
+        self.trial_cost = run_settings.get("trial_cost")
+
+        # for grid and random search, the run directories of all trials are created ahead in a background thread
+        self.prepare_run_dirs_ahead = run_settings.get("prepare_run_dirs_ahead", True)
+
+        # in multi-node allocations, trials are placed on nodes with free GPUs and CPUs (srun --nodelist --exact)
+        self.node_placement = run_settings.get("node_placement", True)
+
+        # "process" starts every trial in a new process, "worker_pool" forks trials from warm workers, see WorkerPool
+        self.executor = run_settings.get("executor", "process")
+
+        # the data directory is copied once per node to `data_staging_dir` (default: $TMPDIR or /dev/shm) and the
+        # trials read the copy, see DataStager
+        self.data_staging = run_settings.get("data_staging", False)
+        self.data_staging_dir = run_settings.get("data_staging_dir")
+        # hardlink instead of copying files, if the staging directory is on the same file system
+        self.data_staging_hardlink = run_settings.get("data_staging_hardlink", False)
+
+        # spans of the scheduler and the phases of every trial are written to study/trace.json, see Tracer
+        self.tracing = run_settings.get("tracing", False)
+
+        # path of a .prom file, or a directory, e.g. of the node exporter's textfile collector, see PrometheusExporter
+        self.metrics_file = run_settings.get("metrics_file")
+        self.metrics_interval = run_settings.get("metrics_interval", 15)
+
+        # seconds between two reads of the step metrics of running trials
+        self.step_interval = run_settings.get("step_interval", 5)
+
+        algorithm_params = self.algorithm_params or {}
+        # batch algorithms suggest as many trials at once as the scheduler has free slots, unless batch_size is set
+        self.batch_suggestions = False
         if self.algorithm_name == "bayesian":
+            model_type = algorithm_params.get("model_type", "GP_MCMC")
+            acquisition_type = algorithm_params.get("acquisition_type", "EI_MCMC")
+            batch_size = algorithm_params.get("batch_size", 1)
+            is_mcmc = model_type == "GP_MCMC" or acquisition_type.endswith("_MCMC")
+            if is_mcmc and batch_size > 1:
+                raise ValueError("GPyOpt only supports batch_size 1 with MCMC models, use model_type GP and EI.")
+
             self.algorithm = GPyOpt(
-                max_concurrent=1, model_type='GP_MCMC', acquisition_type='EI_MCMC', max_num_trials=10
+                max_concurrent=batch_size,
+                model_type=model_type,
+                acquisition_type=acquisition_type,
+                num_initial_data_points=algorithm_params.get("num_initial_points", "infer"),
+                max_num_trials=algorithm_params.get("max_num_trials", 10)
+            )
+        elif self.algorithm_name == "bayesian_batch":
+            self.algorithm = ConstantLiarBO(
+                max_num_trials=algorithm_params.get("max_num_trials", 10),
+                num_initial_points=algorithm_params.get("num_initial_points"),
+                max_concurrent=algorithm_params.get("batch_size", 1),
+                liar=algorithm_params.get("liar", "min"),
+                num_candidates=algorithm_params.get("num_candidates", 2000),
+                seed=algorithm_params.get("seed")
             )
+            self.batch_suggestions = "batch_size" not in algorithm_params
+        elif self.algorithm_name == "random":
+            self.algorithm = RandomSearch(max_num_trials=algorithm_params.get("max_num_trials", 10))
         else:
             self.algorithm = GridSearch(num_grid_points=2)
 
+        # trials reporting intermediate results with `report_step` are stopped early by the stopping rule
+        stopping_params = dict(run_settings.get("stopping_rule") or {})
+        stopping_name = stopping_params.pop("name", None)
+        if stopping_name == "median":
+            self.stopping_rule = MedianStoppingRule(**stopping_params)
+        elif stopping_name == "successive_halving":
+            self.stopping_rule = SuccessiveHalvingStoppingRule(**stopping_params)
+        elif stopping_name is None:
+            self.stopping_rule = None
+        else:
+            raise ValueError(f"Unknown stopping rule {stopping_name}, use median or successive_halving.")
+
         parameters = experiment_config.get("parameters", [])
         if isinstance(parameters, list):
             self.parameters = [Parameter.from_dict(p) for p in parameters]
         elif isinstance(parameters, dict):
             self.parameters = Parameter.grid(parameters)
+
+    def is_pre_enumerable(self):
+        # the suggestions of these algorithms do not depend on results, so all trials are known upfront
+        return isinstance(self.algorithm, (GridSearch, RandomSearch))
@@ -0,0 +1,83 @@
+import os
+import json
+import time
+import logging
+
+from sherpa import Study
+
+
+def to_json(value):
+    # numpy scalars, e.g. grid points, are converted to plain python values
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+class StudyPersistence:
+    """Write-behind persistence of a sherpa study.
+
+    Every observation and finalization is appended as one line to `observations.jsonl` in the study directory.
+    The full results table is only rewritten by `study.save()` after `save_every` finalized trials, after
+    `save_interval` seconds or on `close`, instead of once per trial.
+    """
+    log_file_name = "observations.jsonl"
+
+    def __init__(self, study: Study, study_dir: str, save_every: int = 50, save_interval: float = 60):
+        self.study = study
+        self.study_dir = study_dir
+
+        self.save_every = save_every
+        self.save_interval = save_interval
+
+        self.log_file = os.path.join(study_dir, self.log_file_name)
+        self.log = open(self.log_file, "a")
+
+        self.num_unsaved = 0
+        self.last_save = time.time()
+
+    def append(self, entry):
+        self.log.write(json.dumps(entry, default=to_json) + "\n")
+        self.log.flush()
+
+    def add_observation(self, trial, objective, iteration: int = 1, context: dict = None):
+        context = context or {}
+        self.study.add_observation(trial, iteration=iteration, objective=objective, context=context)
+        self.append({
+            "event": "observation",
+            "trial_id": trial.id,
+            "parameters": trial.parameters,
+            "iteration": iteration,
+            "objective": objective,
+            "context": context,
+            "time": time.time()
+        })
+
+    def discard_observations(self, trial):
+        # drops the observations of a trial which is not finalized yet, e.g. of a failed attempt which is retried
+        results = self.study.results
+        if len(results) > 0:
+            self.study.results = results[results["Trial-ID"] != trial.id].reset_index(drop=True)
+        self.append({"event": "discard", "trial_id": trial.id, "time": time.time()})
+
+    def finalize(self, trial, status: str = "COMPLETED"):
+        self.study.finalize(trial, status=status)
+        self.append({"event": "finalize", "trial_id": trial.id, "status": status, "time": time.time()})
+        self.num_unsaved += 1
+
+    def save(self):
+        self.study.save()
+        self.num_unsaved = 0
+        self.last_save = time.time()
+
+    def maybe_save(self):
+        if self.num_unsaved == 0:
+            return
+        if self.num_unsaved >= self.save_every or time.time() - self.last_save >= self.save_interval:
+            logging.debug(f"Save study with {self.num_unsaved} new trials.")
+            self.save()
+
+    def close(self):
+        if self.log.closed:
+            return
+        self.save()
+        self.log.close()
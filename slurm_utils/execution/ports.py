@@ -0,0 +1,115 @@
+import os
+import json
+import time
+import fcntl
+import socket
+import logging
+from contextlib import contextmanager
+
+
+DEFAULT_PORT_RANGE = (27100, 28100)
+
+
+def port_is_free(port: int):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        try:
+            s.bind(("", port))
+        except OSError:
+            return False
+    return True
+
+
+def pid_is_alive(pid: int):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class PortLeaseManager:
+    """Hands out ports for distributed trial launches, e.g. `accelerate launch --main_process_port`.
+
+    Leases are stored per node in a JSON file on shared storage and guarded by a lock file, such that schedulers of
+    different experiments never hand out the same port on the same node. Ports are checked to be free before they are
+    leased if the node is the node of the scheduler, the steps on other nodes check their port themselves. Leases of
+    dead schedulers on this host and leases older than `max_lease_age` seconds are dropped.
+    """
+
+    def __init__(self, lease_file: str, port_range=DEFAULT_PORT_RANGE, max_lease_age: float = 7 * 24 * 3600):
+        self.lease_file = lease_file
+        self.lock_file = lease_file + ".lock"
+        self.port_range = port_range
+        self.max_lease_age = max_lease_age
+
+        self.hostname = socket.gethostname()
+        self.owner = f"{self.hostname}:{os.getpid()}"
+
+        self.leases = {}
+
+        os.makedirs(os.path.dirname(os.path.abspath(lease_file)), exist_ok=True)
+
+    @contextmanager
+    def locked_leases(self):
+        with open(self.lock_file, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                leases = {}
+                if os.path.isfile(self.lease_file):
+                    with open(self.lease_file, "r") as f:
+                        try:
+                            leases = json.load(f)
+                        except json.JSONDecodeError:
+                            logging.warning(f"Port lease file {self.lease_file} is corrupt, it is reset.")
+
+                yield leases
+
+                tmp_file = f"{self.lease_file}.{self.owner}.tmp"
+                with open(tmp_file, "w") as f:
+                    json.dump(leases, f)
+                os.replace(tmp_file, self.lease_file)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def is_stale(self, lease: dict):
+        if time.time() - lease.get("time", 0) > self.max_lease_age:
+            return True
+        host, pid = lease.get("owner", ":").rsplit(":", 1)
+        return host == self.hostname and pid.isdigit() and not pid_is_alive(int(pid))
+
+    def lease(self, run_id, node: str = None):
+        node = node or self.hostname
+        with self.locked_leases() as leases:
+            for key in [key for key, lease in leases.items() if self.is_stale(lease)]:
+                leases.pop(key)
+
+            for port in range(*self.port_range):
+                key = f"{node}:{port}"
+                if key in leases:
+                    continue
+                if node == self.hostname and not port_is_free(port):
+                    continue
+
+                leases[key] = {"owner": self.owner, "run_id": run_id, "time": time.time()}
+                self.leases[run_id] = (key, port)
+                return port
+
+        raise RuntimeError(f"No free port in range {self.port_range} on node {node}.")
+
+    def port(self, run_id):
+        return self.leases[run_id][1]
+
+    def release(self, run_id):
+        if run_id not in self.leases:
+            return None
+        key, port = self.leases.pop(run_id)
+        with self.locked_leases() as leases:
+            if leases.get(key, {}).get("owner") == self.owner:
+                leases.pop(key)
+        return port
+
+    def close(self):
+        for run_id in list(self.leases.keys()):
+            self.release(run_id)
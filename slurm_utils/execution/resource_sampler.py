@@ -0,0 +1,248 @@
+import os
+import json
+import time
+import shlex
+import logging
+import threading
+import subprocess
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+# environment variable which marks all processes of a trial, set by the schedulers
+RUN_ID_VARIABLE = "SU_RUN_ID"
+
+
+def read_process(pid: str):
+    """CPU seconds (including reaped children), resident memory and I/O bytes of a process, None once it exited."""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm", "r") as f:
+            rss_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+
+    utime, stime, cutime, cstime = (int(field) for field in fields[11:15])
+    sample = {"cpu_secs": (utime + stime + cutime + cstime) / CLOCK_TICKS, "rss_bytes": rss_pages * PAGE_SIZE}
+
+    try:
+        with open(f"/proc/{pid}/io", "r") as f:
+            io = dict(line.split(": ") for line in f.read().splitlines())
+        sample["read_bytes"] = int(io["read_bytes"])
+        sample["write_bytes"] = int(io["write_bytes"])
+    except (OSError, KeyError, ValueError):
+        # /proc/<pid>/io is not readable on every system
+        pass
+    return sample
+
+
+def read_run_id(pid: str):
+    try:
+        with open(f"/proc/{pid}/environ", "rb") as f:
+            environ = f.read().split(b"\0")
+    except OSError:
+        return None
+
+    prefix = f"{RUN_ID_VARIABLE}=".encode()
+    for variable in environ:
+        if variable.startswith(prefix):
+            return variable[len(prefix):].decode()
+    return None
+
+
+def nvidia_smi_probe():
+    """GPU utilization and memory of all GPU processes, as (pid, utilization in %, memory in MiB)."""
+    gpus = subprocess.run(
+        ["nvidia-smi", "--query-gpu=uuid,utilization.gpu", "--format=csv,noheader,nounits"],
+        capture_output=True, text=True, timeout=30, check=True
+    ).stdout
+    apps = subprocess.run(
+        ["nvidia-smi", "--query-compute-apps=pid,gpu_uuid,used_memory", "--format=csv,noheader,nounits"],
+        capture_output=True, text=True, timeout=30, check=True
+    ).stdout
+
+    utilization = {}
+    for line in gpus.splitlines():
+        uuid, value = (field.strip() for field in line.split(","))
+        utilization[uuid] = float(value)
+
+    samples = []
+    for line in apps.splitlines():
+        pid, uuid, memory = (field.strip() for field in line.split(","))
+        samples.append((pid, utilization.get(uuid, 0.0), float(memory)))
+    return samples
+
+
+def command_probe(command: str):
+    # a custom probe prints one line `pid,utilization,memory_mib` per GPU process
+    output = subprocess.run(shlex.split(command), capture_output=True, text=True, timeout=30, check=True).stdout
+    samples = []
+    for line in output.splitlines():
+        if line.strip() == "":
+            continue
+        pid, utilization, memory = (field.strip() for field in line.split(","))
+        samples.append((pid, float(utilization), float(memory)))
+    return samples
+
+
+class TrialResources:
+    __slots__ = ("peak_rss_bytes", "cpu_secs", "read_bytes", "write_bytes", "num_samples",
+                 "peak_gpu_memory_mib", "gpu_utilization_sum", "num_gpu_samples", "timeseries")
+
+    def __init__(self, keep_timeseries: bool):
+        self.peak_rss_bytes = 0
+        self.cpu_secs = 0.0
+        self.read_bytes = 0
+        self.write_bytes = 0
+        self.num_samples = 0
+
+        self.peak_gpu_memory_mib = 0.0
+        self.gpu_utilization_sum = 0.0
+        self.num_gpu_samples = 0
+
+        self.timeseries = [] if keep_timeseries else None
+
+    def summary(self):
+        summary = {
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "cpu_secs": self.cpu_secs,
+            "read_bytes": self.read_bytes,
+            "write_bytes": self.write_bytes,
+            "num_samples": self.num_samples
+        }
+        if self.num_gpu_samples > 0:
+            summary["peak_gpu_memory_mib"] = self.peak_gpu_memory_mib
+            summary["mean_gpu_utilization"] = self.gpu_utilization_sum / self.num_gpu_samples
+        return summary
+
+
+class ResourceSampler:
+    """Samples CPU time, memory and I/O of all running trials in a background thread.
+
+    Processes belong to a trial if their environment holds `SU_RUN_ID`, which is inherited by all processes a trial
+    starts, also by the steps `srun` starts on the node of the scheduler. The environment of a process is only read
+    once, so a sample costs one listing of /proc and a few small reads per trial process. Processes on other nodes
+    are not seen. GPUs are probed every `gpu_interval` seconds with nvidia-smi, or with `gpu_probe_command`.
+    """
+
+    def __init__(self, interval: float = 10, gpu_interval: float = 30, gpu_probe_command: str = None,
+                 keep_timeseries: bool = False):
+        self.interval = interval
+        self.gpu_interval = gpu_interval
+        self.gpu_probe_command = gpu_probe_command
+        self.keep_timeseries = keep_timeseries
+
+        self.trials = {}
+        self.processes = {}
+        self.pid_run_ids = {}
+        self.probe_gpus = gpu_interval is not None and gpu_interval > 0
+        self.last_gpu_sample = 0
+
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def register(self, run_id, process=None):
+        # processes which do not carry the run id in their environment, e.g. trials forked by a pool worker
+        with self.lock:
+            self.trials[str(run_id)] = TrialResources(self.keep_timeseries)
+            if process is not None:
+                self.processes[str(run_id)] = process
+
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="resource-sampler", daemon=True)
+            self.thread.start()
+
+    def finish(self, run_id, work_dir: str = None):
+        """Returns the summary of a trial, its time series is written to `resources.json` in `work_dir`."""
+        with self.lock:
+            resources = self.trials.pop(str(run_id), None)
+            self.processes.pop(str(run_id), None)
+        if resources is None:
+            return None
+
+        if resources.timeseries is not None and work_dir is not None:
+            with open(os.path.join(work_dir, "resources.json"), "w") as f:
+                json.dump(resources.timeseries, f)
+        return resources.summary()
+
+    def trial_pids(self):
+        # maps the pids of all trial processes to their run ids, the environment of new processes is read once
+        pids = [name for name in os.listdir("/proc") if name.isdigit()]
+        with self.lock:
+            for run_id, process in self.processes.items():
+                if process.pid is not None:
+                    self.pid_run_ids[str(process.pid)] = run_id
+        self.pid_run_ids = {pid: self.pid_run_ids[pid] if pid in self.pid_run_ids else read_run_id(pid) for pid in pids}
+        return {pid: run_id for pid, run_id in self.pid_run_ids.items() if run_id is not None}
+
+    def gpu_samples(self):
+        try:
+            if self.gpu_probe_command is not None:
+                return command_probe(self.gpu_probe_command)
+            return nvidia_smi_probe()
+        except (OSError, subprocess.SubprocessError, ValueError) as e:
+            logging.info(f"GPU probe failed ({e}), GPUs are not sampled.")
+            self.probe_gpus = False
+            return []
+
+    def sample(self):
+        now = time.time()
+        totals = {}
+        for pid, run_id in self.trial_pids().items():
+            if run_id not in self.trials:
+                continue
+            process = read_process(pid)
+            if process is None:
+                continue
+            total = totals.setdefault(run_id, {"cpu_secs": 0.0, "rss_bytes": 0, "read_bytes": 0, "write_bytes": 0})
+            for key, value in process.items():
+                total[key] += value
+
+        gpu_totals = {}
+        if self.probe_gpus and now - self.last_gpu_sample >= self.gpu_interval:
+            self.last_gpu_sample = now
+            for pid, utilization, memory in self.gpu_samples():
+                run_id = self.pid_run_ids.get(pid)
+                if run_id is None:
+                    continue
+                gpu_total = gpu_totals.setdefault(run_id, {"gpu_utilization": 0.0, "gpu_memory_mib": 0.0})
+                gpu_total["gpu_utilization"] = max(gpu_total["gpu_utilization"], utilization)
+                gpu_total["gpu_memory_mib"] += memory
+
+        with self.lock:
+            for run_id, total in totals.items():
+                resources = self.trials.get(run_id)
+                if resources is None:
+                    continue
+                # CPU time and I/O are cumulative, memory is the sum over the processes alive right now
+                resources.peak_rss_bytes = max(resources.peak_rss_bytes, total["rss_bytes"])
+                resources.cpu_secs = max(resources.cpu_secs, total["cpu_secs"])
+                resources.read_bytes = max(resources.read_bytes, total["read_bytes"])
+                resources.write_bytes = max(resources.write_bytes, total["write_bytes"])
+                resources.num_samples += 1
+
+                gpu_total = gpu_totals.get(run_id)
+                if gpu_total is not None:
+                    resources.peak_gpu_memory_mib = max(resources.peak_gpu_memory_mib, gpu_total["gpu_memory_mib"])
+                    resources.gpu_utilization_sum += gpu_total["gpu_utilization"]
+                    resources.num_gpu_samples += 1
+
+                if resources.timeseries is not None:
+                    resources.timeseries.append(dict(total, time=now, **(gpu_total or {})))
+
+    def run(self):
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                # sampling must never take the scheduler down
+                logging.warning(f"Sampling resources failed: {e}")
+            if self.stopped.wait(self.interval):
+                break
+
+    def close(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
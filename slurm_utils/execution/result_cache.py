@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import hashlib
+import importlib.util
+import importlib.metadata
+
+from slurm_utils.execution.persistence import to_json
+from slurm_utils.execution.resume import load_json
+
+
+def project_code_version(proj_name: str):
+    """Hash of the source files of the installed project package, or its version if the sources are not found."""
+    try:
+        spec = importlib.util.find_spec(proj_name)
+    except (ImportError, ValueError):
+        spec = None
+
+    if spec is not None and spec.submodule_search_locations:
+        package_dir = list(spec.submodule_search_locations)[0]
+        code_hash = hashlib.sha256()
+        for root, dirs, files in os.walk(package_dir):
+            dirs.sort()
+            for file_name in sorted(files):
+                if not file_name.endswith(".py"):
+                    continue
+                path = os.path.join(root, file_name)
+                code_hash.update(os.path.relpath(path, package_dir).encode())
+                with open(path, "rb") as f:
+                    code_hash.update(f.read())
+        return f"sha256:{code_hash.hexdigest()}"
+    if spec is not None and spec.origin is not None and os.path.isfile(spec.origin):
+        with open(spec.origin, "rb") as f:
+            return f"sha256:{hashlib.sha256(f.read()).hexdigest()}"
+
+    try:
+        return f"version:{importlib.metadata.version(proj_name)}"
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+class ResultCache:
+    """Results of finished trials, shared by all experiments of a storage directory.
+
+    Entries are keyed by a hash of the trial parameters, the data directory and the code version, and hold the
+    `test_metrics.json` of the trial. Entries which were not used for `max_age_days` days are evicted, and the
+    least recently used ones once there are more than `max_entries`.
+    """
+
+    def __init__(self, cache_dir: str, code_version: str, max_entries: int = 10000, max_age_days: float = 90):
+        self.cache_dir = cache_dir
+        self.code_version = code_version
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+
+        self.hits = []
+        self.num_misses = 0
+        self.num_stored = 0
+        self.num_evicted = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, parameters: dict, parameter_names: list, data_dir: str):
+        content = json.dumps({
+            "parameters": [[name, parameters.get(name)] for name in sorted(parameter_names)],
+            "data_dir": os.path.abspath(data_dir) if data_dir else data_dir,
+            "code_version": self.code_version
+        }, default=to_json)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def entry_path(self, key: str):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def lookup(self, key: str, objective: str):
+        entry = load_json(self.entry_path(key))
+        if entry is None or objective not in entry.get("test_metrics", {}):
+            self.num_misses += 1
+            return None
+
+        # the modification time marks the last use, for the eviction
+        try:
+            os.utime(self.entry_path(key))
+        except FileNotFoundError:
+            pass
+        return entry
+
+    def record_hit(self, run_id, entry: dict):
+        self.hits.append({"run_id": run_id, "source": entry.get("source"), "time_in_secs": entry.get("time_in_secs")})
+
+    def store(self, key: str, test_metrics: dict, source: str, time_in_secs: float):
+        path = self.entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_file = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump({
+                "test_metrics": test_metrics,
+                "source": source,
+                "time_in_secs": time_in_secs,
+                "code_version": self.code_version,
+                "time": time.time()
+            }, f, default=to_json)
+        os.replace(tmp_file, path)
+        self.num_stored += 1
+
+    def evict(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for file_name in files:
+                if not file_name.endswith(".json"):
+                    continue
+                path = os.path.join(root, file_name)
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except FileNotFoundError:
+                    continue
+
+        entries.sort(reverse=True)
+        min_mtime = time.time() - self.max_age_days * 24 * 3600
+        for i, (mtime, path) in enumerate(entries):
+            if i >= self.max_entries or mtime < min_mtime:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    # evicted by the scheduler of another experiment
+                    continue
+                self.num_evicted += 1
+
+    def report(self):
+        return {
+            "hits": len(self.hits),
+            "misses": self.num_misses,
+            "stored": self.num_stored,
+            "evicted": self.num_evicted,
+            "saved_secs": sum(hit["time_in_secs"] or 0 for hit in self.hits),
+            "hit_trials": self.hits
+        }
@@ -0,0 +1,112 @@
+import os
+import re
+import json
+import logging
+from collections import Counter
+
+from slurm_utils.execution.persistence import StudyPersistence, to_json
+
+
+def parameter_key(parameters: dict, parameter_names: list):
+    # identifies a parameter configuration independent of numpy / python types of the values
+    return json.dumps([[name, parameters.get(name)] for name in sorted(parameter_names)], default=to_json)
+
+
+def load_json(path: str):
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        logging.warning(f"Could not read {path}, it is ignored.")
+        return None
+
+
+def read_study_log(study_dir: str):
+    """Returns the finalized observations of the study log, by trial id."""
+    observations = {}
+    finalized = {}
+
+    log_file = os.path.join(study_dir, StudyPersistence.log_file_name)
+    if not os.path.isfile(log_file):
+        return {}
+
+    with open(log_file, "r") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # the last line might be cut off if the scheduler was killed while writing
+                continue
+            if entry.get("event") == "observation":
+                observations[entry["trial_id"]] = entry
+            elif entry.get("event") == "discard":
+                observations.pop(entry["trial_id"], None)
+            elif entry.get("event") == "finalize":
+                finalized[entry["trial_id"]] = entry.get("status")
+
+    # failed trials are finalized with an "error" context, they are run again, early stopped ones are not
+    completed = {}
+    for trial_id, observation in observations.items():
+        status = finalized.get(trial_id)
+        if status == "STOPPED" or (status == "COMPLETED" and "error" not in observation.get("context", {})):
+            completed[trial_id] = dict(observation, status=status)
+    return completed
+
+
+def read_run_dir(run_dir: str, objective: str):
+    """Reads the results of a finished run directory, returns None if the trial has to be run (again)."""
+    process_stats = load_json(os.path.join(run_dir, "process_stats.json"))
+    config = load_json(os.path.join(run_dir, "config.json"))
+    if process_stats is None or config is None or process_stats.get("returncode") != 0:
+        return None
+
+    metrics = load_json(os.path.join(run_dir, "test_metrics.json"))
+    if metrics is not None and objective in metrics:
+        return {"parameters": config, "objective": metrics.get(objective), "context": metrics}
+    return {"parameters": config, "objective": 0, "context": {"help": "No metrics provided"}}
+
+
+def load_completed_trials(work_dir: str, study_dir: str, objective: str):
+    """Collects all successfully finished trials of a previous run of the experiment.
+
+    Returns the finished trials by run id, and the largest run id that was used so far.
+    """
+    completed = read_study_log(study_dir)
+
+    max_run_id = max(completed.keys(), default=0)
+    for dir_name in os.listdir(work_dir):
+        match = re.fullmatch(r"run_(\d+)", dir_name)
+        if match is None:
+            continue
+        run_id = int(match.group(1))
+        max_run_id = max(max_run_id, run_id)
+        if run_id in completed:
+            continue
+
+        result = read_run_dir(os.path.join(work_dir, dir_name), objective)
+        if result is not None:
+            completed[run_id] = result
+
+    return completed, max_run_id
+
+
+class ResumeState:
+    """Tracks which suggested trials were already completed by a previous run of the experiment."""
+
+    def __init__(self, completed: dict, parameter_names: list):
+        self.parameter_names = parameter_names
+        self.remaining = Counter(
+            parameter_key(result["parameters"], parameter_names) for result in completed.values()
+        )
+
+    def __len__(self):
+        return sum(self.remaining.values())
+
+    def is_completed(self, trial):
+        key = parameter_key(trial.parameters, self.parameter_names)
+        if self.remaining[key] > 0:
+            self.remaining[key] -= 1
+            return True
+        return False
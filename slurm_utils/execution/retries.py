@@ -0,0 +1,107 @@
+import os
+import re
+import time
+import logging
+
+
+def read_log_tail(log_file: str, num_bytes: int = 65536):
+    # failures are reported at the end of the log, large logs are not read completely
+    try:
+        with open(log_file, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - num_bytes))
+            return f.read().decode(errors="replace")
+    except OSError:
+        return ""
+
+
+class TrialRetries:
+    """Failed trials which are started again before their failure is reported to the study.
+
+    A failure is retryable if its return code is in `returncodes` or the end of the trial log matches one of
+    `log_patterns`; if neither is given, every failure is retryable. A trial runs at most `max_attempts` times, the
+    n-th retry waits `backoff_secs * backoff_factor ** (n - 1)` seconds, at most `max_backoff_secs`. With
+    `exclude_failed_nodes`, the nodes a trial failed on are excluded from its next attempts.
+    """
+
+    def __init__(self, max_attempts: int = 1, returncodes: list = None, log_patterns: list = None,
+                 backoff_secs: float = 30, backoff_factor: float = 2, max_backoff_secs: float = 600,
+                 exclude_failed_nodes: bool = False):
+        self.max_attempts = max_attempts
+        self.returncodes = set(returncodes or [])
+        self.log_patterns = [re.compile(pattern) for pattern in log_patterns or []]
+        self.backoff_secs = backoff_secs
+        self.backoff_factor = backoff_factor
+        self.max_backoff_secs = max_backoff_secs
+        self.exclude_failed_nodes = exclude_failed_nodes
+
+        # failed attempts and excluded nodes by trial id
+        self.failures = {}
+        self.failed_nodes = {}
+        # trial id -> (time the retry may start, trial)
+        self.pending = {}
+
+    @property
+    def enabled(self):
+        return self.max_attempts > 1
+
+    @property
+    def num_pending(self):
+        return len(self.pending)
+
+    def attempt(self, trial_id):
+        return self.failures.get(trial_id, 0) + 1
+
+    def excluded_nodes(self, trial_id):
+        return sorted(self.failed_nodes.get(trial_id, []))
+
+    def is_retryable(self, returncode: int, log_file: str):
+        if len(self.returncodes) == 0 and len(self.log_patterns) == 0:
+            return True
+        if returncode in self.returncodes:
+            return True
+        if len(self.log_patterns) > 0:
+            log = read_log_tail(log_file)
+            return any(pattern.search(log) for pattern in self.log_patterns)
+        return False
+
+    def retry(self, trial, returncode: int, log_file: str, node: str = None):
+        """Schedules another attempt of a failed trial, returns its delay in seconds or None if it is not retried."""
+        if self.attempt(trial.id) >= self.max_attempts or not self.is_retryable(returncode, log_file):
+            return None
+
+        self.failures[trial.id] = self.attempt(trial.id)
+        if self.exclude_failed_nodes and node:
+            self.failed_nodes.setdefault(trial.id, set()).add(node)
+
+        delay = min(self.backoff_secs * self.backoff_factor ** (self.failures[trial.id] - 1), self.max_backoff_secs)
+        self.pending[trial.id] = (time.time() + delay, trial)
+        logging.info(
+            f"Trial {trial.id} failed with return code {returncode}"
+            + (f" on node {node}" if node else "")
+            + f", attempt {self.attempt(trial.id)} of {self.max_attempts} starts in {delay:.1f}s."
+        )
+        return delay
+
+    def pop_ready(self, max_trials: int = None):
+        # trials whose backoff passed, the longest waiting first
+        now = time.time()
+        ready = sorted((ready_time, trial_id) for trial_id, (ready_time, _) in self.pending.items() if ready_time <= now)
+        return [self.pending.pop(trial_id)[1] for _, trial_id in ready[:max_trials]]
+
+    def pop_all(self):
+        trials = [trial for _, trial in self.pending.values()]
+        self.pending.clear()
+        return trials
+
+    def claim(self, trial_id):
+        # the caller starts the retry itself, returns the remaining backoff or None if no retry is pending
+        if trial_id not in self.pending:
+            return None
+        ready_time, _ = self.pending.pop(trial_id)
+        return max(0.0, ready_time - time.time())
+
+    def secs_until_ready(self):
+        if len(self.pending) == 0:
+            return None
+        return max(0.0, min(ready_time for ready_time, _ in self.pending.values()) - time.time())
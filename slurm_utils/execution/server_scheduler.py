@@ -1,12 +1,83 @@
 import os
+import re
+import logging
 
 from slurm_utils.execution.job_scheduler import JobScheduler
+from slurm_utils.execution.ports import PortLeaseManager, DEFAULT_PORT_RANGE
+from slurm_utils.execution.nodes import NodeInventory, expand_nodelist, expand_cpus_per_node
 
 
 class SlurmJobScheduler(JobScheduler):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
+        # every lease locks the lease file on shared storage, so ports are only leased for trials which need one
+        if self.trial_executable() != "python" or self.config.port_range is not None:
+            lease_file = self.config.port_lease_file
+            if lease_file is None:
+                lease_file = os.path.join(os.environ.get("SU_STORAGE", self.work_dir), "cache", "port_leases.json")
+            self.port_leases = PortLeaseManager(
+                lease_file=lease_file, port_range=self.config.port_range or DEFAULT_PORT_RANGE
+            )
+
+        if self.use_worker_pool and (self.gpu_allocator is not None or self.trial_executable() != "python"):
+            logging.warning("The worker pool does not support GPU packing and accelerate, trials run as processes.")
+            self.use_worker_pool = False
+
+        # workers of the pool hold their step for the whole experiment, the trials are not placed
+        self.node_inventory = None
+        if self.config.node_placement and not self.use_worker_pool:
+            self.node_inventory = self.create_node_inventory()
+
+    @staticmethod
+    def allocation_nodes():
+        return expand_nodelist(os.environ.get("SLURM_JOB_NODELIST", ""))
+
+    def can_exclude_nodes(self):
+        # a retry needs another node of the allocation to run on
+        nodes = self.allocation_nodes()
+        return len(nodes) > 1 if nodes else self.resource_config.nodes > 1
+
+    def create_node_inventory(self):
+        # only multi-node allocations need placement, on a single node every step lands on the same node
+        nodes = self.allocation_nodes()
+        if len(nodes) <= 1:
+            return None
+
+        cpus_per_node = expand_cpus_per_node(os.environ.get("SLURM_JOB_CPUS_PER_NODE", ""), len(nodes))
+        if cpus_per_node is None:
+            cpus_per_node = [self.resource_config.ntasks_per_node * self.resource_config.cpus_per_task] * len(nodes)
+        logging.info(f"Place trials on the nodes {', '.join(nodes)}.")
+        return NodeInventory(nodes, gpus_per_node=self.resource_config.gpus_per_node, cpus_per_node=cpus_per_node)
+
+    def can_allocate(self, num_gpus: int = 0, excluded: list = ()):
+        if not super().can_allocate(num_gpus, excluded=excluded):
+            return False
+        return self.node_inventory is None or self.node_inventory.can_allocate(
+            num_gpus, self.resource_config.cpus_per_task, excluded=excluded
+        )
+
+    def allocate_resources(self, run_id, trial):
+        # the node is chosen first, the port is leased on it
+        if self.node_inventory is not None:
+            trials = self.bundles.get(run_id, [trial])
+            node = self.node_inventory.allocate(
+                run_id,
+                num_gpus=max(self.trial_gpus(t) for t in trials),
+                num_cpus=self.resource_config.cpus_per_task,
+                excluded=self.retries.excluded_nodes(trial.id)
+            )
+            logging.debug(f"Trial {trial.id} is placed on node {node}")
+        super().allocate_resources(run_id, trial)
+
+    def trial_node(self, run_id):
+        return None if self.node_inventory is None else self.node_inventory.node(run_id)
+
+    def release_resources(self, run_id, process_stats: dict):
+        super().release_resources(run_id, process_stats)
+        if self.node_inventory is not None:
+            process_stats["node"] = self.node_inventory.release(run_id)
+
     def write_system_info(self):
         file = f"""
 
@@ -17,6 +88,7 @@ export COUNT_NODE=`scontrol show hostnames "$SLURM_JOB_NODELIST" | wc -l`
 
 echo HOSTNAMES=$HOSTNAMES
 echo HOSTNAME=$HOSTNAME
+echo SLURMD_NODENAME=$SLURMD_NODENAME
 echo MASTER_ADDR=$MASTER_ADDR
 echo COUNT_NODE=$COUNT_NODE
 echo ""
@@ -30,15 +102,45 @@ echo ""
 """
         return file
 
-    def write_trial_run_file(self, run_id):
+    def write_port_check(self):
+        # the scheduler only checks ports on its own node, the step checks RUN_PORT on the node it landed on
+        file = """
+# take a free port if no port was leased, or another one if RUN_PORT is used by a process outside of the port leases
+if [ -z "$RUN_PORT" ]; then
+    export RUN_PORT=$(python -c "import socket; s = socket.socket(); s.bind(('', 0)); print(s.getsockname()[1])")
+elif ! python -c "import socket, sys; socket.socket().bind(('', int(sys.argv[1])))" $RUN_PORT 2>/dev/null; then
+    echo "RUN_PORT $RUN_PORT is in use on $(hostname)"
+    export RUN_PORT=$(python -c "import socket; s = socket.socket(); s.bind(('', 0)); print(s.getsockname()[1])")
+fi
+"""
+        return file
+
+    def write_gpu_pinning(self):
+        # SU_GPU_SLOTS holds positions within the GPUs of the step (e.g. 0:1), which are mapped to device ids here
+        file = """
+# pin the trial to the GPUs assigned by the scheduler
+if [ -n "$SU_GPU_SLOTS" ]; then
+    STEP_GPUS=(${CUDA_VISIBLE_DEVICES//,/ })
+    PINNED_GPUS=""
+    for SLOT in ${SU_GPU_SLOTS//:/ }; do
+        PINNED_GPUS="$PINNED_GPUS,${STEP_GPUS[$SLOT]:-$SLOT}"
+    done
+    export CUDA_VISIBLE_DEVICES=${PINNED_GPUS#,}
+fi
+echo CUDA_VISIBLE_DEVICES=$CUDA_VISIBLE_DEVICES
+"""
+        return file
 
+    def trial_executable(self):
         if self.resource_config.gpus_per_task <= 1:
             executable = "python"
         else:
             # executable = "python"
             executable = f"accelerate launch --main_process_port $RUN_PORT"
             # executable = f"accelerate launch --mixed_precision fp16 --multi_gpu --num_machines 1 --main_process_port $RUN_PORT"
+        return executable
 
+    def run_file_header(self):
         file = f"""#!/bin/bash
 
 # environment setup
@@ -47,22 +149,80 @@ PROJ_NAME={self.resource_config.proj_name}
 # Prepare environment
 source $SU_STORAGE/server_setup/init_slurm.sh
 """
+        file += self.write_port_check()
         file += self.write_system_info()
-        file += self.write_run_command(run_id, executable)
-        self.save_single_run_file(run_id, file)
+        if self.gpu_allocator is not None:
+            file += self.write_gpu_pinning()
+        return file
+
+    def failed_node(self, run_id, process_stats: dict):
+        # the node is echoed by the run file header, bundled trials share the output of their bundle
+        bundle_id = process_stats.get("bundle_id")
+        if bundle_id is None:
+            log_file = os.path.join(self.work_dir, f"run_{run_id}", "output.out")
+        else:
+            log_file = os.path.join(self.work_dir, f"run_{bundle_id}", "bundle.out")
+        try:
+            with open(log_file, "r", errors="replace") as f:
+                header = f.read(65536)
+        except OSError:
+            return None
+        match = re.search(r"^SLURMD_NODENAME=(\S+)$", header, flags=re.MULTILINE)
+        return match.group(1) if match else None
+
+    def pool_environment(self, run_id):
+        env = super().pool_environment(run_id)
+        if self.port_leases is not None:
+            env["RUN_PORT"] = str(self.port_leases.port(run_id))
+        return env
+
+    def create_worker_command(self, worker_run_path: str):
+        # one step per worker, it runs the trials of one slot
+        return [
+            "srun",
+            "--export=ALL",
+            "--nodes=1",
+            "--ntasks=1",
+            f"--gres=gpu:{self.resource_config.gpus_per_task}",
+            f"--cpus-per-task={self.resource_config.cpus_per_task}",
+            worker_run_path
+        ]
 
     def create_run_command(self, run_id):
+        # srun separates exported variables by commas
+        export = "--export=ALL"
+        if self.port_leases is not None:
+            export += f",RUN_PORT={self.port_leases.port(run_id)}"
 
-        work_dir = os.path.join(self.work_dir, f"run_{run_id}")
-        run_port = 27100 + run_id
+        if self.gpu_allocator is None:
+            gres = [f"--gres=gpu:{self.resource_config.gpus_per_task}"]
+        else:
+            # every step sees all GPUs of the node, single_run.sh restricts the trial to its assigned GPUs
+            gpu_slots = ":".join(str(gpu) for gpu in self.gpu_allocator.leases[run_id])
+            export += f",SU_GPU_SLOTS={gpu_slots}"
+            gres = [f"--gres=gpu:{self.resource_config.gpus_per_node}", "--overlap"]
+
+        # the step runs on the node chosen by the inventory, with only the resources it asked for
+        node = self.trial_node(run_id)
+        placement = [f"--nodelist={node}", "--exact"] if node is not None else []
+
+        # retries of a failed trial avoid the nodes it failed on, placed ones were placed on another node already.
+        # Like with placement, the nodes are only avoided while the allocation has another node
+        excluded_nodes = self.retries.excluded_nodes(run_id) if node is None else []
+        allocation_nodes = self.allocation_nodes()
+        if allocation_nodes and set(allocation_nodes) <= set(excluded_nodes):
+            excluded_nodes = []
+        exclude = [f"--exclude={','.join(excluded_nodes)}"] if excluded_nodes else []
 
         execution_sh_command = [
             "srun",
-            f"--export=ALL,RUN_PORT={run_port}",
+            export,
             "--nodes=1",
             f"--ntasks=1",
-            f"--gres=gpu:{self.resource_config.gpus_per_task}",
+            *gres,
+            *exclude,
+            *placement,
             f"--cpus-per-task={self.resource_config.cpus_per_task}",
-            os.path.join(work_dir, "single_run.sh")
+            self.run_script(run_id)
         ]
         return execution_sh_command
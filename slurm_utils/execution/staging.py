@@ -0,0 +1,164 @@
+import os
+import sys
+import json
+import fcntl
+import shutil
+import hashlib
+import logging
+import argparse
+
+# only the standard library: the run files of the trials run this file by its path, importing the slurm_utils
+# package would cost seconds per trial
+
+# the node-local copy of the data directory, exported by the run files of the trials
+STAGED_DATA_VARIABLE = "SU_STAGED_DATA_DIR"
+
+
+def default_staging_root():
+    return os.environ.get("TMPDIR") or "/dev/shm"
+
+
+def list_files(source: str):
+    """Returns the files below `source` by relative path, with their size and modification time."""
+    if os.path.isfile(source):
+        stat = os.stat(source)
+        return {os.path.basename(source): [stat.st_size, stat.st_mtime_ns]}
+
+    files = {}
+    for dir_path, _, file_names in os.walk(source):
+        for file_name in file_names:
+            path = os.path.join(dir_path, file_name)
+            stat = os.stat(path)
+            files[os.path.relpath(path, source)] = [stat.st_size, stat.st_mtime_ns]
+    return files
+
+
+class DataStager:
+    """Copies a data directory from shared storage to node-local storage, once per node.
+
+    The copy is described by a manifest of the size and modification time of every file, like rsync compares files,
+    such that later allocations on the node only copy changed files and remove deleted ones. Trials starting at the
+    same time wait on a lock file, only the first one copies. Within the SLURM job which wrote the manifest, the
+    source is not listed again. If the node-local storage is too small, the trials read from the shared storage.
+    """
+    manifest_name = ".su_manifest.json"
+
+    def __init__(self, source: str, staging_root: str = None, hardlink: bool = False):
+        self.source = os.path.abspath(source)
+        self.staging_root = staging_root or default_staging_root()
+        self.hardlink = hardlink
+
+        # the source path is part of the name, different data directories with the same name do not collide
+        source_hash = hashlib.sha256(self.source.encode()).hexdigest()[:12]
+        self.target = os.path.join(
+            self.staging_root, "su_data", f"{os.path.basename(self.source.rstrip(os.sep))}-{source_hash}"
+        )
+        self.lock_file = self.target + ".lock"
+        self.manifest_file = os.path.join(self.target, self.manifest_name)
+
+    def staged_path(self):
+        if os.path.isfile(self.source):
+            return os.path.join(self.target, os.path.basename(self.source))
+        return self.target
+
+    def read_manifest(self):
+        try:
+            with open(self.manifest_file, "r") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {"files": {}}
+
+    def write_manifest(self, files: dict):
+        manifest = {"source": self.source, "job_id": os.environ.get("SLURM_JOB_ID"), "files": files}
+        tmp_file = self.manifest_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_file, self.manifest_file)
+
+    def source_path(self, relative_path: str):
+        if os.path.isfile(self.source):
+            return self.source
+        return os.path.join(self.source, relative_path)
+
+    def copy_file(self, relative_path: str):
+        source_path = self.source_path(relative_path)
+        target_path = os.path.join(self.target, relative_path)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        if os.path.lexists(target_path):
+            os.remove(target_path)
+        if self.hardlink:
+            try:
+                os.link(source_path, target_path)
+                return
+            except OSError:
+                # e.g. from a network file system to /dev/shm
+                pass
+        shutil.copy2(source_path, target_path)
+
+    def remove_stale(self, files: dict, previous_files: dict):
+        for relative_path in previous_files:
+            if relative_path not in files:
+                try:
+                    os.remove(os.path.join(self.target, relative_path))
+                except FileNotFoundError:
+                    pass
+
+    def has_space(self, files: dict, previous_files: dict):
+        needed = sum(entry[0] for path, entry in files.items() if previous_files.get(path) != entry)
+        return shutil.disk_usage(self.target).free > needed
+
+    def stage(self):
+        """Returns the path the trials read the data from."""
+        if not os.path.exists(self.source):
+            logging.warning(f"The data directory {self.source} does not exist, it is not staged.")
+            return self.source
+
+        os.makedirs(self.target, exist_ok=True)
+        with open(self.lock_file, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                manifest = self.read_manifest()
+                job_id = os.environ.get("SLURM_JOB_ID")
+                if job_id is not None and manifest.get("job_id") == job_id:
+                    # staged by an earlier trial of this allocation
+                    return self.staged_path()
+
+                previous_files = manifest.get("files", {})
+                files = list_files(self.source)
+                if not self.has_space(files, previous_files):
+                    logging.warning(f"Not enough space in {self.staging_root} to stage {self.source}.")
+                    return self.source
+
+                changed = [path for path, entry in files.items() if previous_files.get(path) != entry]
+                # the manifest is removed while copying, after an interrupted copy all files are copied again
+                if len(changed) > 0 and os.path.isfile(self.manifest_file):
+                    os.remove(self.manifest_file)
+                self.remove_stale(files, previous_files)
+                for path in changed:
+                    self.copy_file(path)
+                self.write_manifest(files)
+                logging.info(f"Staged {self.source} to {self.target}, copied {len(changed)} of {len(files)} files.")
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return self.staged_path()
+
+
+def stage_command(args=None):
+    """Stages the data directory on this node and prints the path of the trials' data directory."""
+    parser = argparse.ArgumentParser(description=stage_command.__doc__)
+    parser.add_argument("--source", required=True, help="Data directory on the shared storage.")
+    parser.add_argument("--staging_root", default=None, help="Node-local directory, default: $TMPDIR or /dev/shm.")
+    parser.add_argument("--hardlink", action="store_true", help="Hardlink files on the same file system.")
+    options = parser.parse_args(args)
+
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+    try:
+        path = DataStager(options.source, staging_root=options.staging_root, hardlink=options.hardlink).stage()
+    except OSError as e:
+        logging.warning(f"Could not stage {options.source}, the trials read from the shared storage: {e}")
+        path = options.source
+    print(path)
+
+
+if __name__ == '__main__':
+    stage_command()
@@ -0,0 +1,41 @@
+import os
+import json
+import logging
+
+
+class StepMetricsReader:
+    """Tails the step metrics files trials append to with `report_step`.
+
+    Every call of `read` only returns the lines written since the last call. A line which is not complete yet
+    is left for the next call.
+    """
+    file_name = "step_metrics.jsonl"
+
+    def __init__(self):
+        self.offsets = {}
+
+    def read(self, run_id, run_dir: str):
+        path = os.path.join(run_dir, self.file_name)
+        if not os.path.isfile(path):
+            return []
+
+        offset = self.offsets.get(run_id, 0)
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+
+        end = data.rfind(b"\n")
+        if end < 0:
+            return []
+        self.offsets[run_id] = offset + end + 1
+
+        steps = []
+        for line in data[:end].splitlines():
+            try:
+                steps.append(json.loads(line))
+            except json.JSONDecodeError:
+                logging.warning(f"Could not read step metrics of trial {run_id}: {line[:100]}")
+        return steps
+
+    def forget(self, run_id):
+        self.offsets.pop(run_id, None)
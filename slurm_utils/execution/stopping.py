@@ -0,0 +1,50 @@
+from sherpa.algorithms import StoppingRule
+
+
+class SuccessiveHalvingStoppingRule(StoppingRule):
+    """Successive halving as a sherpa stopping rule, for trials which report intermediate results.
+
+    Rungs are placed at `min_iterations * reduction_factor ** k` iterations. A trial is compared at the highest rung
+    it reached with all trials that reached this rung, by their best objective up to the rung. Once `min_trials`
+    trials reached the rung, only the best `1 / reduction_factor` of them continue.
+    """
+
+    def __init__(self, min_iterations: int = 1, reduction_factor: int = 3, min_trials: int = 3):
+        self.min_iterations = min_iterations
+        self.reduction_factor = reduction_factor
+        self.min_trials = min_trials
+
+    def rung_iteration(self, iteration):
+        rung = self.min_iterations
+        while rung * self.reduction_factor <= iteration:
+            rung *= self.reduction_factor
+        return rung
+
+    def should_trial_stop(self, trial, results, lower_is_better):
+        if len(results) == 0:
+            return False
+
+        # finalized trials repeat their best row, only the reported iterations are compared
+        results = results.loc[results["Status"] == "INTERMEDIATE"]
+        trial_rows = results.loc[results["Trial-ID"] == trial.id]
+        if trial_rows.empty or trial_rows["Iteration"].max() < self.min_iterations:
+            return False
+        rung = self.rung_iteration(trial_rows["Iteration"].max())
+
+        max_iterations = results.groupby("Trial-ID")["Iteration"].max()
+        reached = max_iterations[max_iterations >= rung].index
+        rows = results.loc[results["Trial-ID"].isin(reached) & (results["Iteration"] <= rung)]
+        if lower_is_better:
+            objectives = rows.groupby("Trial-ID")["Objective"].min()
+        else:
+            objectives = rows.groupby("Trial-ID")["Objective"].max()
+
+        if len(objectives) < self.min_trials:
+            return False
+
+        num_kept = max(1, len(objectives) // self.reduction_factor)
+        if lower_is_better:
+            kept = objectives.nsmallest(num_kept)
+        else:
+            kept = objectives.nlargest(num_kept)
+        return trial.id not in kept.index
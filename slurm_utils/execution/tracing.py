@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+from slurm_utils.execution.resume import load_json
+
+# written by the run files before the trial starts, if tracing is enabled
+TRIAL_START_FILE = "trace_start_ns"
+
+SCHEDULER_PID = 1
+TRIALS_PID = 2
+
+
+class Tracer:
+    """Timeline of the scheduler, written as a Chrome trace (chrome://tracing, ui.perfetto.dev).
+
+    Scheduler spans, e.g. waiting for a free slot or saving the study, are drawn per scheduler thread. The phases of
+    every trial are drawn on the track of the slot it ran in: writing its files, launching the process, the startup
+    until the run file reached the trial (srun step creation and environment setup), the run and the finalization.
+    Spans are kept as tuples in memory with monotonic timestamps and only written on `write`, a disabled tracer
+    records nothing.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        # (name, pid, tid, start_ns, end_ns, args)
+        self.events = []
+        # trial start times written by the run files are wall clock times
+        self.wall_offset_ns = time.time_ns() - time.monotonic_ns()
+
+        self.thread_ids = {}
+        self.launched_ns = {}
+        self.lanes = {}
+        self.free_lanes = []
+        self.num_lanes = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def now():
+        return time.monotonic_ns()
+
+    def wall_to_monotonic(self, wall_ns: int):
+        return wall_ns - self.wall_offset_ns
+
+    def thread_id(self):
+        ident = threading.get_ident()
+        if ident not in self.thread_ids:
+            with self.lock:
+                self.thread_ids.setdefault(ident, (len(self.thread_ids), threading.current_thread().name))
+        return self.thread_ids[ident][0]
+
+    @contextmanager
+    def recorded_span(self, name: str, args: dict = None):
+        start_ns = time.monotonic_ns()
+        try:
+            yield
+        finally:
+            self.events.append((name, SCHEDULER_PID, self.thread_id(), start_ns, time.monotonic_ns(), args))
+
+    def span(self, name: str, **args):
+        if not self.enabled:
+            return nullcontext()
+        return self.recorded_span(name, args or None)
+
+    def lane(self, run_id):
+        # the lowest free slot track, such that the tracks show the occupancy of the slots
+        with self.lock:
+            if run_id not in self.lanes:
+                if len(self.free_lanes) > 0:
+                    self.free_lanes.sort()
+                    self.lanes[run_id] = self.free_lanes.pop(0)
+                else:
+                    self.lanes[run_id] = self.num_lanes
+                    self.num_lanes += 1
+            return self.lanes[run_id]
+
+    def trial_span(self, run_id, phase: str, start_ns: int, end_ns: int, **args):
+        if not self.enabled:
+            return
+        args["run_id"] = run_id
+        self.events.append((phase, TRIALS_PID, self.lane(run_id), start_ns, max(start_ns, end_ns), args))
+
+    def trial_launched(self, run_id, start_ns: int):
+        if not self.enabled:
+            return
+        self.launched_ns[run_id] = self.now()
+        self.trial_span(run_id, "launch", start_ns, self.launched_ns[run_id])
+
+    def read_trial_start(self, run_dir: str):
+        try:
+            with open(os.path.join(run_dir, TRIAL_START_FILE), "r") as f:
+                return self.wall_to_monotonic(int(f.read().strip()))
+        except (OSError, ValueError):
+            return None
+
+    def read_bundled_run(self, trial_id, run_dir: str):
+        # start and end of a bundled trial, as written by bundle_run.sh
+        status = load_json(os.path.join(run_dir, "bundle_status.json"))
+        if status is None:
+            return None
+        return trial_id, self.wall_to_monotonic(status["start_ns"]), self.wall_to_monotonic(status["end_ns"])
+
+    def trial_exited(self, run_id, exited_ns: int, run_dir: str, runs: list = None):
+        """Records the startup and run of a trial, `runs` are (trial id, start, end) of the trials of a bundle."""
+        if not self.enabled:
+            return
+        launched_ns = self.launched_ns.get(run_id, exited_ns)
+        if runs:
+            started_ns = min(start_ns for _, start_ns, _ in runs)
+        else:
+            started_ns = self.read_trial_start(run_dir)
+        if started_ns is not None:
+            # clocks of other nodes may be slightly off
+            started_ns = min(max(started_ns, launched_ns), exited_ns)
+            self.trial_span(run_id, "startup", launched_ns, started_ns)
+        else:
+            started_ns = launched_ns
+
+        for trial_id, start_ns, end_ns in runs or [(run_id, started_ns, exited_ns)]:
+            self.trial_span(run_id, "run", max(start_ns, launched_ns), min(end_ns, exited_ns), trial_id=trial_id)
+
+    def trial_finished(self, run_id, exited_ns: int):
+        if not self.enabled:
+            return
+        self.trial_span(run_id, "finalize", exited_ns, self.now())
+        self.launched_ns.pop(run_id, None)
+        with self.lock:
+            lane = self.lanes.pop(run_id, None)
+            if lane is not None:
+                self.free_lanes.append(lane)
+
+    def chrome_trace(self):
+        start_ns = min((event[3] for event in self.events), default=0)
+        trace_events = [
+            {"name": "process_name", "ph": "M", "pid": SCHEDULER_PID, "args": {"name": "scheduler"}},
+            {"name": "process_name", "ph": "M", "pid": TRIALS_PID, "args": {"name": "trial slots"}},
+        ]
+        for tid, thread_name in self.thread_ids.values():
+            trace_events.append(
+                {"name": "thread_name", "ph": "M", "pid": SCHEDULER_PID, "tid": tid, "args": {"name": thread_name}}
+            )
+        for lane in range(self.num_lanes):
+            trace_events.append(
+                {"name": "thread_name", "ph": "M", "pid": TRIALS_PID, "tid": lane, "args": {"name": f"slot {lane}"}}
+            )
+
+        for name, pid, tid, span_start_ns, span_end_ns, args in self.events:
+            event = {
+                "name": name,
+                "cat": "trial" if pid == TRIALS_PID else "scheduler",
+                "ph": "X",
+                "ts": (span_start_ns - start_ns) / 1000,
+                "dur": (span_end_ns - span_start_ns) / 1000,
+                "pid": pid,
+                "tid": tid,
+            }
+            if args:
+                event["args"] = args
+            trace_events.append(event)
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def summary(self, num_slots: int):
+        if len(self.events) == 0:
+            return {}
+        wall_secs = (max(event[4] for event in self.events) - min(event[3] for event in self.events)) / 1e9
+
+        durations = {}
+        for name, pid, _, start_ns, end_ns, _ in self.events:
+            key = name if pid == TRIALS_PID else f"scheduler.{name}"
+            durations.setdefault(key, []).append((end_ns - start_ns) / 1e9)
+
+        phases = {}
+        for key, values in durations.items():
+            values = np.array(values)
+            phases[key] = {
+                "count": len(values),
+                "total_secs": float(values.sum()),
+                "p50_secs": float(np.percentile(values, 50)),
+                "p95_secs": float(np.percentile(values, 95)),
+                "p99_secs": float(np.percentile(values, 99)),
+                "max_secs": float(values.max()),
+            }
+
+        # a slot is busy from the launch of a trial until its process exited
+        capacity_secs = max(wall_secs * num_slots, 1e-9)
+        busy_secs = sum(phases.get(phase, {}).get("total_secs", 0) for phase in ["launch", "startup", "run"])
+        run_secs = phases.get("run", {}).get("total_secs", 0)
+        return {
+            "wall_secs": wall_secs,
+            "num_slots": num_slots,
+            "slot_busy_percent": 100 * busy_secs / capacity_secs,
+            "slot_run_percent": 100 * run_secs / capacity_secs,
+            "phases": phases,
+        }
+
+    def write(self, study_dir: str, num_slots: int):
+        if not self.enabled:
+            return
+        with open(os.path.join(study_dir, "trace.json"), "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+        summary = self.summary(num_slots)
+        with open(os.path.join(study_dir, "trace_summary.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+        if summary:
+            logging.info(
+                f"Trace written to {os.path.join(study_dir, 'trace.json')}, the slots were busy "
+                f"{summary['slot_busy_percent']:.1f}% and ran trials {summary['slot_run_percent']:.1f}% of the time."
+            )
@@ -0,0 +1,102 @@
+RUNNING = "is_running"
+STOPPED = "stopped_running"
+FINISHED = "is_finished"
+
+
+class ActiveTrial:
+    """A launched trial whose process is running or exited but was not finalized yet."""
+    __slots__ = ("run_id", "trial", "process", "file", "start_time", "is_active")
+
+    def __init__(self, run_id, trial, process, file, start_time: float):
+        self.run_id = run_id
+        self.trial = trial
+        self.process = process
+        self.file = file
+        self.start_time = start_time
+        self.is_active = RUNNING
+
+
+class FinishedTrial:
+    """Slim record of a finalized trial, holds no process, file handle or sherpa trial anymore."""
+    __slots__ = ("run_id", "trial_id", "start_time", "time_in_secs", "returncode")
+
+    is_active = FINISHED
+
+    def __init__(self, run_id, trial_id, start_time: float, time_in_secs: float, returncode: int):
+        self.run_id = run_id
+        self.trial_id = trial_id
+        self.start_time = start_time
+        self.time_in_secs = time_in_secs
+        self.returncode = returncode
+
+
+class TrialRegistry:
+    """Keeps the state of all trials of a scheduler.
+
+    Running and not yet finalized trials live in `active`, finalized ones in `finished`. The number of running
+    trials is counted on every state change, so no operation of the scheduler loop has to scan all trials.
+    """
+
+    def __init__(self):
+        self.active = {}
+        self.stopped = set()
+        self.finished = {}
+
+        self.num_running = 0
+
+    def __len__(self):
+        return len(self.active) + len(self.finished)
+
+    def __contains__(self, run_id):
+        return run_id in self.active or run_id in self.finished
+
+    def get(self, run_id):
+        if run_id in self.active:
+            return self.active[run_id]
+        return self.finished.get(run_id)
+
+    def num_active(self):
+        return len(self.active)
+
+    def running(self):
+        # copied first, the async scheduler adds trials while worker threads look at the running ones
+        return [entry for entry in list(self.active.values()) if entry.is_active == RUNNING]
+
+    def add(self, run_id, trial, process, file, start_time: float):
+        entry = ActiveTrial(run_id=run_id, trial=trial, process=process, file=file, start_time=start_time)
+        self.active[run_id] = entry
+        self.num_running += 1
+        return entry
+
+    def mark_stopped(self, run_id):
+        entry = self.active[run_id]
+        if entry.is_active != RUNNING:
+            return
+        entry.is_active = STOPPED
+        self.stopped.add(run_id)
+        self.num_running -= 1
+
+    def finish(self, run_id, time_in_secs: float, returncode: int):
+        self.mark_stopped(run_id)
+        entry = self.active.pop(run_id)
+        self.stopped.discard(run_id)
+
+        return self.add_finished(
+            run_id=run_id,
+            trial_id=entry.trial.id,
+            start_time=entry.start_time,
+            time_in_secs=time_in_secs,
+            returncode=returncode
+        )
+
+    def add_finished(self, run_id, trial_id, start_time: float, time_in_secs: float, returncode: int):
+        # trials which never had an own process, e.g. the later trials of a bundle
+        record = FinishedTrial(
+            run_id=run_id,
+            trial_id=trial_id,
+            start_time=start_time,
+            time_in_secs=time_in_secs,
+            returncode=returncode
+        )
+        self.finished[run_id] = record
+        return record
@@ -0,0 +1,125 @@
+import os
+import re
+import json
+import time
+import logging
+import subprocess
+
+import numpy as np
+
+from slurm_utils.execution.persistence import to_json
+from slurm_utils.execution.resume import load_json
+
+
+def parse_slurm_time(text: str):
+    """Parses SLURM durations like `1-02:03:04`, `02:03:04` or `03:04` to seconds, None for unlimited times."""
+    match = re.fullmatch(r"(?:(\d+)-)?(?:(\d+):)?(\d+):(\d+)", text.strip())
+    if match is None:
+        return None
+    days, hours, minutes, seconds = (int(group) if group else 0 for group in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+class AllocationClock:
+    """Knows when the SLURM allocation of the scheduler ends.
+
+    The end is read from `SLURM_JOB_END_TIME`, or from the remaining time in `squeue`, which is asked again every
+    `refresh_interval` seconds since the time limit of a job may change. Outside of SLURM there is no end.
+    """
+
+    def __init__(self, refresh_interval: float = 300):
+        self.refresh_interval = refresh_interval
+        self.job_id = os.environ.get("SLURM_JOB_ID")
+
+        self.end_time = None
+        self.last_refresh = None
+
+    def read_end_time(self):
+        if os.environ.get("SLURM_JOB_END_TIME", "").isdigit():
+            return float(os.environ["SLURM_JOB_END_TIME"])
+        if self.job_id is None:
+            return None
+
+        try:
+            output = subprocess.run(
+                ["squeue", "-h", "-j", self.job_id, "-o", "%L"], capture_output=True, text=True, timeout=30
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logging.debug(f"Could not read the remaining time of job {self.job_id}: {e}")
+            return None
+        remaining = parse_slurm_time(output.stdout) if output.returncode == 0 else None
+        return None if remaining is None else time.time() + remaining
+
+    def remaining_secs(self):
+        if self.last_refresh is None or time.time() - self.last_refresh >= self.refresh_interval:
+            self.end_time = self.read_end_time()
+            self.last_refresh = time.time()
+        if self.end_time is None:
+            return None
+        return self.end_time - time.time()
+
+
+class RuntimeEstimator:
+    """Estimates the runtime of the next trial from the runtimes of finished trials.
+
+    The estimate is the `quantile` of the last `window` runtimes, `default_secs` is used until `min_samples`
+    trials finished.
+    """
+
+    def __init__(self, quantile: float = 0.9, min_samples: int = 3, window: int = 200, default_secs: float = None):
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.window = window
+        self.default_secs = default_secs
+
+        self.times_in_secs = []
+
+    def observe(self, time_in_secs: float):
+        if time_in_secs is not None and time_in_secs > 0:
+            self.times_in_secs.append(time_in_secs)
+            del self.times_in_secs[:-self.window]
+
+    def load(self, work_dir: str):
+        # runtimes of a previous run of the experiment, trials taken from the result cache did not run
+        for dir_name in os.listdir(work_dir):
+            if re.fullmatch(r"run_\d+", dir_name) is None:
+                continue
+            process_stats = load_json(os.path.join(work_dir, dir_name, "process_stats.json"))
+            if process_stats is not None and process_stats.get("returncode") == 0 and "cached_from" not in process_stats:
+                self.observe(process_stats.get("time_in_secs"))
+
+    def estimate(self):
+        if len(self.times_in_secs) < self.min_samples:
+            return self.default_secs
+        return float(np.quantile(self.times_in_secs, self.quantile))
+
+
+class DeferredTrials:
+    """Trials which were not started since they would not finish before the end of the allocation.
+
+    They are written to `deferred_trials.json` in the experiment directory, a resumed run of the experiment
+    starts them first.
+    """
+    file_name = "deferred_trials.json"
+
+    def __init__(self, work_dir: str):
+        self.path = os.path.join(work_dir, self.file_name)
+        self.trials = []
+
+    def add(self, trial, expected_secs: float, remaining_secs: float):
+        self.trials.append({
+            "trial_id": trial.id,
+            "parameters": trial.parameters,
+            "expected_secs": expected_secs,
+            "remaining_secs": remaining_secs,
+            "time": time.time()
+        })
+        with open(self.path, "w") as f:
+            json.dump(self.trials, f, default=to_json)
+
+    def pop_previous(self):
+        # the deferred trials of a previous run, the file is removed as they are scheduled again now
+        previous = load_json(self.path) or []
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+        return previous
@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+import signal
+import argparse
+import threading
+import traceback
+import importlib.util
+
+# only the standard library: the workers run this file by its path, importing the slurm_utils package would delay
+# the start of every worker by seconds
+
+# name of the trial main module in the worker, not __main__, so `app.run(main)` is not called on import
+MAIN_MODULE_NAME = "su_trial_main"
+
+
+def load_staging_module():
+    # knows the variable of the staged data directory, loaded from its file like this module
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "staging.py")
+    spec = importlib.util.spec_from_file_location("su_worker_staging", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+STAGED_DATA_VARIABLE = load_staging_module().STAGED_DATA_VARIABLE
+
+
+def load_main_module(main_file: str):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(main_file)))
+    spec = importlib.util.spec_from_file_location(MAIN_MODULE_NAME, main_file)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[MAIN_MODULE_NAME] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_trial(module, main_file: str, request: dict):
+    """Runs in the forked child, never returns."""
+    returncode = 0
+    try:
+        os.environ.update(request.get("env", {}))
+        fd = os.open(request["output_file"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.dup2(fd, 1)
+        os.dup2(fd, 2)
+        os.close(fd)
+        # the requests of the worker are not for the trial
+        fd = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(fd, 0)
+        os.close(fd)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+        argv = [main_file, f"--flagfile={request['flag_file']}"]
+        if STAGED_DATA_VARIABLE in os.environ:
+            # the worker staged the data on its node, see JobScheduler.data_dir_flag
+            argv.append(f"--data_dir={os.environ[STAGED_DATA_VARIABLE]}")
+
+        from absl import app
+        app.run(module.main, argv=argv)
+    except SystemExit as e:
+        returncode = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException:
+        traceback.print_exc()
+        returncode = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(returncode)
+
+
+class Worker:
+    """Runs trials of one slot, each in a child forked from a process which imported the trial module already.
+
+    Requests are read as JSON lines from stdin, `{"run_id", "flag_file", "output_file", "env"}` starts a trial,
+    `{"terminate": run_id}` stops it. The worker answers with JSON lines on stdout: `{"ready": true}` once the
+    module is imported, `{"run_id", "pid"}` when a trial started and `{"run_id", "returncode"}` when it exited.
+    CUDA must not be initialized on import, it does not survive the fork.
+    """
+
+    def __init__(self, main_file: str):
+        self.main_file = main_file
+
+        # output of the imported module must not mix with the answers, it goes to stderr
+        self.answers = os.fdopen(os.dup(1), "w", buffering=1)
+        os.dup2(2, 1)
+        self.lock = threading.Lock()
+
+        self.module = load_main_module(main_file)
+        self.children = {}
+
+    def answer(self, **message):
+        with self.lock:
+            self.answers.write(json.dumps(message) + "\n")
+
+    def wait_for_child(self, run_id, pid):
+        _, status = os.waitpid(pid, 0)
+        self.children.pop(run_id, None)
+        returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+        self.answer(run_id=run_id, returncode=returncode)
+
+    def start(self, request: dict):
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            run_trial(self.module, self.main_file, request)
+
+        self.children[request["run_id"]] = pid
+        self.answer(run_id=request["run_id"], pid=pid)
+        threading.Thread(target=self.wait_for_child, args=(request["run_id"], pid), daemon=True).start()
+
+    def terminate(self, run_id):
+        pid = self.children.get(run_id)
+        if pid is not None:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        self.answer(ready=True)
+        for line in sys.stdin:
+            if line.strip() == "":
+                continue
+            request = json.loads(line)
+            if "terminate" in request:
+                self.terminate(request["terminate"])
+            else:
+                self.start(request)
+
+        # the scheduler closed stdin, running trials are stopped
+        for run_id in list(self.children):
+            self.terminate(run_id)
+
+
+def worker_command(args=None):
+    """Worker of the scheduler's worker pool, see WorkerPool."""
+    parser = argparse.ArgumentParser(description=worker_command.__doc__)
+    parser.add_argument("--main_file", required=True, help="Main file of the project, defines `main(argv)`.")
+    options = parser.parse_args(args)
+
+    # run by its path, the directory of this file comes first on the path, its modules must not shadow the trial's
+    this_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path[:] = [path for path in sys.path if os.path.abspath(path or os.curdir) != this_dir]
+    Worker(options.main_file).run()
+
+
+if __name__ == '__main__':
+    worker_command()
@@ -0,0 +1,204 @@
+import os
+import json
+import signal
+import logging
+import threading
+import subprocess
+
+# the workers run this file by its path, it does not import the slurm_utils package, see slurm_utils.execution.worker
+WORKER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker.py")
+
+
+class PoolWorkerError(RuntimeError):
+    """A pool worker exited before it was ready, e.g. because the trial module could not be imported."""
+
+    def __init__(self, message: str, returncode: int):
+        super().__init__(message)
+        self.returncode = returncode
+
+
+class PooledTrialProcess:
+    """Handle of a trial run by a pool worker, with the part of the Popen interface the schedulers use.
+
+    `completion_fd` becomes readable once the trial exited, like a pidfd, see CompletionWatcher.
+    """
+
+    def __init__(self, run_id, worker):
+        self.run_id = run_id
+        self.worker = worker
+        self.pid = None
+        self.returncode = None
+
+        self.exited = threading.Event()
+        self.lock = threading.Lock()
+        self.read_fd, self.write_fd = os.pipe()
+
+    def completion_fd(self):
+        # the caller owns the returned descriptor
+        with self.lock:
+            if self.read_fd is not None:
+                return os.dup(self.read_fd)
+            read_fd, write_fd = os.pipe()
+            os.write(write_fd, b"x")
+            os.close(write_fd)
+            return read_fd
+
+    def set_returncode(self, returncode: int):
+        with self.lock:
+            self.returncode = returncode
+            self.exited.set()
+            os.write(self.write_fd, b"x")
+            # duplicates of the read end stay readable
+            os.close(self.write_fd)
+            os.close(self.read_fd)
+            self.read_fd = self.write_fd = None
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self):
+        self.exited.wait()
+        return self.returncode
+
+    def terminate(self):
+        # trials which failed before a worker ran them have no worker
+        if self.worker is not None:
+            self.worker.send(terminate=self.run_id)
+
+
+class PoolWorker:
+    """A long-lived worker process of the pool, see slurm_utils.execution.worker."""
+
+    def __init__(self, command: list, log_file: str):
+        self.command = command
+        self.log_file = log_file
+        self.log = open(log_file, "a")
+        self.process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self.log, text=True, bufsize=1
+        )
+
+        self.ready = threading.Event()
+        self.trial = None
+        self.reader = threading.Thread(target=self.read_answers, name="pool-worker", daemon=True)
+        self.reader.start()
+
+    @property
+    def is_alive(self):
+        return self.process.poll() is None
+
+    @property
+    def is_idle(self):
+        return self.trial is None and self.ready.is_set() and self.is_alive
+
+    def send(self, **message):
+        try:
+            self.process.stdin.write(json.dumps(message) + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            logging.warning(f"Could not send {message} to the pool worker {self.process.pid}, it exited.")
+
+    def read_answers(self):
+        for line in self.process.stdout:
+            try:
+                answer = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if answer.get("ready"):
+                self.ready.set()
+            elif self.trial is not None and answer.get("run_id") == self.trial.run_id:
+                if "pid" in answer:
+                    self.trial.pid = answer["pid"]
+                elif "returncode" in answer:
+                    trial, self.trial = self.trial, None
+                    trial.set_returncode(answer["returncode"])
+
+        # the worker exited, a running trial fails with the exit code of the worker
+        returncode = self.process.wait()
+        self.ready.set()
+        if self.trial is not None:
+            trial, self.trial = self.trial, None
+            trial.set_returncode(returncode if returncode != 0 else -1)
+
+    def submit(self, run_id, flag_file: str, output_file: str, env: dict):
+        self.trial = PooledTrialProcess(run_id, self)
+        self.send(run_id=run_id, flag_file=flag_file, output_file=output_file, env=env)
+        return self.trial
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.send_signal(signal.SIGKILL)
+            self.process.wait()
+        self.log.close()
+
+
+class WorkerPool:
+    """Long-lived workers which import the trial module once and fork a child per trial.
+
+    Each trial then starts without a new interpreter, flag parsing of a fresh process and the imports of the
+    project, which dominate short trials. Workers which exited are started again on the next submit, if one exits
+    again before it is ready, that trial fails with its exit code.
+    """
+
+    def __init__(self, command: list, num_workers: int, log_dir: str):
+        self.command = command
+        self.num_workers = num_workers
+        self.log_dir = log_dir
+        self.workers = []
+
+    def start(self):
+        os.makedirs(self.log_dir, exist_ok=True)
+        while len(self.workers) < self.num_workers:
+            log_file = os.path.join(self.log_dir, f"worker_{len(self.workers)}.log")
+            self.workers.append(PoolWorker(self.command, log_file))
+        logging.info(f"Started {self.num_workers} pool workers.")
+
+    def idle_worker(self):
+        if len(self.workers) == 0:
+            self.start()
+
+        for i, worker in enumerate(self.workers):
+            if worker.trial is not None:
+                continue
+            # the worker may have exited while it started or while it was idle
+            worker.ready.wait()
+            if worker.is_alive:
+                return worker
+
+            logging.warning(
+                f"Pool worker {worker.process.pid} exited with code {worker.process.returncode}, it is started "
+                f"again, see {worker.log_file}."
+            )
+            worker.close()
+            worker = self.workers[i] = PoolWorker(self.command, worker.log_file)
+            worker.ready.wait()
+            if not worker.is_alive:
+                raise PoolWorkerError(
+                    f"Pool worker {worker.process.pid} exited with code {worker.process.returncode} before it was "
+                    f"ready, see {worker.log_file}.",
+                    returncode=worker.process.returncode or -1
+                )
+            return worker
+        raise RuntimeError("All pool workers are busy, the scheduler started more trials than slots.")
+
+    def submit(self, run_id, flag_file: str, output_file: str, env: dict):
+        try:
+            worker = self.idle_worker()
+        except PoolWorkerError as e:
+            # the trial fails with the exit code of the worker, its output names the log of the worker
+            logging.error(f"Trial {run_id} could not be started: {e}")
+            with open(output_file, "w") as f:
+                f.write(f"The trial could not be started: {e}\n")
+            trial = PooledTrialProcess(run_id, worker=None)
+            trial.set_returncode(e.returncode)
+            return trial
+        return worker.submit(run_id, flag_file=flag_file, output_file=output_file, env=env)
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
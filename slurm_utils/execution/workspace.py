@@ -0,0 +1,83 @@
+import os
+import logging
+import threading
+
+# placeholder for the run id in rendered script templates
+RUN_ID_TOKEN = "__SU_RUN_ID__"
+
+
+class TrialWorkspace:
+    """Creates the run directories and files of trials without spawning processes.
+
+    Script templates are rendered once per experiment with a placeholder for the run id, which is filled in per
+    trial. Scripts are created with their permissions in-process instead of calling `chmod`. For pre-enumerable
+    sweeps the run directories are created ahead in a background thread, unused ones are removed on `close`.
+    """
+
+    def __init__(self, work_dir: str):
+        self.work_dir = work_dir
+        self.templates = {}
+
+        self.lock = threading.Lock()
+        self.created_ahead = set()
+        self.used = set()
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def run_dir(self, run_id):
+        return os.path.join(self.work_dir, f"run_{run_id}")
+
+    def render(self, name: str, render, run_id):
+        # `render` is called once with the placeholder, later trials only substitute their run id
+        if name not in self.templates:
+            self.templates[name] = render(RUN_ID_TOKEN)
+        return self.templates[name].replace(RUN_ID_TOKEN, str(run_id))
+
+    def make_run_dir(self, run_id):
+        with self.lock:
+            self.used.add(run_id)
+            if run_id in self.created_ahead:
+                return self.run_dir(run_id)
+        os.makedirs(self.run_dir(run_id), exist_ok=True)
+        return self.run_dir(run_id)
+
+    @staticmethod
+    def write_file(path: str, content: str, executable: bool = False):
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o700 if executable else 0o666)
+        with os.fdopen(fd, "w") as f:
+            if executable:
+                # the mode passed to open is reduced by the umask and does not change existing files
+                os.fchmod(fd, 0o700)
+            f.write(content)
+
+    def create_ahead(self, run_ids):
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(
+            target=self.create_run_dirs, args=(list(run_ids),), name="workspace-builder", daemon=True
+        )
+        self.thread.start()
+
+    def create_run_dirs(self, run_ids):
+        for run_id in run_ids:
+            if self.stopped.is_set():
+                return
+            try:
+                os.makedirs(self.run_dir(run_id), exist_ok=True)
+            except OSError as e:
+                logging.warning(f"Could not create the run directory of trial {run_id} ahead: {e}")
+                return
+            with self.lock:
+                self.created_ahead.add(run_id)
+
+    def close(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+        # directories of trials which never ran, e.g. after the allocation ended
+        for run_id in self.created_ahead - self.used:
+            try:
+                os.rmdir(self.run_dir(run_id))
+            except OSError:
+                pass
@@ -16,7 +16,9 @@ from slurm_utils.config.resources import ResourceConfig
 from slurm_utils.config.load import load_config
 
 from slurm_utils.connection import RemoteConnector
-from slurm_utils.file_writer import ServerFileWriter, LocalFileWriter
+from slurm_utils.file_writer import ServerFileWriter, LocalFileWriter, ArrayFileWriter
+from slurm_utils.execution.main import prepare_array_jobs
+from slurm_utils.execution.parameters import RunConfig
 
 
 class ExperimentManager:
@@ -48,7 +50,7 @@ class ServerExperimentManager(ExperimentManager):
             data_dir=self.experiment_config.get("data").get("remote_data_dir")
         )
 
-    def run_experiment(self, clean_existing: bool = True):
+    def run_experiment(self, clean_existing: bool = True, resume: bool = False):
         logging.info("Starting experiment.")
         t = time.time()
         # local preparations
@@ -61,7 +63,14 @@ class ServerExperimentManager(ExperimentManager):
         with open(os.path.join(self.folder_config.script_dir, "config.json"), "w") as f:
             json.dump(self.experiment_config, f)
 
-        file_writer = ServerFileWriter(folder_config=self.folder_config, resource_config=self.resource_config)
+        run_config = RunConfig(experiment_config=self.experiment_config)
+        if run_config.execution_mode == "array":
+            self.run_array(run_config=run_config, resume=resume)
+            return
+
+        file_writer = ServerFileWriter(
+            folder_config=self.folder_config, resource_config=self.resource_config, resume=resume
+        )
         file_writer.write_pyhton_main_file()
         file_writer.write_execution_file()
 
@@ -71,10 +80,37 @@ class ServerExperimentManager(ExperimentManager):
         output = invoke.run(f"sbatch {self.folder_config.script_dir}/run.sbatch")
         logging.info("Sbatch run is started.")
 
+    def run_array(self, run_config: RunConfig, resume: bool = False):
+        t = time.time()
+        file_writer = ArrayFileWriter(folder_config=self.folder_config, resource_config=self.resource_config)
+        file_writer.write_pyhton_main_file()
+
+        # all trials are written upfront, every array task runs one of them
+        num_tasks = prepare_array_jobs(
+            executable="srun",
+            work_dir=self.folder_config.experiment_dir,
+            data_dir=self.folder_config.data_dir,
+            config_file=os.path.join(self.folder_config.script_dir, "config.json"),
+            resume=resume
+        )
+        if num_tasks == 0:
+            logging.info("All trials are finished already.")
+            return
+
+        max_concurrent = run_config.array_max_concurrent or self.resource_config.ntasks
+        file_writer.write_array_file(num_tasks=num_tasks, max_concurrent=max_concurrent)
+        file_writer.write_gather_file()
+        logging.info(f"Preparing run took {time.time() - t} seconds.")
+
+        output = invoke.run(f"sbatch --parsable {self.folder_config.script_dir}/array.sbatch")
+        array_job_id = output.stdout.strip().split(";")[0]
+        invoke.run(f"sbatch --dependency=afterany:{array_job_id} {self.folder_config.script_dir}/gather.sbatch")
+        logging.info(f"Job array {array_job_id} with {num_tasks} trials is started.")
+
 
 class LocalExperimentManager(ExperimentManager):
 
-    def run_experiment(self, clean_existing: bool = True):
+    def run_experiment(self, clean_existing: bool = True, resume: bool = False):
         t = time.time()
         # local preparations
         if clean_existing and os.path.isdir(self.folder_config.experiment_dir):
@@ -86,7 +122,7 @@ class LocalExperimentManager(ExperimentManager):
         with open(os.path.join(self.folder_config.script_dir, "config.json"), "w") as f:
             json.dump(self.experiment_config, f)
 
-        file_writer = LocalFileWriter(folder_config=self.folder_config)
+        file_writer = LocalFileWriter(folder_config=self.folder_config, resume=resume)
         file_writer.write_pyhton_main_file()
         file_writer.write_execution_file()
         # file setup
@@ -10,6 +10,7 @@ class FileWriter:
         self.folder_config = folder_config
         self.storage_env_variable = "SU_STORAGE"
         self.executable = "local"
+        self.resume = kwargs.get("resume", False)
 
     def write_execution_file(self):
         raise NotImplementedError()
@@ -24,7 +25,11 @@ RUN_FILE={self.folder_config.script_dir}/main.py
 """
         return project_string
 
+    def get_scheduling_flags(self):
+        return ["--resume"] if self.resume else []
+
     def get_scheduling_string(self):
+        flags = "".join(f" \\\n    {flag}" for flag in self.get_scheduling_flags())
         scheduling_string = f"""
 # experiment variables
 EXPERIMENT={self.folder_config.experiment_name}
@@ -38,7 +43,7 @@ schedule  --executable $EXECUTABLE \\
     --run_file $RUN_FILE \\
     --data_dir $DATA_DIR \\
     --work_dir $WORK_DIR \\
-    --config_file $CONFIG_FILE
+    --config_file $CONFIG_FILE{flags}
 """
         return scheduling_string
 
@@ -86,6 +91,59 @@ source ${self.storage_env_variable}/server_setup/init_slurm.sh
             f.write(sbatch_file)
 
 
+class ArrayFileWriter(ServerFileWriter):
+    """Writes a job array running one trial per task, and a job gathering the results afterwards."""
+
+    def get_scheduling_flags(self):
+        return super().get_scheduling_flags() + ["--gather"]
+
+    def write_array_file(self, num_tasks: int, max_concurrent: int):
+        experiment_dir = self.folder_config.experiment_dir
+        array_file = f"""{self.resource_config.get_array_sbatch_setup_string(num_tasks, max_concurrent)}
+#SBATCH --output={experiment_dir}/array_logs/%A_%a.out
+
+module load CUDA
+module load NCCL
+module load cuDNN       
+        
+{self.get_project_string()}
+
+# Prepare environment
+source ${self.storage_env_variable}/server_setup/init_slurm.sh
+
+# every array task runs the trial in line SLURM_ARRAY_TASK_ID + 1
+RUN_ID=$(sed -n "$((SLURM_ARRAY_TASK_ID + 1))p" {experiment_dir}/array_trials.txt)
+RUN_DIR={experiment_dir}/run_$RUN_ID
+export RUN_PORT=$(python -c "import socket; s = socket.socket(); s.bind(('', 0)); print(s.getsockname()[1])")
+
+START_TIME=$(date +%s.%N)
+$RUN_DIR/single_run.sh > $RUN_DIR/output.out 2>&1
+RETURNCODE=$?
+END_TIME=$(date +%s.%N)
+
+python -c "import json, sys; json.dump({{'time_in_secs': float(sys.argv[2]) - float(sys.argv[1]), \\
+    'returncode': int(sys.argv[3]), 'node': sys.argv[4]}}, open(sys.argv[5], 'w'))" \\
+    $START_TIME $END_TIME $RETURNCODE $HOSTNAME $RUN_DIR/process_stats.json
+"""
+        os.makedirs(os.path.join(experiment_dir, "array_logs"), exist_ok=True)
+        with open(os.path.join(self.folder_config.script_dir, "array.sbatch"), "w") as f:
+            f.write(array_file)
+
+    def write_gather_file(self):
+        gather_file = f"""{self.resource_config.get_gather_sbatch_setup_string()}
+#SBATCH --output={self.folder_config.experiment_dir}/output.out      ## sysout and syserr merged together
+
+{self.get_project_string()}
+
+# Prepare environment
+source ${self.storage_env_variable}/server_setup/init_slurm.sh
+
+{self.get_scheduling_string()}
+"""
+        with open(os.path.join(self.folder_config.script_dir, "gather.sbatch"), "w") as f:
+            f.write(gather_file)
+
+
 class LocalFileWriter(FileWriter):
 
     def write_execution_file(self):
@@ -8,19 +8,21 @@ from slurm_utils.experiment_manager import LocalExperimentManager, RemoteExperim
 
 @click.command()
 @click.argument('config')
-def su_local(config):
+@click.option('--resume', 'resume', is_flag=True, default=False, help="Keep finished trials of a previous run.")
+def su_local(config, resume):
     """Run code on SLURM.
 
     CONFIG is the name of the configuration file.
     """
     init_logging(logging.INFO)
     exp = LocalExperimentManager(config)
-    exp.run_experiment(clean_existing=True)
+    exp.run_experiment(clean_existing=not resume, resume=resume)
 
 
 @click.command()
 @click.argument('config')
-def su_sbatch(config):
+@click.option('--resume', 'resume', is_flag=True, default=False, help="Keep finished trials of a previous run.")
+def su_sbatch(config, resume):
     """Run code, ready for SLURM, locally.
 
     CONFIG is the name of the configuration file.
@@ -28,7 +30,7 @@ def su_sbatch(config):
     init_logging(logging.INFO)
 
     exp = ServerExperimentManager(config)
-    exp.run_experiment(clean_existing=True)
+    exp.run_experiment(clean_existing=not resume, resume=resume)
 
 
 @click.command()
@@ -2,7 +2,7 @@ import click
 import logging
 
 from slurm_utils.convenience.log import init_logging
-from slurm_utils.execution.main import schedule_and_run_jobs
+from slurm_utils.execution.main import schedule_and_run_jobs, gather_array_results
 
 
 @click.command()
@@ -11,7 +11,9 @@ from slurm_utils.execution.main import schedule_and_run_jobs
 @click.option('--data_dir', 'data_dir', help='Data directory.')
 @click.option('--work_dir', 'work_dir', help='Working directory.')
 @click.option('--config_file', 'config_file', help='Working directory.')
-def schedule_jobs_command(executable, run_file, data_dir, work_dir, config_file):
+@click.option('--resume', 'resume', is_flag=True, default=False, help='Skip trials finished in a previous run.')
+@click.option('--gather', 'gather', is_flag=True, default=False, help='Collect the results of a job array.')
+def schedule_jobs_command(executable, run_file, data_dir, work_dir, config_file, resume, gather):
     """Run code on SLURM.
 
     """
@@ -20,11 +22,21 @@ def schedule_jobs_command(executable, run_file, data_dir, work_dir, config_file)
     else:
         init_logging(logging.INFO)
 
+    if gather:
+        gather_array_results(
+            executable=executable,
+            work_dir=work_dir,
+            data_dir=data_dir,
+            config_file=config_file
+        )
+        return
+
     schedule_and_run_jobs(
         executable=executable,
         run_file=run_file,
         work_dir=work_dir,
         data_dir=data_dir,
-        config_file=config_file
+        config_file=config_file,
+        resume=resume
     )
 
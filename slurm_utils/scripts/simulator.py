@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import signal
+import logging
+
+import click
+
+from slurm_utils.convenience.log import init_logging
+from slurm_utils.simulator.cluster import STATE_DIR_VARIABLE, SimulatedCluster, simulated_nodes, install_shims
+from slurm_utils.simulator.replay import load_trace, replay_trace
+
+
+def cluster_nodes(num_nodes, cpus_per_node, gpus_per_node, memory_mb, nodes_file):
+    if nodes_file is not None:
+        with open(nodes_file, "r") as f:
+            return json.load(f)
+    return simulated_nodes(num_nodes, cpus_per_node, gpus_per_node, memory_mb)
+
+
+def node_options(command):
+    for option in reversed([
+        click.option("--nodes", "num_nodes", default=2, help="Number of simulated nodes."),
+        click.option("--cpus_per_node", "cpus_per_node", default=32),
+        click.option("--gpus_per_node", "gpus_per_node", default=4),
+        click.option("--memory_mb", "memory_mb", default=256000),
+        click.option("--nodes_file", "nodes_file", default=None,
+                     help="JSON list of nodes with name, cpus, gpus and memory_mb, instead of identical nodes."),
+        click.option("--backfill_depth", "backfill_depth", default=100, help="Jobs tested behind a blocked job."),
+        click.option("--default_time_limit", "default_time_limit", default=None,
+                     help="Time limit of jobs without --time, e.g. 1-00:00:00, unlimited by default."),
+    ]):
+        command = option(command)
+    return command
+
+
+@click.group()
+def su_slurm_sim():
+    """Local SLURM simulator, to run experiments end to end and replay job mixes without a cluster."""
+    init_logging(logging.INFO)
+
+
+@su_slurm_sim.command()
+@click.option("--state_dir", "state_dir", default=lambda: os.environ.get(STATE_DIR_VARIABLE, "slurm_sim"),
+              help="Directory of the simulated cluster.")
+@node_options
+@click.option("--kill_wait", "kill_wait", default=5.0, help="Seconds between SIGTERM and SIGKILL at the time limit.")
+@click.option("--idle_exit", "idle_exit", default=600.0, help="The daemon exits after this many seconds without jobs.")
+def start(state_dir, num_nodes, cpus_per_node, gpus_per_node, memory_mb, nodes_file, backfill_depth,
+          default_time_limit, kill_wait, idle_exit):
+    """Creates a simulated cluster and starts its daemon.
+
+    The SLURM commands are written to STATE_DIR/bin, put them first on the PATH to use the cluster, e.g. with
+    `su_sbatch`.
+    """
+    state_dir = os.path.abspath(state_dir)
+    if os.path.isfile(os.path.join(state_dir, "cluster.json")) and SimulatedCluster(state_dir).daemon_is_running():
+        raise click.ClickException(f"The simulated cluster in {state_dir} is running, stop it first.")
+    cluster = SimulatedCluster.create(
+        state_dir, cluster_nodes(num_nodes, cpus_per_node, gpus_per_node, memory_mb, nodes_file),
+        default_time_limit=default_time_limit, kill_wait=kill_wait, backfill_depth=backfill_depth,
+        idle_exit=idle_exit
+    )
+    bin_dir = install_shims(os.path.join(state_dir, "bin"), state_dir)
+    cluster.ensure_daemon()
+    # stdout is only the environment, for `eval $(su_slurm_sim start)`
+    click.echo(f"Simulated cluster with {len(cluster.config['nodes'])} nodes is running in {state_dir}.", err=True)
+    click.echo(f"export PATH={bin_dir}:$PATH {STATE_DIR_VARIABLE}={state_dir}")
+
+
+@su_slurm_sim.command()
+@click.option("--state_dir", "state_dir", default=lambda: os.environ.get(STATE_DIR_VARIABLE, "slurm_sim"),
+              help="Directory of the simulated cluster.")
+def stop(state_dir):
+    """Cancels all jobs of the simulated cluster and stops its daemon."""
+    cluster = SimulatedCluster(state_dir)
+    jobs = cluster.cancel([job["job_id"] for job in cluster.read_state()["jobs"].values()])
+    if len(jobs) > 0:
+        logging.info(f"Cancelled {len(jobs)} jobs.")
+    deadline = time.time() + cluster.config["kill_wait"] + 5
+    while cluster.read_state()["jobs"] and cluster.daemon_is_running() and time.time() < deadline:
+        time.sleep(cluster.config["poll_interval"])
+
+    if cluster.daemon_is_running():
+        with open(cluster.pid_file, "r") as f:
+            os.kill(int(f.read().strip()), signal.SIGTERM)
+    logging.info("The simulated cluster is stopped.")
+
+
+@su_slurm_sim.command()
+@click.argument("trace")
+@node_options
+@click.option("--output", "output", default=None, help="Write the report as JSON.")
+@click.option("--jobs_output", "jobs_output", default=None, help="Write the record of every job as JSONL.")
+def replay(trace, num_nodes, cpus_per_node, gpus_per_node, memory_mb, nodes_file, backfill_depth, default_time_limit,
+           output, jobs_output):
+    """Replays a job mix in virtual time and reports waiting times and utilization.
+
+    TRACE is a JSONL file with one job per line, its `submit` time and `runtime` in seconds and its sbatch options,
+    e.g. {"submit": 0, "runtime": 5400, "time": "2:00:00", "nodes": 1, "ntasks-per-node": 4, "gres": "gpu:4"}.
+    """
+    report, records = replay_trace(
+        load_trace(trace), cluster_nodes(num_nodes, cpus_per_node, gpus_per_node, memory_mb, nodes_file),
+        backfill_depth=backfill_depth, default_time_limit=default_time_limit
+    )
+    for key, value in report.items():
+        logging.info(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+    if jobs_output is not None:
+        with open(jobs_output, "w") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
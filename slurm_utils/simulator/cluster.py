@@ -0,0 +1,1149 @@
+import os
+import re
+import sys
+import json
+import time
+import fcntl
+import shlex
+import signal
+import getpass
+import subprocess
+import importlib.util
+from functools import lru_cache
+from contextlib import contextmanager
+
+# only the standard library: the shims load this file by its path, importing the slurm_utils package takes seconds
+
+STATE_DIR_VARIABLE = "SU_SLURM_SIM_DIR"
+SHIMS = ["sbatch", "srun", "squeue", "sinfo", "scancel", "sacct", "scontrol"]
+TERMINAL_STATES = {"COMPLETED", "FAILED", "CANCELLED", "TIMEOUT", "NODE_FAIL"}
+SHORT_STATES = {
+    "PENDING": "PD", "RUNNING": "R", "COMPLETED": "CD", "FAILED": "F", "CANCELLED": "CA", "TIMEOUT": "TO",
+    "NODE_FAIL": "NF"
+}
+# finished jobs remembered for dependencies and `squeue -j`, older ones are only in the accounting log
+MAX_FINISHED = 10000
+
+SHIM = """#!{python}
+# {command} of the local SLURM simulator, see slurm_utils.simulator.cluster
+import os
+import sys
+import importlib.util
+
+spec = importlib.util.spec_from_file_location("su_slurm_simulator", "{cluster_file}")
+cluster = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(cluster)
+sys.exit(cluster.main("{command}", sys.argv[1:], os.environ.get(cluster.STATE_DIR_VARIABLE, "{state_dir}")))
+"""
+
+
+class SimulatorError(Exception):
+    pass
+
+
+@lru_cache(maxsize=None)
+def load_nodes_module():
+    # expands host lists, loaded from its file like this module
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "execution", "nodes.py")
+    spec = importlib.util.spec_from_file_location("su_slurm_simulator_nodes", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def expand_nodelist(nodelist):
+    if not nodelist:
+        return []
+    return load_nodes_module().expand_nodelist(nodelist)
+
+
+def parse_time_limit(value):
+    """Seconds of a SLURM time like `minutes`, `minutes:seconds`, `hours:minutes:seconds` or `days-hours[:minutes]`."""
+    if isinstance(value, (int, float)):
+        return value
+    value = str(value).strip()
+    if value.upper() in ("", "UNLIMITED", "INFINITE", "-1"):
+        return None
+    days = 0
+    if "-" in value:
+        days, value = value.split("-", 1)
+        hours, minutes, seconds = ([int(part) for part in value.split(":")] + [0, 0])[:3]
+    else:
+        parts = [int(part) for part in value.split(":")]
+        hours, minutes, seconds = {1: [0, parts[0], 0], 2: [0] + parts}.get(len(parts), parts[:3])
+    return ((int(days) * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def format_duration(secs):
+    if secs is None:
+        return "UNLIMITED"
+    days, rest = divmod(int(max(0, secs)), 24 * 3600)
+    hours, rest = divmod(rest, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{days}-{hours:02d}:{minutes:02d}:{seconds:02d}" if days else f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def format_timestamp(timestamp):
+    return "Unknown" if timestamp is None else time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(timestamp))
+
+
+def parse_options(args: list, short_options: dict, flags: set, stop_at_positional: bool = True):
+    """Splits `--key=value`, `--key value`, `-k value` and `-kvalue` options of a SLURM command from its arguments.
+
+    `short_options` maps `-k` to the long name, names in `flags` take no value. Parsing stops at the first positional
+    argument, the command of `srun` or the script of `sbatch`, unless `stop_at_positional` is False.
+    """
+    options, positionals, i = {}, [], 0
+    while i < len(args):
+        arg = args[i]
+        if not arg.startswith("-") or arg == "-":
+            if stop_at_positional:
+                break
+            positionals.append(arg)
+            i += 1
+            continue
+        if arg.startswith("--"):
+            key, has_value, value = arg[2:].partition("=")
+        else:
+            key = short_options.get(arg[:2], arg[1:2])
+            has_value, value = len(arg) > 2, arg[2:]
+        if key in flags:
+            value = True
+        elif not has_value:
+            i += 1
+            value = args[i] if i < len(args) else ""
+        options[key] = value
+        i += 1
+    return options, positionals + args[i:]
+
+
+def read_directives(script: str):
+    """Arguments of the `#SBATCH` lines before the first command of a batch script."""
+    args = []
+    for line in script.splitlines():
+        line = line.strip()
+        if line.startswith("#SBATCH"):
+            args.extend(shlex.split(line[len("#SBATCH"):], comments=True))
+        elif line and not line.startswith("#"):
+            break
+    return args
+
+
+def parse_gpus(gres: str):
+    # `gpu`, `gpu:2` or `gpu:a100:2`, other generic resources are ignored
+    num_gpus = 0
+    for item in (gres or "").split(","):
+        parts = item.strip().split(":")
+        if parts[0] == "gpu":
+            num_gpus += int(parts[-1]) if len(parts) > 1 and parts[-1].isdigit() else 1
+    return num_gpus
+
+
+def parse_array(spec: str):
+    """Task ids and the concurrency limit of `--array`, e.g. `0-9%2`, `1,3,5` or `0-10:2`."""
+    spec, _, limit = str(spec).partition("%")
+    task_ids = []
+    for item in spec.split(","):
+        item, _, step = item.partition(":")
+        if "-" in item:
+            first, last = item.split("-")
+            task_ids.extend(range(int(first), int(last) + 1, int(step or 1)))
+        else:
+            task_ids.append(int(item))
+    return task_ids, int(limit) if limit else None
+
+
+def job_request(options: dict, default_time_limit=None):
+    """Resources of a job from its `sbatch` options."""
+    num_nodes = int(str(options.get("nodes", 1)).split("-")[0])
+    if "ntasks-per-node" in options:
+        tasks_per_node = int(options["ntasks-per-node"])
+    else:
+        tasks_per_node = -(-int(options.get("ntasks", 1)) // num_nodes)
+    cpus_per_task = int(options.get("cpus-per-task", 1))
+
+    gpus_per_node = parse_gpus(options.get("gres"))
+    if "gpus-per-node" in options:
+        gpus_per_node = int(str(options["gpus-per-node"]).split(":")[-1])
+    elif "gpus" in options:
+        gpus_per_node = -(-int(str(options["gpus"]).split(":")[-1]) // num_nodes)
+
+    return {
+        "num_nodes": num_nodes,
+        "tasks_per_node": tasks_per_node,
+        "cpus_per_task": cpus_per_task,
+        "cpus_per_node": tasks_per_node * cpus_per_task,
+        "gpus_per_node": gpus_per_node,
+        "time_limit": parse_time_limit(options["time"]) if "time" in options else default_time_limit,
+        "nodelist": expand_nodelist(options.get("nodelist")),
+        "exclude": expand_nodelist(options.get("exclude")),
+    }
+
+
+def free_resources(nodes: list, jobs):
+    """Free CPUs and GPU indices per node, given the jobs."""
+    free = {node["name"]: {"cpus": node["cpus"], "gpus": list(range(node["gpus"]))} for node in nodes}
+    for job in jobs:
+        if job["state"] == "RUNNING":
+            take(free, job["alloc"])
+    return free
+
+
+def take(free: dict, alloc: dict):
+    for name, resources in alloc.items():
+        free[name]["cpus"] -= resources["cpus"]
+        free[name]["gpus"] = [gpu for gpu in free[name]["gpus"] if gpu not in resources["gpus"]]
+
+
+def give_back(free: dict, alloc: dict):
+    for name, resources in alloc.items():
+        free[name]["cpus"] += resources["cpus"]
+        free[name]["gpus"] = sorted(free[name]["gpus"] + resources["gpus"])
+
+
+def largest_free(free: dict):
+    # most free CPUs and GPUs of any node
+    return max(node["cpus"] for node in free.values()), max(len(node["gpus"]) for node in free.values())
+
+
+def fit(job: dict, free: dict, excluded=()):
+    """Allocation of the job on the free resources, None if it does not fit.
+
+    The nodes with the fewest free GPUs, then CPUs, which can hold the job are taken, such that large jobs find empty
+    nodes later.
+    """
+    candidates = [
+        name for name, resources in free.items()
+        if resources["cpus"] >= job["cpus_per_node"] and len(resources["gpus"]) >= job["gpus_per_node"]
+        and (not job["nodelist"] or name in job["nodelist"]) and name not in job["exclude"] and name not in excluded
+    ]
+    if len(candidates) < job["num_nodes"]:
+        return None
+    candidates.sort(key=lambda name: (len(free[name]["gpus"]), free[name]["cpus"], name))
+    return {
+        name: {"cpus": job["cpus_per_node"], "gpus": free[name]["gpus"][:job["gpus_per_node"]]}
+        for name in candidates[:job["num_nodes"]]
+    }
+
+
+def reserve(job: dict, free: dict, running: list):
+    """Earliest time and nodes at which the job fits, if the `running` (end time, allocation) end at their limits."""
+    free = {name: {"cpus": resources["cpus"], "gpus": list(resources["gpus"])} for name, resources in free.items()}
+    for end_time, alloc in sorted(running, key=lambda item: item[0]):
+        give_back(free, alloc)
+        reserved = fit(job, free)
+        if reserved is not None:
+            return end_time, set(reserved)
+    return None, set()
+
+
+def dependency_state(job: dict, jobs: dict, finished: dict):
+    """`ok` if the dependencies of the job are satisfied, `wait` or `never` otherwise."""
+    if not job.get("dependency"):
+        return "ok"
+    for item in re.split(r"[,?]", job["dependency"]):
+        kind, _, job_ids = item.partition(":")
+        for dependency in filter(None, job_ids.split(":")):
+            dependency = dependency.split("+")[0]
+            states = [
+                other["state"] for other in jobs.values()
+                if other["job_id"] == dependency or other.get("array_job_id") == dependency
+            ]
+            if kind == "after" and any(state == "RUNNING" for state in states):
+                continue
+            if any(state not in TERMINAL_STATES for state in states):
+                return "wait"
+            states += [state for job_id, state in finished.items() if job_id.split("_")[0] == dependency]
+            if kind == "afterok" and any(state != "COMPLETED" for state in states):
+                return "never"
+            if kind == "afternotok" and states and all(state == "COMPLETED" for state in states):
+                return "never"
+    return "ok"
+
+
+def plan_jobs(now: float, jobs: dict, nodes: list, finished: dict, backfill_depth: int = 100, running: list = None):
+    """Pending jobs to start now, as (job, allocation, backfilled), with SLURM's default EASY backfill.
+
+    Jobs start in submission order. The first job which does not fit gets a reservation at the earliest time the
+    running jobs free enough resources, assuming they run until their time limit. Later jobs start ahead of it only
+    if they fit now and either end before the reservation or stay off the reserved nodes. At most `backfill_depth`
+    jobs behind the reservation are tested, the tested jobs get the reason shown by `squeue`. `jobs` are in
+    submission order, as they are queued, `running` are the running jobs if they are known without a scan of `jobs`.
+    """
+    if running is None:
+        running = [job for job in jobs.values() if job["state"] == "RUNNING"]
+    free = free_resources(nodes, running)
+    ends = [(job["start_time"] + job["time_limit"], job["alloc"]) for job in running if job["time_limit"] is not None]
+    array_running = {}
+    for job in running:
+        if job.get("array_job_id"):
+            array_running[job["array_job_id"]] = array_running.get(job["array_job_id"], 0) + 1
+
+    # jobs which need more of a node than any node has free are skipped without a search
+    most_free = largest_free(free)
+    started, reservation, num_tested = [], None, 0
+    for job in jobs.values():
+        if job["state"] != "PENDING":
+            continue
+        if job.get("hold"):
+            job["reason"] = "JobHeldUser"
+            continue
+        dependency = dependency_state(job, jobs, finished)
+        if dependency != "ok":
+            job["reason"] = "Dependency" if dependency == "wait" else "DependencyNeverSatisfied"
+            continue
+        if job.get("array_max") and array_running.get(job["array_job_id"], 0) >= job["array_max"]:
+            job["reason"] = "JobArrayTaskLimit"
+            continue
+
+        fits_a_node = job["cpus_per_node"] <= most_free[0] and job["gpus_per_node"] <= most_free[1]
+        if reservation is None:
+            alloc = fit(job, free) if fits_a_node else None
+            if alloc is None:
+                reservation = reserve(job, free, ends)
+                job["reason"] = "Resources"
+                continue
+            backfilled = False
+        else:
+            num_tested += 1
+            if num_tested > backfill_depth or most_free[0] == 0:
+                break
+            job["reason"] = "Priority"
+            if not fits_a_node:
+                continue
+            shadow_time, reserved_nodes = reservation
+            alloc = fit(job, free, excluded=reserved_nodes)
+            ends_before = job["time_limit"] is not None and shadow_time is not None and \
+                now + job["time_limit"] <= shadow_time
+            if alloc is None and ends_before:
+                alloc = fit(job, free)
+            if alloc is None:
+                continue
+            backfilled = True
+
+        take(free, alloc)
+        most_free = largest_free(free)
+        if job["time_limit"] is not None:
+            ends.append((now + job["time_limit"], alloc))
+        if job.get("array_job_id"):
+            array_running[job["array_job_id"]] = array_running.get(job["array_job_id"], 0) + 1
+        job["reason"] = "None"
+        started.append((job, alloc, backfilled))
+    return started
+
+
+def substitute_filename(pattern: str, job: dict):
+    # the replacement symbols of `--output`, `%%` is a literal percent sign
+    replacements = {
+        "j": str(job["seq"][2]),
+        "A": job.get("array_job_id") or job["job_id"],
+        "a": str(job.get("array_task_id", "4294967294")),
+        "x": job["name"],
+        "u": job["user"],
+        "N": job["nodes"][0] if job.get("nodes") else "",
+        "%": "%",
+    }
+    return re.sub(r"%(\d*)([jAaxuN%])", lambda m: replacements[m.group(2)].zfill(int(m.group(1) or 0)), pattern)
+
+
+def pid_is_alive(pid: int):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def signal_group(pgid, sig):
+    if not pgid:
+        return
+    try:
+        os.killpg(pgid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def simulated_nodes(num_nodes: int, cpus_per_node: int, gpus_per_node: int, memory_mb: int = 0, prefix: str = "node"):
+    return [
+        {"name": f"{prefix}{i}", "cpus": cpus_per_node, "gpus": gpus_per_node, "memory_mb": memory_mb}
+        for i in range(1, num_nodes + 1)
+    ]
+
+
+class SimulatedCluster:
+    """A SLURM cluster on the local machine, for end-to-end runs and load tests without a cluster.
+
+    The state, i.e. the nodes, the queue and the running steps, is a JSON file in `state_dir` guarded by a lock file,
+    which the command shims (`sbatch`, `srun`, `squeue`, `sinfo`, `scancel`, `sacct`, `scontrol`) and the daemon
+    change. The daemon schedules pending jobs with backfill, runs their batch scripts on this machine with the
+    SLURM variables of their allocation, enforces time limits and writes an accounting record for every finished
+    job and step to `accounting.jsonl`. Nodes and GPUs are only bookkeeping, every job runs on this machine.
+    """
+
+    def __init__(self, state_dir: str):
+        self.state_dir = os.path.abspath(state_dir)
+        self.state_file = os.path.join(self.state_dir, "state.json")
+        self.lock_file = os.path.join(self.state_dir, "state.lock")
+        self.accounting_file = os.path.join(self.state_dir, "accounting.jsonl")
+        self.spool_dir = os.path.join(self.state_dir, "spool")
+        self.pid_file = os.path.join(self.state_dir, "daemon.pid")
+
+        config_file = os.path.join(self.state_dir, "cluster.json")
+        if not os.path.isfile(config_file):
+            raise SimulatorError(f"No simulated cluster in {self.state_dir}, create one with `su_slurm_sim start`.")
+        with open(config_file, "r") as f:
+            self.config = json.load(f)
+        self.nodes = {node["name"]: node for node in self.config["nodes"]}
+
+        # batch script processes of the daemon, job id -> Popen
+        self.processes = {}
+
+    @staticmethod
+    def create(state_dir: str, nodes: list, partition: str = "sim", default_time_limit=None, kill_wait: float = 5,
+               poll_interval: float = 0.2, backfill_depth: int = 100, idle_exit: float = 600):
+        """Writes the configuration of a cluster, `nodes` are dicts with `name`, `cpus`, `gpus` and `memory_mb`."""
+        os.makedirs(os.path.join(state_dir, "spool"), exist_ok=True)
+        config = {
+            "partition": partition,
+            "nodes": nodes,
+            "default_time_limit": parse_time_limit(default_time_limit) if default_time_limit is not None else None,
+            "kill_wait": kill_wait,
+            "poll_interval": poll_interval,
+            "backfill_depth": backfill_depth,
+            "idle_exit": idle_exit,
+        }
+        with open(os.path.join(state_dir, "cluster.json"), "w") as f:
+            json.dump(config, f, indent=2)
+        return SimulatedCluster(state_dir)
+
+    @contextmanager
+    def locked_state(self):
+        with open(self.lock_file, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                text = None
+                if os.path.isfile(self.state_file):
+                    with open(self.state_file, "r") as f:
+                        text = f.read()
+                state = json.loads(text) if text else {"next_job_id": 1, "jobs": {}, "finished": {}}
+
+                yield state
+
+                new_text = json.dumps(state)
+                if new_text != text:
+                    tmp_file = f"{self.state_file}.{os.getpid()}.tmp"
+                    with open(tmp_file, "w") as f:
+                        f.write(new_text)
+                    os.replace(tmp_file, self.state_file)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def read_state(self):
+        with self.locked_state() as state:
+            return state
+
+    def account(self, record: dict):
+        with open(self.accounting_file, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def read_accounting(self):
+        if not os.path.isfile(self.accounting_file):
+            return []
+        with open(self.accounting_file, "r") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    # submission
+
+    def submit(self, options: dict, script: str, env: dict, work_dir: str):
+        """Queues a batch script, returns the job id, or the array job id for `--array`."""
+        request = job_request(options, self.config["default_time_limit"])
+        unknown = [name for name in request["nodelist"] + request["exclude"] if name not in self.nodes]
+        if unknown:
+            raise SimulatorError(f"Invalid node name specified: {','.join(unknown)}")
+        free = free_resources(self.config["nodes"], [])
+        if fit(dict(request, exclude=[]), free) is None:
+            raise SimulatorError("Requested node configuration is not available")
+        task_ids, array_max = parse_array(options["array"]) if "array" in options else (None, None)
+
+        now = time.time()
+        with self.locked_state() as state:
+            job_id = str(state["next_job_id"])
+            state["next_job_id"] += 1 + len(task_ids or [])
+
+            # the script and environment are kept once per submission, array tasks share them
+            with open(os.path.join(self.spool_dir, f"{job_id}.sh"), "w") as f:
+                f.write(script)
+            with open(os.path.join(self.spool_dir, f"{job_id}.env.json"), "w") as f:
+                json.dump(env, f)
+
+            job = dict(
+                request,
+                job_id=job_id,
+                name=options.get("job-name") or "sbatch",
+                user=getpass.getuser(),
+                partition=options.get("partition") or self.config["partition"],
+                state="PENDING",
+                # jobs behind the tested ones wait for the jobs ahead of them
+                reason="Priority",
+                submit_time=now,
+                start_time=None,
+                end_time=None,
+                work_dir=os.path.abspath(options.get("chdir", work_dir)),
+                output=options.get("output"),
+                error=options.get("error"),
+                dependency=options.get("dependency"),
+                hold=bool(options.get("hold")),
+                spool=job_id,
+                seq=[int(job_id), -1, int(job_id)],
+                alloc={},
+                nodes=[],
+                steps={},
+                next_step=0,
+            )
+            if task_ids is None:
+                state["jobs"][job_id] = job
+            for i, task_id in enumerate(task_ids or []):
+                task = dict(job, job_id=f"{job_id}_{task_id}", array_job_id=job_id, array_task_id=task_id,
+                            array_max=array_max, seq=[int(job_id), task_id, int(job_id) + 1 + i])
+                state["jobs"][task["job_id"]] = task
+        return job_id
+
+    @staticmethod
+    def matching_jobs(state: dict, job_ids: list):
+        # a job id, an array job id for all of its tasks, or an array task like 12_3 or by its own job id
+        return [
+            job for job in state["jobs"].values()
+            if job["job_id"] in job_ids or job.get("array_job_id") in job_ids or str(job["seq"][2]) in job_ids
+        ]
+
+    def cancel(self, job_ids: list):
+        now = time.time()
+        with self.locked_state() as state:
+            jobs = self.matching_jobs(state, job_ids)
+            for job in jobs:
+                if job["state"] == "PENDING":
+                    self.finish_job(state, job, "CANCELLED", now)
+                elif not job.get("cancelled"):
+                    job["cancelled"] = True
+                    job["kill_at"] = now + self.config["kill_wait"]
+                    self.signal_job(job, signal.SIGTERM)
+        return jobs
+
+    # daemon
+
+    def daemon_is_running(self):
+        try:
+            with open(self.pid_file, "r") as f:
+                return pid_is_alive(int(f.read().strip()))
+        except (OSError, ValueError):
+            return False
+
+    def ensure_daemon(self):
+        if self.daemon_is_running():
+            return
+        with open(os.path.join(self.state_dir, "daemon.log"), "a") as log:
+            subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "daemon", self.state_dir], stdout=log, stderr=log,
+                stdin=subprocess.DEVNULL, start_new_session=True
+            )
+        # the daemon writes its pid once it holds the daemon lock
+        for _ in range(100):
+            if self.daemon_is_running():
+                return
+            time.sleep(0.05)
+
+    def run(self):
+        """The scheduling loop, it exits after `idle_exit` seconds without jobs or on SIGTERM."""
+        with open(os.path.join(self.state_dir, "daemon.lock"), "a") as lock:
+            # a daemon which just decided to exit may still hold the lock
+            for _ in range(40):
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    time.sleep(0.05)
+            else:
+                return
+            with open(self.pid_file, "w") as f:
+                f.write(str(os.getpid()))
+
+            stopped = []
+            signal.signal(signal.SIGTERM, lambda signum, frame: stopped.append(signum))
+            with self.locked_state() as state:
+                self.recover(state)
+
+            last_busy = time.time()
+            while not stopped:
+                now = time.time()
+                with self.locked_state() as state:
+                    self.step(state, now)
+                    if state["jobs"]:
+                        last_busy = now
+                    # decided under the state lock, `sbatch` starts a new daemon once the pid file is gone
+                    idle = self.config["idle_exit"] is not None and now - last_busy > self.config["idle_exit"]
+                    if idle or stopped:
+                        os.remove(self.pid_file)
+                        break
+                time.sleep(self.config["poll_interval"])
+
+    def recover(self, state: dict):
+        # jobs of an earlier daemon cannot be waited for, as on a failed node
+        now = time.time()
+        for job in [job for job in state["jobs"].values() if job["state"] == "RUNNING"]:
+            self.signal_job(job, signal.SIGKILL)
+            self.finish_job(state, job, "NODE_FAIL", now)
+
+    def step(self, state: dict, now: float):
+        for job_id, process in list(self.processes.items()):
+            exit_code = process.poll()
+            if exit_code is None:
+                continue
+            self.processes.pop(job_id)
+            job = state["jobs"].get(job_id)
+            if job is None:
+                continue
+            if job.get("cancelled"):
+                final_state = "CANCELLED"
+            elif job.get("timed_out"):
+                final_state = "TIMEOUT"
+            else:
+                final_state = "COMPLETED" if exit_code == 0 else "FAILED"
+            self.finish_job(state, job, final_state, now, exit_code=exit_code)
+
+        for job in state["jobs"].values():
+            if job["state"] != "RUNNING":
+                continue
+            if job["time_limit"] is not None and not job.get("timed_out") and \
+                    now >= job["start_time"] + job["time_limit"]:
+                job["timed_out"] = True
+                job["kill_at"] = now + self.config["kill_wait"]
+                self.signal_job(job, signal.SIGTERM)
+            if job.get("kill_at") is not None and now >= job["kill_at"]:
+                job["kill_at"] = None
+                self.signal_job(job, signal.SIGKILL)
+
+        planned = plan_jobs(now, state["jobs"], self.config["nodes"], state["finished"], self.config["backfill_depth"])
+        for job, alloc, backfilled in planned:
+            self.start_job(state, job, alloc, backfilled, now)
+
+    def job_environment(self, job: dict):
+        with open(os.path.join(self.spool_dir, f"{job['spool']}.env.json"), "r") as f:
+            env = json.load(f)
+        env.update({
+            "SLURM_JOB_ID": str(job["seq"][2]),
+            "SLURM_JOBID": str(job["seq"][2]),
+            "SLURM_JOB_NAME": job["name"],
+            "SLURM_JOB_USER": job["user"],
+            "SLURM_JOB_PARTITION": job["partition"],
+            "SLURM_JOB_NODELIST": ",".join(job["nodes"]),
+            "SLURM_NODELIST": ",".join(job["nodes"]),
+            "SLURM_JOB_NUM_NODES": str(job["num_nodes"]),
+            "SLURM_NNODES": str(job["num_nodes"]),
+            "SLURM_JOB_CPUS_PER_NODE": f"{job['cpus_per_node']}(x{job['num_nodes']})",
+            "SLURM_NTASKS": str(job["tasks_per_node"] * job["num_nodes"]),
+            "SLURM_NTASKS_PER_NODE": str(job["tasks_per_node"]),
+            "SLURM_CPUS_PER_TASK": str(job["cpus_per_task"]),
+            "SLURM_SUBMIT_DIR": job["work_dir"],
+            "SLURMD_NODENAME": job["nodes"][0],
+            "SLURM_CLUSTER_NAME": "simulator",
+        })
+        if job["gpus_per_node"]:
+            env["SLURM_JOB_GPUS"] = ",".join(str(gpu) for gpu in job["alloc"][job["nodes"][0]]["gpus"])
+        if job["time_limit"] is not None:
+            env["SLURM_JOB_END_TIME"] = str(int(job["start_time"] + job["time_limit"]))
+        if job.get("array_job_id") is not None:
+            env["SLURM_ARRAY_JOB_ID"] = job["array_job_id"]
+            env["SLURM_ARRAY_TASK_ID"] = str(job["array_task_id"])
+        # the shims find this cluster from within the job
+        env[STATE_DIR_VARIABLE] = self.state_dir
+        return env
+
+    def start_job(self, state: dict, job: dict, alloc: dict, backfilled: bool, now: float):
+        job.update(state="RUNNING", start_time=now, alloc=alloc, nodes=sorted(alloc), backfilled=backfilled)
+        output = os.path.join(job["work_dir"], substitute_filename(job["output"] or "slurm-%j.out", job))
+        error = os.path.join(job["work_dir"], substitute_filename(job["error"], job)) if job["error"] else None
+        try:
+            # sbatch does not create missing directories, the job fails
+            stdout = open(output, "w")
+            stderr = open(error, "w") if error else subprocess.STDOUT
+        except OSError as e:
+            print(f"Job {job['job_id']} failed, its output cannot be written: {e}", flush=True)
+            self.finish_job(state, job, "FAILED", now, exit_code=1)
+            return
+
+        with stdout:
+            process = subprocess.Popen(
+                ["/bin/bash", os.path.join(self.spool_dir, f"{job['spool']}.sh")], cwd=job["work_dir"],
+                env=self.job_environment(job), stdout=stdout, stderr=stderr, stdin=subprocess.DEVNULL,
+                start_new_session=True
+            )
+        if stderr is not subprocess.STDOUT:
+            stderr.close()
+        job["pgid"] = process.pid
+        self.processes[job["job_id"]] = process
+
+    def signal_job(self, job: dict, sig):
+        # the batch script and all steps, steps run in their own process groups
+        signal_group(job.get("pgid"), sig)
+        for step in job["steps"].values():
+            signal_group(step.get("pgid"), sig)
+
+    def finish_job(self, state: dict, job: dict, final_state: str, now: float, exit_code: int = 0):
+        job.update(state=final_state, end_time=now)
+        state["jobs"].pop(job["job_id"], None)
+        state["finished"][job["job_id"]] = final_state
+        for job_id in list(state["finished"])[:-MAX_FINISHED]:
+            state["finished"].pop(job_id)
+
+        self.account({
+            "job_id": job["job_id"],
+            "array_job_id": job.get("array_job_id"),
+            "array_task_id": job.get("array_task_id"),
+            "name": job["name"],
+            "user": job["user"],
+            "partition": job["partition"],
+            "state": final_state,
+            "exit_code": max(exit_code, 0),
+            "signal": max(-exit_code, 0),
+            "submit_time": job["submit_time"],
+            "start_time": job["start_time"],
+            "end_time": now,
+            "time_limit": job["time_limit"],
+            "num_nodes": job["num_nodes"],
+            "cpus": job["cpus_per_node"] * job["num_nodes"],
+            "gpus": job["gpus_per_node"] * job["num_nodes"],
+            "nodes": job["nodes"],
+            "backfilled": job.get("backfilled", False),
+            "work_dir": job["work_dir"],
+        })
+        if not any(other["spool"] == job["spool"] for other in state["jobs"].values()):
+            for suffix in [".sh", ".env.json"]:
+                try:
+                    os.remove(os.path.join(self.spool_dir, f"{job['spool']}{suffix}"))
+                except FileNotFoundError:
+                    pass
+
+    # steps
+
+    def create_step(self, job_id: str, options: dict):
+        """Places a step of `srun` on a node of the allocation, returns (job, step id, node)."""
+        with self.locked_state() as state:
+            # within an array task, SLURM_JOB_ID is the own job id of the task
+            job = next((job for job in state["jobs"].values() if str(job["seq"][2]) == job_id), None)
+            if job is None or job["state"] != "RUNNING":
+                raise SimulatorError(
+                    f"Unable to create step for job {job_id}: Job/step already completing or completed"
+                )
+
+            requested = expand_nodelist(options.get("nodelist"))
+            if any(name not in job["nodes"] for name in requested):
+                raise SimulatorError("Requested node configuration is not available")
+            excluded = expand_nodelist(options.get("exclude"))
+            candidates = [name for name in requested or job["nodes"] if name not in excluded]
+            if len(candidates) < int(str(options.get("nodes", 1)).split("-")[0]):
+                raise SimulatorError("Requested node configuration is not available")
+
+            steps_per_node = {name: 0 for name in candidates}
+            for step in job["steps"].values():
+                if step["node"] in steps_per_node:
+                    steps_per_node[step["node"]] += 1
+            node = min(candidates, key=lambda name: steps_per_node[name])
+
+            step_id = str(job["next_step"])
+            job["next_step"] += 1
+            job["steps"][step_id] = {"node": node, "start_time": time.time(), "pgid": None}
+            return dict(job), step_id, node
+
+    def update_step(self, job_id: str, step_id: str, **values):
+        with self.locked_state() as state:
+            job = state["jobs"].get(job_id)
+            if job is not None and step_id in job["steps"]:
+                job["steps"][step_id].update(values)
+
+    def finish_step(self, job: dict, step_id: str, exit_code: int):
+        with self.locked_state() as state:
+            current = state["jobs"].get(job["job_id"])
+            step = current["steps"].pop(step_id, None) if current is not None else None
+        if step is None:
+            return
+        self.account({
+            "job_id": f"{job['job_id']}.{step_id}",
+            "name": job["name"],
+            "user": job["user"],
+            "partition": job["partition"],
+            "state": "COMPLETED" if exit_code == 0 else ("CANCELLED" if exit_code < 0 else "FAILED"),
+            "exit_code": max(exit_code, 0),
+            "signal": max(-exit_code, 0),
+            "submit_time": step["start_time"],
+            "start_time": step["start_time"],
+            "end_time": time.time(),
+            "time_limit": None,
+            "num_nodes": 1,
+            "cpus": 0,
+            "gpus": 0,
+            "nodes": [step["node"]],
+            "work_dir": job["work_dir"],
+        })
+
+
+# command shims, arguments as SLURM takes them
+
+
+def print_error(command: str, message: str):
+    print(f"{command}: error: {message}", file=sys.stderr)
+    return 1
+
+
+def sbatch(cluster: SimulatedCluster, args: list):
+    short_options = {
+        "-N": "nodes", "-n": "ntasks", "-c": "cpus-per-task", "-J": "job-name", "-o": "output", "-e": "error",
+        "-t": "time", "-a": "array", "-d": "dependency", "-p": "partition", "-w": "nodelist", "-x": "exclude",
+        "-D": "chdir", "-G": "gpus", "-H": "hold", "-W": "wait", "-q": "qos", "-A": "account", "-C": "constraint"
+    }
+    flags = {"parsable", "wait", "hold", "exclusive", "requeue", "no-requeue", "quiet", "verbose"}
+    options, rest = parse_options(args, short_options, flags)
+    if rest:
+        with open(rest[0], "r") as f:
+            script = f.read()
+    else:
+        script = sys.stdin.read()
+    if not script.startswith("#!"):
+        return print_error("sbatch", "This does not look like a batch script.  The first line must start with #!")
+
+    # options on the command line win over the ones in the script
+    directives, _ = parse_options(read_directives(script), short_options, flags)
+    options = dict(directives, **options)
+    try:
+        job_id = cluster.submit(options, script, env=dict(os.environ), work_dir=os.getcwd())
+    except SimulatorError as e:
+        return print_error("sbatch", f"Batch job submission failed: {e}")
+    cluster.ensure_daemon()
+    print(job_id if options.get("parsable") else f"Submitted batch job {job_id}", flush=True)
+
+    if options.get("wait"):
+        while any(cluster.matching_jobs(cluster.read_state(), [job_id])):
+            time.sleep(cluster.config["poll_interval"])
+        records = [record for record in cluster.read_accounting() if record["job_id"].split("_")[0] == job_id]
+        return int(any(record["state"] != "COMPLETED" for record in records))
+    return 0
+
+
+def srun(cluster: SimulatedCluster, args: list):
+    short_options = {
+        "-N": "nodes", "-n": "ntasks", "-c": "cpus-per-task", "-w": "nodelist", "-x": "exclude", "-J": "job-name",
+        "-G": "gpus", "-t": "time", "-o": "output", "-e": "error", "-l": "label", "-u": "unbuffered"
+    }
+    flags = {"exact", "overlap", "exclusive", "label", "unbuffered", "quiet", "verbose", "kill-on-bad-exit"}
+    options, command = parse_options(args, short_options, flags)
+    job_id = options.get("jobid") or os.environ.get("SLURM_JOB_ID")
+    if not command:
+        return print_error("srun", "No command given to execute.")
+    if not job_id:
+        return print_error("srun", "The simulator runs steps only within a job, submit a batch script with sbatch.")
+    try:
+        job, step_id, node = cluster.create_step(job_id, options)
+    except SimulatorError as e:
+        return print_error("srun", str(e))
+
+    export = str(options.get("export", "ALL")).split(",")
+    env = dict(os.environ) if "NONE" not in export else {
+        key: value for key, value in os.environ.items() if key.startswith("SLURM") or key == STATE_DIR_VARIABLE
+    }
+    for item in export:
+        key, has_value, value = item.partition("=")
+        if has_value:
+            env[key] = value
+        elif key not in ("ALL", "NONE") and key in os.environ:
+            env[key] = os.environ[key]
+    env.update({
+        "SLURMD_NODENAME": node,
+        "SLURM_STEP_ID": step_id,
+        "SLURM_STEPID": step_id,
+        "SLURM_STEP_NODELIST": node,
+        "SLURM_STEP_NUM_NODES": "1",
+        "SLURM_NODEID": str(job["nodes"].index(node)),
+        "SLURM_LOCALID": "0",
+        "SLURM_PROCID": "0",
+    })
+
+    # the step runs in its own process group, such that time limits and scancel reach all of its processes
+    try:
+        process = subprocess.Popen(command, env=env, start_new_session=True)
+    except OSError as e:
+        cluster.finish_step(job, step_id, 2)
+        return print_error("srun", f"{command[0]}: {e.strerror}")
+    cluster.update_step(job["job_id"], step_id, pgid=process.pid)
+    for sig in [signal.SIGTERM, signal.SIGINT, signal.SIGHUP]:
+        signal.signal(sig, lambda signum, frame: signal_group(process.pid, signum))
+    exit_code = process.wait()
+    cluster.finish_step(job, step_id, exit_code)
+    return exit_code if exit_code >= 0 else 128 - exit_code
+
+
+def render_table(fields: dict, format_string: str, records: list, header: bool):
+    """Formats records like squeue and sinfo, e.g. `%.18i` is right aligned in 18 characters."""
+    def render(record):
+        def replace(match):
+            right, width, letter = match.group(1), match.group(2), match.group(3)
+            name, value = fields.get(letter, (letter.upper(), lambda _: ""))
+            text = name if record is None else str(value(record))
+            if width:
+                text = text[:int(width)]
+                text = text.rjust(int(width)) if right else text.ljust(int(width))
+            return text
+        return re.sub(r"%(\.)?-?(\d+)?([a-zA-Z])", replace, format_string).rstrip()
+
+    lines = [render(None)] if header else []
+    return "\n".join(lines + [render(record) for record in records])
+
+
+def squeue(cluster: SimulatedCluster, args: list):
+    short_options = {
+        "-h": "noheader", "-j": "jobs", "-u": "user", "-t": "states", "-o": "format", "-p": "partition",
+        "-w": "nodelist", "-l": "long", "-a": "all", "-r": "array", "-M": "clusters"
+    }
+    flags = {"noheader", "long", "all", "array", "me", "start"}
+    options, positionals = parse_options(args, short_options, flags, stop_at_positional=False)
+    state = cluster.read_state()
+    now = time.time()
+
+    def elapsed(job):
+        return 0 if job["start_time"] is None else now - job["start_time"]
+
+    def time_left(job):
+        return None if job["time_limit"] is None else job["time_limit"] - elapsed(job)
+
+    fields = {
+        "i": ("JOBID", lambda job: job["job_id"]),
+        "A": ("ARRAY_JOB_ID", lambda job: job.get("array_job_id") or job["job_id"]),
+        "K": ("ARRAY_TASK_ID", lambda job: job.get("array_task_id", "N/A")),
+        "P": ("PARTITION", lambda job: job["partition"]),
+        "j": ("NAME", lambda job: job["name"]),
+        "u": ("USER", lambda job: job["user"]),
+        "T": ("STATE", lambda job: job["state"]),
+        "t": ("ST", lambda job: SHORT_STATES[job["state"]]),
+        "M": ("TIME", lambda job: format_duration(elapsed(job))),
+        "l": ("TIME_LIMIT", lambda job: format_duration(job["time_limit"])),
+        "L": ("TIME_LEFT", lambda job: format_duration(time_left(job))),
+        "D": ("NODES", lambda job: job["num_nodes"]),
+        "C": ("CPUS", lambda job: job["cpus_per_node"] * job["num_nodes"]),
+        "m": ("MIN_MEMORY", lambda job: "0"),
+        "b": ("TRES_PER_NODE", lambda job: f"gres:gpu:{job['gpus_per_node']}" if job["gpus_per_node"] else "N/A"),
+        "N": ("NODELIST", lambda job: ",".join(job["nodes"])),
+        "r": ("REASON", lambda job: job["reason"]),
+        "R": ("NODELIST(REASON)", lambda job: ",".join(job["nodes"]) if job["nodes"] else f"({job['reason']})"),
+        "S": ("START_TIME", lambda job: format_timestamp(job["start_time"])),
+        "V": ("SUBMIT_TIME", lambda job: format_timestamp(job["submit_time"])),
+        "Z": ("WORK_DIR", lambda job: job["work_dir"]),
+    }
+
+    jobs = sorted(state["jobs"].values(), key=lambda job: job["seq"])
+    if options.get("jobs") or positionals:
+        job_ids = ",".join([options.get("jobs") or ""] + positionals).split(",")
+        job_ids = [job_id for job_id in job_ids if job_id]
+        jobs = cluster.matching_jobs(state, job_ids)
+        known = set(state["finished"]) | {job_id.split("_")[0] for job_id in state["finished"]}
+        if not jobs and not any(job_id in known for job_id in job_ids):
+            return print_error("squeue", "Invalid job id specified")
+    if options.get("user"):
+        jobs = [job for job in jobs if job["user"] in options["user"].split(",")]
+    if options.get("me"):
+        jobs = [job for job in jobs if job["user"] == getpass.getuser()]
+    if options.get("states"):
+        states = {value.upper() for value in options["states"].split(",")}
+        jobs = [job for job in jobs if job["state"] in states or SHORT_STATES[job["state"]] in states]
+
+    format_string = options.get("format") or "%.18i %.9P %.8j %.8u %.2t %.10M %.6D %R"
+    output = render_table(fields, format_string, jobs, header=not options.get("noheader"))
+    if output:
+        print(output)
+    return 0
+
+
+def sinfo(cluster: SimulatedCluster, args: list):
+    short_options = {"-h": "noheader", "-o": "format", "-N": "Node", "-p": "partition", "-l": "long", "-s": "summarize"}
+    flags = {"noheader", "Node", "long", "summarize", "all"}
+    options, _ = parse_options(args, short_options, flags, stop_at_positional=False)
+    state = cluster.read_state()
+    free = free_resources(cluster.config["nodes"], state["jobs"].values())
+
+    def node_state(node):
+        name = node["name"]
+        if free[name]["cpus"] == node["cpus"] and len(free[name]["gpus"]) == node["gpus"]:
+            return "idle"
+        return "alloc" if free[name]["cpus"] == 0 or (node["gpus"] and not free[name]["gpus"]) else "mix"
+
+    def cpu_state(node):
+        allocated = node["cpus"] - free[node["name"]]["cpus"]
+        return f"{allocated}/{free[node['name']]['cpus']}/0/{node['cpus']}"
+
+    fields = {
+        "P": ("PARTITION", lambda node: f"{cluster.config['partition']}*"),
+        "a": ("AVAIL", lambda node: "up"),
+        "l": ("TIMELIMIT", lambda node: "infinite"),
+        "D": ("NODES", lambda node: 1),
+        "t": ("STATE", node_state),
+        "T": ("STATE", node_state),
+        "N": ("NODELIST", lambda node: node["name"]),
+        "n": ("HOSTNAMES", lambda node: node["name"]),
+        "G": ("GRES", lambda node: f"gpu:{node['gpus']}" if node["gpus"] else "(null)"),
+        "m": ("MEMORY", lambda node: node.get("memory_mb", 0)),
+        "e": ("FREE_MEM", lambda node: node.get("memory_mb", 0)),
+        "C": ("CPUS(A/I/O/T)", cpu_state),
+        "c": ("CPUS", lambda node: node["cpus"]),
+    }
+    # one line per node, sinfo would merge nodes in the same state
+    format_string = options.get("format") or "%9P %.5a %.10l %.6D %.6t %N"
+    print(render_table(fields, format_string, cluster.config["nodes"], header=not options.get("noheader")))
+    return 0
+
+
+def scancel(cluster: SimulatedCluster, args: list):
+    short_options = {"-u": "user", "-n": "name", "-s": "signal", "-t": "state", "-p": "partition"}
+    options, job_ids = parse_options(args, short_options, {"quiet", "verbose", "batch", "full"},
+                                     stop_at_positional=False)
+    job_ids = [job_id for value in job_ids for job_id in value.split(",") if job_id]
+    if options.get("user") or options.get("name"):
+        state = cluster.read_state()
+        job_ids += [
+            job["job_id"] for job in state["jobs"].values()
+            if job["user"] == options.get("user", job["user"]) and job["name"] == options.get("name", job["name"])
+        ]
+    if not job_ids:
+        return print_error("scancel", "No job identification provided")
+    cluster.cancel(job_ids)
+    return 0
+
+
+def sacct(cluster: SimulatedCluster, args: list):
+    short_options = {
+        "-j": "jobs", "-o": "format", "-n": "noheader", "-P": "parsable2", "-p": "parsable", "-X": "allocations",
+        "-S": "starttime", "-E": "endtime", "-u": "user", "-s": "state", "-a": "allusers", "-b": "brief", "-l": "long"
+    }
+    flags = {"noheader", "parsable", "parsable2", "allocations", "allusers", "brief", "long"}
+    options, _ = parse_options(args, short_options, flags, stop_at_positional=False)
+
+    state = cluster.read_state()
+    now = time.time()
+    records = cluster.read_accounting()
+    for job in sorted(state["jobs"].values(), key=lambda job: job["seq"]):
+        records.append(dict(
+            job, cpus=job["cpus_per_node"] * job["num_nodes"], gpus=job["gpus_per_node"] * job["num_nodes"],
+            exit_code=0, signal=0
+        ))
+    if options.get("jobs"):
+        job_ids = options["jobs"].split(",")
+        records = [
+            record for record in records
+            if record["job_id"].split(".")[0] in job_ids or record["job_id"].split("_")[0] in job_ids
+            or record["job_id"].split(".")[0].split("_")[0] in job_ids
+        ]
+    if options.get("allocations"):
+        records = [record for record in records if "." not in record["job_id"]]
+    if options.get("state"):
+        states = {value.upper() for value in options["state"].split(",")}
+        records = [record for record in records if record["state"] in states]
+
+    def elapsed(record):
+        if record.get("start_time") is None:
+            return 0
+        return (record.get("end_time") or now) - record["start_time"]
+
+    fields = {
+        "jobid": lambda record: record["job_id"],
+        "jobidraw": lambda record: record["job_id"],
+        "jobname": lambda record: record["name"],
+        "partition": lambda record: record["partition"],
+        "account": lambda record: "simulator",
+        "user": lambda record: record["user"],
+        "alloccpus": lambda record: record["cpus"] if record.get("start_time") else 0,
+        "allocnodes": lambda record: record["num_nodes"] if record.get("start_time") else 0,
+        "alloctres": lambda record: f"cpu={record['cpus']},gres/gpu={record['gpus']},node={record['num_nodes']}",
+        "reqcpus": lambda record: record["cpus"],
+        "reqnodes": lambda record: record["num_nodes"],
+        "state": lambda record: record["state"],
+        "exitcode": lambda record: f"{record['exit_code']}:{record['signal']}",
+        "elapsed": lambda record: format_duration(elapsed(record)),
+        "elapsedraw": lambda record: int(elapsed(record)),
+        "timelimit": lambda record: format_duration(record.get("time_limit")),
+        "submit": lambda record: format_timestamp(record.get("submit_time")),
+        "start": lambda record: format_timestamp(record.get("start_time")),
+        "end": lambda record: format_timestamp(record.get("end_time")),
+        "nodelist": lambda record: ",".join(record.get("nodes") or []) or "None assigned",
+        "workdir": lambda record: record.get("work_dir", ""),
+    }
+    names = (options.get("format") or "JobID,JobName,Partition,Account,AllocCPUS,State,ExitCode").split(",")
+    unknown = [name for name in names if name.split("%")[0].lower() not in fields]
+    if unknown:
+        return print_error("sacct", f"Invalid field requested: \"{unknown[0]}\"")
+
+    rows = [[name.split("%")[0] for name in names]] if not options.get("noheader") else []
+    rows += [[str(fields[name.split("%")[0].lower()](record)) for name in names] for record in records]
+    for row in rows:
+        if options.get("parsable2"):
+            print("|".join(row))
+        elif options.get("parsable"):
+            print("|".join(row) + "|")
+        else:
+            print(" ".join(value[:20].rjust(10) for value in row))
+    return 0
+
+
+def scontrol(cluster: SimulatedCluster, args: list):
+    if args[:2] == ["show", "hostnames"]:
+        print("\n".join(expand_nodelist(args[2] if len(args) > 2 else os.environ.get("SLURM_JOB_NODELIST", ""))))
+        return 0
+    if args[:2] == ["show", "job"] and len(args) > 2:
+        state = cluster.read_state()
+        jobs = cluster.matching_jobs(state, [args[2]])
+        if not jobs:
+            return print_error("scontrol", "Invalid job id specified")
+        for job in jobs:
+            values = {
+                "JobId": job["job_id"], "JobName": job["name"], "UserId": job["user"], "JobState": job["state"],
+                "Reason": job["reason"], "Partition": job["partition"], "TimeLimit": format_duration(job["time_limit"]),
+                "SubmitTime": format_timestamp(job["submit_time"]), "StartTime": format_timestamp(job["start_time"]),
+                "NodeList": ",".join(job["nodes"]) or "(null)", "NumNodes": job["num_nodes"],
+                "NumCPUs": job["cpus_per_node"] * job["num_nodes"], "WorkDir": job["work_dir"],
+            }
+            print(" ".join(f"{key}={value}" for key, value in values.items()))
+        return 0
+    return print_error("scontrol", f"The simulator does not support `scontrol {' '.join(args)}`.")
+
+
+COMMANDS = {
+    "sbatch": sbatch, "srun": srun, "squeue": squeue, "sinfo": sinfo, "scancel": scancel, "sacct": sacct,
+    "scontrol": scontrol
+}
+
+
+def main(command: str, args: list, state_dir: str):
+    try:
+        cluster = SimulatedCluster(state_dir)
+    except SimulatorError as e:
+        return print_error(command, str(e))
+    if command == "daemon":
+        cluster.run()
+        return 0
+    return COMMANDS[command](cluster, args)
+
+
+def install_shims(bin_dir: str, state_dir: str):
+    """Writes the SLURM commands of the simulator to `bin_dir`, which is put first on the PATH."""
+    os.makedirs(bin_dir, exist_ok=True)
+    for command in SHIMS:
+        path = os.path.join(bin_dir, command)
+        with open(path, "w") as f:
+            f.write(
+                SHIM.replace("{python}", sys.executable).replace("{command}", command)
+                .replace("{cluster_file}", os.path.abspath(__file__)).replace("{state_dir}", os.path.abspath(state_dir))
+            )
+        os.chmod(path, 0o755)
+    return bin_dir
+
+
+if __name__ == '__main__':
+    # the daemon, started by `ensure_daemon`
+    sys.exit(main(sys.argv[1], [], sys.argv[2]))
@@ -0,0 +1,150 @@
+import json
+import time
+import heapq
+
+import numpy as np
+
+from slurm_utils.simulator.cluster import SimulatorError, job_request, free_resources, fit, parse_array, \
+    parse_time_limit, plan_jobs
+
+
+def load_trace(trace_file: str):
+    """Jobs of a JSONL trace, one job per line.
+
+    A job has its `submit` time and `runtime` in seconds and the `sbatch` options of its resources, e.g.
+    `{"submit": 0, "runtime": 5400, "time": "2:00:00", "nodes": 1, "ntasks-per-node": 4, "gres": "gpu:4"}`.
+    `array` submits a job array whose tasks all take `runtime`.
+    """
+    with open(trace_file, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if len(values) > 0 else 0.0
+
+
+class TraceReplay:
+    """Replays a job mix on simulated nodes in virtual time, with the scheduling of the simulated cluster.
+
+    Time jumps from event to event, submissions and job ends, so hours of a production queue are replayed in
+    seconds. Jobs run for their `runtime`, or until their time limit, which ends them with TIMEOUT.
+    """
+
+    def __init__(self, nodes: list, backfill_depth: int = 100, default_time_limit=None):
+        self.nodes = nodes
+        self.backfill_depth = backfill_depth
+        self.default_time_limit = parse_time_limit(default_time_limit) if default_time_limit is not None else None
+
+        self.jobs = {}
+        self.running = {}
+        self.finished = {}
+        self.records = []
+
+    def submit(self, seq: int, record: dict):
+        request = job_request(record, self.default_time_limit)
+        if fit(dict(request, exclude=[]), free_resources(self.nodes, [])) is None:
+            raise SimulatorError(f"Job {seq} of the trace does not fit on any nodes: {record}")
+        task_ids, array_max = parse_array(record["array"]) if "array" in record else ([None], None)
+        for task_id in task_ids:
+            job_id = str(seq) if task_id is None else f"{seq}_{task_id}"
+            self.jobs[job_id] = dict(
+                request,
+                job_id=job_id,
+                array_job_id=None if task_id is None else str(seq),
+                array_task_id=task_id,
+                array_max=array_max,
+                name=record.get("job-name", "trace"),
+                state="PENDING",
+                reason="None",
+                submit_time=float(record["submit"]),
+                start_time=None,
+                runtime=float(record["runtime"]),
+                dependency=None,
+                seq=[seq, -1 if task_id is None else task_id, seq],
+                alloc={},
+            )
+
+    def finish(self, job: dict, end_time: float):
+        timed_out = job["time_limit"] is not None and job["runtime"] > job["time_limit"]
+        state = "TIMEOUT" if timed_out else "COMPLETED"
+        self.jobs.pop(job["job_id"])
+        self.running.pop(job["job_id"])
+        self.finished[job["job_id"]] = state
+        self.records.append({
+            "job_id": job["job_id"],
+            "state": state,
+            "submit_time": job["submit_time"],
+            "start_time": job["start_time"],
+            "end_time": end_time,
+            "wait_secs": job["start_time"] - job["submit_time"],
+            "cpus": job["cpus_per_node"] * job["num_nodes"],
+            "gpus": job["gpus_per_node"] * job["num_nodes"],
+            "nodes": sorted(job["alloc"]),
+            "backfilled": job["backfilled"],
+        })
+
+    def run(self, trace: list):
+        submissions = sorted(enumerate(trace), key=lambda item: float(item[1]["submit"]))
+        # (end time, tie breaker, job id)
+        ends = []
+        next_submission = 0
+        num_plans = 0
+        while next_submission < len(submissions) or ends:
+            next_submit = float(submissions[next_submission][1]["submit"]) \
+                if next_submission < len(submissions) else float("inf")
+            now = min(next_submit, ends[0][0] if ends else float("inf"))
+
+            while ends and ends[0][0] <= now:
+                end_time, _, job_id = heapq.heappop(ends)
+                self.finish(self.jobs[job_id], end_time)
+            while next_submission < len(submissions) and float(submissions[next_submission][1]["submit"]) <= now:
+                seq, record = submissions[next_submission]
+                self.submit(seq + 1, record)
+                next_submission += 1
+
+            num_plans += 1
+            planned = plan_jobs(
+                now, self.jobs, self.nodes, self.finished, self.backfill_depth, running=list(self.running.values())
+            )
+            for job, alloc, backfilled in planned:
+                job.update(state="RUNNING", start_time=now, alloc=alloc, backfilled=backfilled)
+                self.running[job["job_id"]] = job
+                duration = job["runtime"] if job["time_limit"] is None else min(job["runtime"], job["time_limit"])
+                heapq.heappush(ends, (now + duration, job["seq"], job["job_id"]))
+        return num_plans
+
+    def report(self):
+        if len(self.records) == 0:
+            return {"jobs": 0}
+        waits = np.array([record["wait_secs"] for record in self.records])
+        first_submit = min(record["submit_time"] for record in self.records)
+        makespan = max(record["end_time"] for record in self.records) - first_submit
+
+        total_cpus = sum(node["cpus"] for node in self.nodes)
+        total_gpus = sum(node["gpus"] for node in self.nodes)
+        cpu_secs = sum(record["cpus"] * (record["end_time"] - record["start_time"]) for record in self.records)
+        gpu_secs = sum(record["gpus"] * (record["end_time"] - record["start_time"]) for record in self.records)
+        return {
+            "jobs": len(self.records),
+            "timeouts": sum(record["state"] == "TIMEOUT" for record in self.records),
+            "backfilled": sum(record["backfilled"] for record in self.records),
+            "never_started": len(self.jobs),
+            "makespan_secs": makespan,
+            "wait_mean_secs": float(waits.mean()),
+            "wait_p50_secs": percentile(waits, 50),
+            "wait_p95_secs": percentile(waits, 95),
+            "wait_max_secs": float(waits.max()),
+            "cpu_utilization": cpu_secs / max(total_cpus * makespan, 1e-9),
+            "gpu_utilization": gpu_secs / max(total_gpus * makespan, 1e-9) if total_gpus else 0.0,
+        }
+
+
+def replay_trace(trace: list, nodes: list, backfill_depth: int = 100, default_time_limit=None):
+    """Replays the jobs of a trace, returns the report and the record of every job."""
+    start_time = time.perf_counter()
+    replay = TraceReplay(nodes, backfill_depth=backfill_depth, default_time_limit=default_time_limit)
+    num_plans = replay.run(trace)
+    report = replay.report()
+    report["scheduling_passes"] = num_plans
+    report["replay_secs"] = time.perf_counter() - start_time
+    return report, replay.records
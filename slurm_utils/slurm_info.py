@@ -1,15 +1,53 @@
 import re
+import time
+import threading
 
 import pandas as pd
 
 from slurm_utils.connection import RemoteConnector
 
 
+class SqueueSnapshot:
+    """The parsed output of one `squeue`, with its rows indexed by job id."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.taken_at = time.monotonic()
+        self.jobs = {row["JOBID"]: row for row in df.to_dict("records")} if "JOBID" in df.columns else {}
+
+    def age(self):
+        return time.monotonic() - self.taken_at
+
+
+class SqueueFlight:
+    # an `squeue` in progress, callers arriving meanwhile wait for its snapshot instead of running their own
+    def __init__(self, generation: int):
+        self.generation = generation
+        self.done = threading.Event()
+        self.snapshot = None
+        self.error = None
+
+
 class SLURMInfo:
-    def __init__(self, hostname: str):
+    """Queue and resources of a SLURM cluster, read over SSH.
+
+    `squeue` output is kept as a snapshot for `squeue_ttl` seconds, job lookups within that time use the snapshot
+    instead of asking the cluster again. Callers which need a new snapshot while another thread is reading one share
+    its result, so polling many jobs costs one `squeue` per refresh. Submitting and cancelling through this class
+    invalidates the snapshot, a snapshot which was being read during the invalidation is not kept.
+    """
+
+    def __init__(self, hostname: str, squeue_ttl: float = 10):
         self.connection = RemoteConnector(hostname=hostname)
+        self.squeue_ttl = squeue_ttl
 
-    def squeue(self):
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.in_flight = None
+        # counts invalidations, such that an squeue started before one is not cached
+        self.generation = 0
+
+    def read_squeue(self):
         stout = self.connection.execute(
             f"squeue --format='%.18i %.9P %.20j %.8u %.15T %.15M %.15l %.15D %.30R %C %m %b' "
         )
@@ -19,6 +57,45 @@ class SLURMInfo:
         df = pd.DataFrame(df[1:], columns=df[0])
         return df
 
+    def get_snapshot(self, max_age: float = None):
+        max_age = self.squeue_ttl if max_age is None else max_age
+        with self.lock:
+            if self.snapshot is not None and self.snapshot.age() <= max_age:
+                return self.snapshot
+            flight = self.in_flight
+            is_reader = flight is None
+            if is_reader:
+                flight = self.in_flight = SqueueFlight(self.generation)
+
+        if is_reader:
+            try:
+                flight.snapshot = SqueueSnapshot(self.read_squeue())
+            except Exception as e:
+                flight.error = e
+            with self.lock:
+                if self.in_flight is flight:
+                    self.in_flight = None
+                if flight.snapshot is not None and flight.generation == self.generation:
+                    self.snapshot = flight.snapshot
+            flight.done.set()
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.snapshot
+
+    def squeue(self, max_age: float = None):
+        """The queue of the cluster, at most `max_age` seconds old, `squeue_ttl` by default and 0 for a new one."""
+        return self.get_snapshot(max_age=max_age).df
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+            self.snapshot = None
+            # callers from now on start a new squeue instead of waiting for the outdated one
+            self.in_flight = None
+
     def available_resources(self):
         stout = self.connection.execute("sinfo -o '%G %m %e %C'").split("\n")
         df = [row.split(" ") for row in stout]
@@ -27,22 +104,26 @@ class SLURMInfo:
         return df
 
     def get_job_info(self, job_id: int):
-
-        df = self.squeue()
-        df = df[df["JOBID"] == str(job_id)]
-        if len(df) > 0:
-            return df.iloc[0].to_dict()
+        job_info = self.get_snapshot().jobs.get(str(job_id))
+        if job_info is not None:
+            return dict(job_info)
         else:
             return {
                 "JOBID": job_id,
-                "STATUS": "FINISHED"
+                "STATE": "FINISHED"
             }
 
     def get_status(self, job_id: int):
-        return self.get_job_info(job_id).get("STATUS")
+        # the column of `%T` in the squeue output
+        return self.get_job_info(job_id).get("STATE")
 
-    def scancel(self, job_id: int = None):
+    def sbatch(self, script_file: str, options: str = ""):
+        """Submits a batch script on the cluster and returns its job id."""
+        stout = self.connection.execute(f"sbatch --parsable {options} {script_file}")
+        self.invalidate()
+        return stout.strip().split(";")[0]
 
+    def scancel(self, job_id: int = None):
+        """Cancels the job, the queue is read again by the next lookup instead of right away."""
         self.connection.execute(f"scancel {job_id}")
-
-        return self.squeue()
+        self.invalidate()
@@ -0,0 +1,56 @@
+import json
+
+import pandas as pd
+
+from slurm_utils.execution.main import prepare_array_jobs, gather_array_results
+
+
+def write_config(tmp_path, run_settings=None):
+    config = {
+        "project_name": "project", "experiment_name": "experiment",
+        "data": {"local_data_dir": str(tmp_path), "remote_data_dir": str(tmp_path)},
+        "server_settings": {
+            "hostname": "host",
+            "sbatch_required": {"nodes": 1, "n_tasks_per_node": 2, "cpus-per-task": 1, "gres": "gpu:1"},
+            "host_specific": {"host": {}},
+        },
+        "run_settings": {"objective": "acc", "train_file": "main.py", "hyperparam_algorithm": "grid",
+                         **(run_settings or {})},
+        "parameters": {"a": [1, 2, 3]},
+    }
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps(config))
+    return str(config_file)
+
+
+def finish_array_task(work_dir, run_id, returncode=0):
+    run_dir = work_dir / f"run_{run_id}"
+    a = json.loads((run_dir / "config.json").read_text())["a"]
+    (run_dir / "process_stats.json").write_text(json.dumps({"returncode": returncode, "time_in_secs": 1}))
+    if returncode == 0:
+        (run_dir / "test_metrics.json").write_text(json.dumps({"acc": a / 10}))
+
+
+def test_gather_a_resumed_array_run(tmp_path, monkeypatch):
+    monkeypatch.setenv("SU_STORAGE", str(tmp_path))
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+    config_file = write_config(tmp_path, {"resume": True})
+    arguments = dict(executable="python", work_dir=str(work_dir), data_dir=str(tmp_path), config_file=config_file)
+
+    assert prepare_array_jobs(**arguments) == 3
+    finish_array_task(work_dir, 1)
+    finish_array_task(work_dir, 2)
+    finish_array_task(work_dir, 3, returncode=1)
+    gather_array_results(**arguments)
+
+    # the failed trial is prepared again, the successful ones are not
+    assert prepare_array_jobs(**arguments) == 1
+    run_id = int((work_dir / "array_trials.txt").read_text())
+    finish_array_task(work_dir, run_id)
+    gather_array_results(**arguments)
+
+    results = pd.read_csv(work_dir / "study" / "results.csv")
+    completed = results[results["Status"] == "COMPLETED"]
+    assert sorted(completed["Trial-ID"]) == [1, 2, run_id]
+    assert sorted(completed["acc"]) == [0.1, 0.2, 0.3]
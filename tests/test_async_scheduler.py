@@ -0,0 +1,73 @@
+import json
+import time
+
+import pytest
+
+from slurm_utils.config.load import load_config
+from slurm_utils.config.resources import ResourceConfig
+from slurm_utils.execution.async_scheduler import AsyncLocalJobScheduler
+from slurm_utils.execution.main import create_study
+from slurm_utils.execution.parameters import RunConfig
+
+
+def create_scheduler(tmp_path):
+    config = {
+        "project_name": "project", "experiment_name": "experiment",
+        "data": {"local_data_dir": str(tmp_path), "remote_data_dir": str(tmp_path)},
+        "server_settings": {
+            "hostname": "host",
+            "sbatch_required": {"nodes": 1, "n_tasks_per_node": 2, "cpus-per-task": 1, "gres": "gpu:2"},
+            "host_specific": {"host": {}},
+        },
+        "run_settings": {"objective": "acc", "train_file": "main.py", "hyperparam_algorithm": "grid",
+                         "scheduler": "async", "gpu_packing": True},
+        "parameters": {"a": [1, 2, 3]},
+    }
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps(config))
+    experiment_config = load_config(str(config_file))
+
+    config = RunConfig(experiment_config=experiment_config)
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+    return AsyncLocalJobScheduler(
+        study=create_study(config=config, work_dir=str(work_dir)),
+        config=config,
+        executable="local",
+        work_dir=str(work_dir),
+        data_dir=str(tmp_path),
+        resource_config=ResourceConfig(experiment_config=experiment_config)
+    )
+
+
+def test_failed_launch_releases_its_gpus_and_stops_the_other_trials(tmp_path):
+    scheduler = create_scheduler(tmp_path)
+    prepare_trial = scheduler.prepare_trial
+
+    def fail_second_trial(run_id, trial):
+        if run_id == 2:
+            time.sleep(0.5)
+            raise OSError("disk full")
+        prepare_trial(run_id=run_id, trial=trial)
+
+    scheduler.prepare_trial = fail_second_trial
+    scheduler.create_run_command = lambda run_id: ["sleep", "30"]
+    processes = []
+    register_launch = scheduler.register_launch
+
+    def record_process(run_id, trial, process, file, launch_start_ns):
+        processes.append(process)
+        register_launch(run_id, trial, process, file, launch_start_ns)
+
+    scheduler.register_launch = record_process
+
+    start = time.time()
+    with pytest.raises(OSError, match="disk full"):
+        scheduler.loop_hyperparams()
+
+    assert time.time() - start < 10
+    assert 2 not in scheduler.gpu_allocator.leases
+    assert len(processes) > 0
+    for process in processes:
+        # terminated instead of left running without the scheduler
+        assert process.returncode is not None
@@ -0,0 +1,16 @@
+from slurm_utils.execution.metrics_export import PrometheusExporter
+
+
+def test_render_reports_the_scheduler_loop_iterations(tmp_path):
+    exporter = PrometheusExporter(path=str(tmp_path / "sweep.prom"), labels={"experiment": "exp"})
+    exporter.loop_iteration(0.002)
+    exporter.loop_iteration(0.2)
+    exporter.process_started(launch_secs=0.05)
+
+    lines = exporter.render().splitlines()
+
+    assert "# TYPE su_scheduler_loop_iteration_seconds histogram" in lines
+    assert 'su_scheduler_loop_iteration_seconds_bucket{experiment="exp",le="0.005"} 1' in lines
+    assert 'su_scheduler_loop_iteration_seconds_bucket{experiment="exp",le="+Inf"} 2' in lines
+    assert 'su_scheduler_loop_iteration_seconds_count{experiment="exp"} 2' in lines
+    assert 'su_scheduler_step_seconds_count{experiment="exp",step="launch"} 1' in lines
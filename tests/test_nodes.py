@@ -0,0 +1,60 @@
+import pytest
+
+from slurm_utils.execution.nodes import NodeInventory, expand_nodelist, expand_cpus_per_node
+
+
+def test_expand_nodelist():
+    assert expand_nodelist("gpu[01-03,07],cpu1") == ["gpu01", "gpu02", "gpu03", "gpu07", "cpu1"]
+    assert expand_nodelist("n[08-10]") == ["n08", "n09", "n10"]
+    assert expand_nodelist("node1") == ["node1"]
+
+
+def test_expand_cpus_per_node():
+    assert expand_cpus_per_node("32(x2),16", 3) == [32, 32, 16]
+    assert expand_cpus_per_node("32(x2)", 3) is None
+    assert expand_cpus_per_node("many", 1) is None
+
+
+def test_trials_spread_over_the_nodes():
+    inventory = NodeInventory(["n1", "n2"], gpus_per_node=2, cpus_per_node=[4, 4])
+
+    assert inventory.allocate(1, num_gpus=1, num_cpus=1) == "n1"
+    assert inventory.allocate(2, num_gpus=1, num_cpus=1) == "n2"
+    assert inventory.allocate(3, num_gpus=1, num_cpus=1) == "n1"
+    assert not inventory.can_allocate(num_gpus=2, num_cpus=1)
+
+    assert inventory.release(1) == "n1"
+    assert inventory.release(1) is None
+    assert inventory.node(2) == "n2"
+
+
+def test_excluded_nodes_are_waited_for():
+    inventory = NodeInventory(["n1", "n2"], gpus_per_node=2, cpus_per_node=[4, 4])
+    inventory.allocate(1, num_gpus=2, num_cpus=1)
+    free_node = "n2" if inventory.node(1) == "n1" else "n1"
+
+    assert inventory.can_allocate(num_gpus=1, num_cpus=1)
+    assert not inventory.can_allocate(num_gpus=1, num_cpus=1, excluded=[free_node])
+    with pytest.raises(RuntimeError):
+        inventory.allocate(2, num_gpus=1, num_cpus=1, excluded=[free_node])
+
+    inventory.release(1)
+    assert inventory.allocate(2, num_gpus=1, num_cpus=1, excluded=[free_node]) == inventory.node(2) != free_node
+
+
+def test_excluding_every_node_allows_all_of_them():
+    inventory = NodeInventory(["n1", "n2"], gpus_per_node=2, cpus_per_node=[4, 4])
+    assert inventory.can_allocate(num_gpus=1, num_cpus=1, excluded=["n1", "n2"])
+    assert inventory.allocate(1, num_gpus=1, num_cpus=1, excluded=["n1", "n2"]) in ("n1", "n2")
+
+
+def test_excluded_nodes_are_ignored_if_the_others_are_too_small():
+    inventory = NodeInventory(["big", "small"], gpus_per_node=2, cpus_per_node=[8, 2])
+    assert inventory.allocate(1, num_gpus=1, num_cpus=4, excluded=["big"]) == "big"
+
+
+def test_trials_larger_than_a_node_are_left_to_slurm():
+    inventory = NodeInventory(["n1", "n2"], gpus_per_node=2, cpus_per_node=[4, 4])
+    assert inventory.can_allocate(num_gpus=4, num_cpus=1)
+    assert inventory.allocate(1, num_gpus=4, num_cpus=1) is None
+    assert inventory.node(1) is None
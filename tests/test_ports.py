@@ -0,0 +1,72 @@
+import json
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from slurm_utils.execution.ports import PortLeaseManager
+
+
+def lease_manager(tmp_path, port_range=(27100, 27110)):
+    return PortLeaseManager(lease_file=str(tmp_path / "port_leases.json"), port_range=port_range)
+
+
+def test_leases_are_unique_per_node_across_managers(tmp_path):
+    first, second = lease_manager(tmp_path), lease_manager(tmp_path)
+
+    assert first.lease(1, node="n1") == 27100
+    assert second.lease(1, node="n1") == 27101
+    # other nodes have their own ports
+    assert second.lease(2, node="n2") == 27100
+    assert first.port(1) == 27100
+
+    assert first.release(1) == 27100
+    assert second.lease(3, node="n1") == 27100
+
+
+def test_release_keeps_leases_of_other_owners(tmp_path):
+    manager = lease_manager(tmp_path)
+    manager.lease(1, node="n1")
+    with manager.locked_leases() as leases:
+        leases["n1:27100"]["owner"] = "other:1"
+
+    manager.release(1)
+
+    leases = json.loads((tmp_path / "port_leases.json").read_text())
+    assert "n1:27100" in leases
+
+
+def test_stale_leases_are_dropped(tmp_path):
+    manager = lease_manager(tmp_path)
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    with manager.locked_leases() as leases:
+        # a dead scheduler on this host, and an old lease of another host
+        leases["n1:27100"] = {"owner": f"{manager.hostname}:{process.pid}", "run_id": 1, "time": time.time()}
+        leases["n1:27101"] = {"owner": "other:1", "run_id": 1, "time": time.time() - 30 * 24 * 3600}
+        leases["n1:27102"] = {"owner": "other:1", "run_id": 2, "time": time.time()}
+
+    assert manager.lease(1, node="n1") == 27100
+    assert manager.lease(2, node="n1") == 27101
+    assert manager.lease(3, node="n1") == 27103
+
+
+def test_ports_in_use_on_the_scheduler_node_are_skipped(tmp_path):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("", 0))
+        s.listen()
+        port = s.getsockname()[1]
+        manager = lease_manager(tmp_path, port_range=(port, port + 2))
+
+        assert manager.lease(1) == port + 1
+        # the scheduler cannot check the ports of other nodes
+        assert manager.lease(2, node="n1") == port
+
+
+def test_exhausted_port_range_raises(tmp_path):
+    manager = lease_manager(tmp_path, port_range=(27100, 27101))
+    manager.lease(1, node="n1")
+    with pytest.raises(RuntimeError):
+        manager.lease(2, node="n1")
@@ -0,0 +1,56 @@
+import os
+import time
+
+import numpy as np
+
+from slurm_utils.execution.result_cache import ResultCache
+
+
+def result_cache(tmp_path, code_version="sha256:abc", **kwargs):
+    return ResultCache(cache_dir=str(tmp_path / "results"), code_version=code_version, **kwargs)
+
+
+def test_key_covers_parameters_data_and_code(tmp_path):
+    cache = result_cache(tmp_path)
+    key = cache.key({"lr": 0.1, "layers": 2, "seed": 7}, parameter_names=["lr", "layers"], data_dir="/data/a")
+
+    # the order of the names and numpy values of a grid do not matter, values which are no parameters are ignored
+    assert cache.key({"layers": np.int64(2), "lr": np.float64(0.1)}, ["layers", "lr"], "/data/a") == key
+    assert cache.key({"lr": 0.1, "layers": 2}, ["lr", "layers"], "/data/a/") == key
+
+    assert cache.key({"lr": 0.2, "layers": 2}, ["lr", "layers"], "/data/a") != key
+    assert cache.key({"lr": 0.1, "layers": 2}, ["lr", "layers"], "/data/b") != key
+    other_code = result_cache(tmp_path, code_version="sha256:def")
+    assert other_code.key({"lr": 0.1, "layers": 2}, ["lr", "layers"], "/data/a") != key
+
+
+def test_lookup_needs_the_objective(tmp_path):
+    cache = result_cache(tmp_path)
+    key = cache.key({"lr": 0.1}, ["lr"], "/data")
+    assert cache.lookup(key, "acc") is None
+
+    cache.store(key, test_metrics={"loss": 0.3}, source="/work/run_1", time_in_secs=5)
+    assert cache.lookup(key, "acc") is None
+
+    cache.store(key, test_metrics={"acc": 0.9}, source="/work/run_2", time_in_secs=5)
+    entry = cache.lookup(key, "acc")
+    assert entry["test_metrics"] == {"acc": 0.9}
+    assert entry["source"] == "/work/run_2"
+    assert cache.report()["misses"] == 2
+
+
+def test_evict_removes_old_and_least_recently_used_entries(tmp_path):
+    cache = result_cache(tmp_path, max_entries=2, max_age_days=1)
+    keys = [cache.key({"lr": lr}, ["lr"], "/data") for lr in [0.1, 0.2, 0.3, 0.4]]
+    now = time.time()
+    for age_secs, key in zip([2 * 24 * 3600, 300, 200, 100], keys):
+        cache.store(key, test_metrics={"acc": 0.5}, source="/work", time_in_secs=1)
+        os.utime(cache.entry_path(key), (now - age_secs, now - age_secs))
+    # using an entry makes it the most recently used one
+    assert cache.lookup(keys[1], "acc") is not None
+
+    cache.evict()
+
+    kept = [key for key in keys if os.path.exists(cache.entry_path(key))]
+    assert kept == [keys[1], keys[3]]
+    assert cache.report()["evicted"] == 2
@@ -0,0 +1,92 @@
+import json
+
+import numpy as np
+from sherpa import Trial
+
+from slurm_utils.execution.resume import read_study_log, read_run_dir, load_completed_trials, ResumeState
+
+
+def write_log(study_dir, entries, tail=""):
+    with open(study_dir / "observations.jsonl", "w") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+        f.write(tail)
+
+
+def write_run_dir(work_dir, run_id, parameters, returncode=0, metrics=None):
+    run_dir = work_dir / f"run_{run_id}"
+    run_dir.mkdir()
+    (run_dir / "config.json").write_text(json.dumps(parameters))
+    (run_dir / "process_stats.json").write_text(json.dumps({"returncode": returncode, "time_in_secs": 1}))
+    if metrics is not None:
+        (run_dir / "test_metrics.json").write_text(json.dumps(metrics))
+    return run_dir
+
+
+def observation(trial_id, objective, context=None):
+    return {"event": "observation", "trial_id": trial_id, "parameters": {"x": trial_id}, "objective": objective,
+            "context": context or {}}
+
+
+def test_read_study_log_keeps_completed_and_stopped_trials(tmp_path):
+    write_log(tmp_path, [
+        observation(1, 0.5), {"event": "finalize", "trial_id": 1, "status": "COMPLETED"},
+        observation(2, 0.0, {"error": 3}), {"event": "finalize", "trial_id": 2, "status": "COMPLETED"},
+        observation(3, 0.2), {"event": "finalize", "trial_id": 3, "status": "STOPPED"},
+        # not finalized, e.g. running when the allocation ended
+        observation(4, 0.9),
+    ], tail='{"event": "finalize", "trial_')
+
+    completed = read_study_log(str(tmp_path))
+
+    assert sorted(completed) == [1, 3]
+    assert completed[1]["objective"] == 0.5
+    assert completed[3]["status"] == "STOPPED"
+
+
+def test_read_study_log_applies_discarded_observations(tmp_path):
+    write_log(tmp_path, [
+        observation(1, 100.0), {"event": "discard", "trial_id": 1},
+        {"event": "finalize", "trial_id": 1, "status": "COMPLETED"},
+    ])
+    assert read_study_log(str(tmp_path)) == {}
+
+
+def test_read_run_dir(tmp_path):
+    run_dir = write_run_dir(tmp_path, 1, {"x": 1}, metrics={"acc": 0.7, "loss": 0.1})
+    assert read_run_dir(str(run_dir), "acc") == {"parameters": {"x": 1}, "objective": 0.7, "context": {"acc": 0.7, "loss": 0.1}}
+
+    run_dir = write_run_dir(tmp_path, 2, {"x": 2})
+    assert read_run_dir(str(run_dir), "acc")["context"] == {"help": "No metrics provided"}
+
+    run_dir = write_run_dir(tmp_path, 3, {"x": 3}, returncode=1, metrics={"acc": 0.7})
+    assert read_run_dir(str(run_dir), "acc") is None
+
+
+def test_load_completed_trials_prefers_the_study_log(tmp_path):
+    study_dir = tmp_path / "study"
+    study_dir.mkdir()
+    write_log(study_dir, [observation(1, 0.5), {"event": "finalize", "trial_id": 1, "status": "COMPLETED"}])
+    write_run_dir(tmp_path, 1, {"x": 1}, metrics={"acc": 0.1})
+    write_run_dir(tmp_path, 2, {"x": 2}, metrics={"acc": 0.2})
+    write_run_dir(tmp_path, 7, {"x": 7}, returncode=1)
+
+    completed, max_run_id = load_completed_trials(str(tmp_path), str(study_dir), "acc")
+
+    assert sorted(completed) == [1, 2]
+    assert completed[1]["objective"] == 0.5
+    assert completed[2]["objective"] == 0.2
+    # failed trials are run again, but their run directory is not reused
+    assert max_run_id == 7
+
+
+def test_resume_state_skips_each_completed_configuration_once():
+    completed = {1: {"parameters": {"x": 1, "y": "a"}}, 2: {"parameters": {"x": 1, "y": "a"}}}
+    state = ResumeState(completed, parameter_names=["x", "y"])
+
+    assert len(state) == 2
+    # numpy values of a grid match the plain values read from json
+    assert state.is_completed(Trial(id=5, parameters={"x": np.int64(1), "y": "a"}))
+    assert state.is_completed(Trial(id=6, parameters={"x": 1, "y": "a"}))
+    assert not state.is_completed(Trial(id=7, parameters={"x": 1, "y": "a"}))
+    assert not state.is_completed(Trial(id=8, parameters={"x": 2, "y": "a"}))
@@ -0,0 +1,126 @@
+import json
+
+import pytest
+from sherpa import Trial
+
+from slurm_utils.config.load import load_config
+from slurm_utils.config.resources import ResourceConfig
+from slurm_utils.execution.main import create_study
+from slurm_utils.execution.parameters import RunConfig
+from slurm_utils.execution.retries import TrialRetries, read_log_tail
+from slurm_utils.execution.server_scheduler import SlurmJobScheduler
+
+
+def write_log(tmp_path, text):
+    log_file = tmp_path / "output.out"
+    log_file.write_text(text)
+    return str(log_file)
+
+
+def test_every_failure_is_retryable_by_default(tmp_path):
+    retries = TrialRetries(max_attempts=3)
+    assert retries.is_retryable(1, write_log(tmp_path, ""))
+
+
+def test_retryable_by_returncode_or_log_pattern(tmp_path):
+    retries = TrialRetries(max_attempts=3, returncodes=[137], log_patterns=["NCCL error"])
+    assert retries.is_retryable(137, write_log(tmp_path, ""))
+    assert retries.is_retryable(1, write_log(tmp_path, "...\nNCCL error: unhandled system error\n"))
+    assert not retries.is_retryable(1, write_log(tmp_path, "ValueError\n"))
+
+
+def test_read_log_tail_reads_the_end_of_large_logs(tmp_path):
+    log_file = write_log(tmp_path, "x" * 100 + "end")
+    assert read_log_tail(log_file, num_bytes=10) == "xxxxxxxend"
+    assert read_log_tail(str(tmp_path / "missing.out")) == ""
+
+
+def test_backoff_grows_until_max_attempts(tmp_path):
+    retries = TrialRetries(max_attempts=3, backoff_secs=10, backoff_factor=3, max_backoff_secs=20)
+    trial = Trial(id=1, parameters={})
+    log_file = write_log(tmp_path, "")
+
+    assert retries.attempt(trial.id) == 1
+    assert retries.retry(trial, returncode=1, log_file=log_file) == 10
+    assert retries.attempt(trial.id) == 2
+    assert retries.retry(trial, returncode=1, log_file=log_file) == 20
+    assert retries.retry(trial, returncode=1, log_file=log_file) is None
+    assert retries.attempt(trial.id) == 3
+
+
+def test_failed_nodes_are_excluded(tmp_path):
+    log_file = write_log(tmp_path, "")
+    retries = TrialRetries(max_attempts=3, backoff_secs=0, exclude_failed_nodes=True)
+    trial = Trial(id=1, parameters={})
+    retries.retry(trial, returncode=1, log_file=log_file, node="n2")
+    retries.retry(trial, returncode=1, log_file=log_file, node="n1")
+    assert retries.excluded_nodes(trial.id) == ["n1", "n2"]
+
+    retries = TrialRetries(max_attempts=3, backoff_secs=0)
+    retries.retry(trial, returncode=1, log_file=log_file, node="n2")
+    assert retries.excluded_nodes(trial.id) == []
+
+
+def test_pending_retries(tmp_path):
+    log_file = write_log(tmp_path, "")
+    retries = TrialRetries(max_attempts=2, backoff_secs=0)
+    retries.retry(Trial(id=1, parameters={}), returncode=1, log_file=log_file)
+    retries.retry(Trial(id=2, parameters={}), returncode=1, log_file=log_file)
+    assert retries.num_pending == 2
+    assert retries.secs_until_ready() == 0
+
+    assert [trial.id for trial in retries.pop_ready(max_trials=1)] == [1]
+    assert retries.claim(2) == pytest.approx(0, abs=1)
+    assert retries.claim(2) is None
+    assert retries.num_pending == 0
+    assert retries.secs_until_ready() is None
+
+
+def create_slurm_scheduler(tmp_path, nodes: int):
+    config = {
+        "project_name": "project", "experiment_name": "experiment",
+        "data": {"local_data_dir": str(tmp_path), "remote_data_dir": str(tmp_path)},
+        "server_settings": {
+            "hostname": "host",
+            "sbatch_required": {"nodes": nodes, "n_tasks_per_node": 2, "cpus-per-task": 1, "gres": "gpu:2"},
+            "host_specific": {"host": {}},
+        },
+        "run_settings": {"objective": "acc", "train_file": "main.py", "hyperparam_algorithm": "grid",
+                         "max_attempts": 3, "retry_exclude_nodes": True, "node_placement": False},
+        "parameters": {"a": [1, 2]},
+    }
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps(config))
+    experiment_config = load_config(str(config_file))
+
+    config = RunConfig(experiment_config=experiment_config)
+    return SlurmJobScheduler(
+        study=create_study(config=config, work_dir=str(tmp_path)),
+        config=config,
+        executable="srun",
+        work_dir=str(tmp_path),
+        data_dir=str(tmp_path),
+        resource_config=ResourceConfig(experiment_config=experiment_config)
+    )
+
+
+def test_retries_exclude_failed_nodes_while_the_allocation_has_another_node(tmp_path, monkeypatch):
+    monkeypatch.setenv("SLURM_JOB_NODELIST", "node[1-2]")
+    scheduler = create_slurm_scheduler(tmp_path, nodes=2)
+    log_file = write_log(tmp_path, "")
+    trial = Trial(id=1, parameters={"a": 1})
+
+    scheduler.retries.retry(trial, returncode=1, log_file=log_file, node="node1")
+    assert "--exclude=node1" in scheduler.create_run_command(trial.id)
+
+    # with every node excluded, the trial runs anywhere instead of never
+    scheduler.retries.retry(trial, returncode=1, log_file=log_file, node="node2")
+    assert not any(option.startswith("--exclude") for option in scheduler.create_run_command(trial.id))
+
+
+def test_single_node_allocations_ignore_retry_exclude_nodes(tmp_path, monkeypatch, caplog):
+    monkeypatch.setenv("SLURM_JOB_NODELIST", "node1")
+    scheduler = create_slurm_scheduler(tmp_path, nodes=1)
+
+    assert not scheduler.retries.exclude_failed_nodes
+    assert "Retries can only avoid failed nodes" in caplog.text
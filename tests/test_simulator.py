@@ -0,0 +1,88 @@
+from slurm_utils.simulator.cluster import job_request, parse_array, parse_time_limit, plan_jobs, simulated_nodes
+from slurm_utils.simulator.replay import replay_trace
+
+
+def by_job_id(records):
+    return {record["job_id"]: record for record in records}
+
+
+def test_parse_time_limit_and_array():
+    assert parse_time_limit("90") == 5400
+    assert parse_time_limit("1:30") == 90
+    assert parse_time_limit("2:00:00") == 7200
+    assert parse_time_limit("1-12") == 36 * 3600
+    assert parse_time_limit("UNLIMITED") is None
+
+    assert parse_array("0-9%2") == (list(range(10)), 2)
+    assert parse_array("1,3,5") == ([1, 3, 5], None)
+    assert parse_array("0-10:5") == ([0, 5, 10], None)
+
+
+def test_backfill_only_starts_jobs_which_do_not_delay_the_reservation():
+    trace = [
+        {"submit": 0, "runtime": 100, "time": 100, "gres": "gpu:2"},
+        # needs the whole node, it gets a reservation at 100 when the first job ends at the latest
+        {"submit": 1, "runtime": 10, "time": 100, "gres": "gpu:4"},
+        # ends before the reservation
+        {"submit": 2, "runtime": 50, "time": 50, "gres": "gpu:2"},
+        # would run past the reservation on the reserved node
+        {"submit": 3, "runtime": 50, "time": 200, "gres": "gpu:2"},
+    ]
+    report, records = replay_trace(trace, simulated_nodes(1, cpus_per_node=8, gpus_per_node=4))
+    records = by_job_id(records)
+
+    assert [records[job_id]["start_time"] for job_id in "1234"] == [0, 100, 2, 110]
+    assert [records[job_id]["backfilled"] for job_id in "1234"] == [False, False, True, False]
+    assert report["backfilled"] == 1
+    assert report["makespan_secs"] == 160
+
+
+def test_jobs_are_killed_at_their_time_limit():
+    trace = [
+        {"submit": 0, "runtime": 100, "time": 60},
+        {"submit": 0, "runtime": 100},
+    ]
+    report, records = replay_trace(trace, simulated_nodes(1, cpus_per_node=2, gpus_per_node=0), default_time_limit=80)
+    records = by_job_id(records)
+
+    assert (records["1"]["state"], records["1"]["end_time"]) == ("TIMEOUT", 60)
+    assert (records["2"]["state"], records["2"]["end_time"]) == ("TIMEOUT", 80)
+    assert report["timeouts"] == 2
+
+
+def test_array_tasks_respect_the_concurrency_limit():
+    trace = [{"submit": 0, "runtime": 10, "time": 10, "array": "0-4%2"}]
+    report, records = replay_trace(trace, simulated_nodes(2, cpus_per_node=4, gpus_per_node=0))
+    records = by_job_id(records)
+
+    assert [records[f"1_{task_id}"]["start_time"] for task_id in range(5)] == [0, 0, 10, 10, 20]
+    assert all(record["state"] == "COMPLETED" for record in records.values())
+    assert report["makespan_secs"] == 30
+
+
+def pending_job(job_id, seq, dependency=None):
+    return dict(
+        job_request({"time": 10}),
+        job_id=job_id, array_job_id=None, array_task_id=None, array_max=None, state="PENDING", reason="None",
+        submit_time=0, start_time=None, dependency=dependency, seq=[seq, -1, seq], alloc={},
+    )
+
+
+def test_dependent_jobs_are_released_when_their_dependency_finished():
+    nodes = simulated_nodes(1, cpus_per_node=4, gpus_per_node=0)
+    first = pending_job("1", 1)
+    after_ok = pending_job("2", 2, dependency="afterok:1")
+    after_not_ok = pending_job("3", 3, dependency="afternotok:1")
+    jobs = {"1": first, "2": after_ok, "3": after_not_ok}
+
+    assert [job["job_id"] for job, _, _ in plan_jobs(0, jobs, nodes, finished={})] == ["1"]
+    assert (after_ok["reason"], after_not_ok["reason"]) == ("Dependency", "Dependency")
+
+    first.update(state="RUNNING", start_time=0, alloc={"node1": {"cpus": 1, "gpus": []}})
+    assert plan_jobs(5, jobs, nodes, finished={}) == []
+
+    # finished jobs leave the queue, their final state is kept
+    jobs.pop("1")
+    started = plan_jobs(10, jobs, nodes, finished={"1": "COMPLETED"})
+    assert [job["job_id"] for job, _, _ in started] == ["2"]
+    assert after_not_ok["reason"] == "DependencyNeverSatisfied"
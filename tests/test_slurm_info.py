@@ -0,0 +1,108 @@
+import threading
+
+from slurm_utils.slurm_info import SLURMInfo
+
+
+SQUEUE_OUTPUT = """JOBID PARTITION NAME USER STATE TIME TIME_LIMIT NODES NODELIST(REASON) CPUS MIN_MEMORY TRES_PER_NODE
+101 gpu train alice RUNNING 1:00 2:00:00 1 node1 8 16G gpu:4
+102 gpu train alice PENDING 0:00 2:00:00 1 (Resources) 8 16G gpu:4"""
+
+
+class StubConnection:
+    """Answers the commands of SLURMInfo like a cluster would, optionally blocking squeue until released."""
+
+    def __init__(self, block=False):
+        self.commands = []
+        self.squeue_started = threading.Event()
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+
+    def execute(self, cmd: str):
+        self.commands.append(cmd)
+        if cmd.startswith("squeue"):
+            self.squeue_started.set()
+            self.release.wait(timeout=10)
+            return SQUEUE_OUTPUT
+        if cmd.startswith("sbatch"):
+            return "103"
+        return ""
+
+    def num_squeues(self):
+        return sum(cmd.startswith("squeue") for cmd in self.commands)
+
+
+def slurm_info(connection, squeue_ttl=10):
+    info = SLURMInfo(hostname="cluster", squeue_ttl=squeue_ttl)
+    info.connection = connection
+    return info
+
+
+def test_lookups_within_the_ttl_share_one_squeue():
+    connection = StubConnection()
+    info = slurm_info(connection)
+
+    assert info.get_status(101) == "RUNNING"
+    assert info.get_status(102) == "PENDING"
+    assert info.get_status(999) == "FINISHED"
+    assert connection.num_squeues() == 1
+
+    # the snapshot is read again once it is older than the ttl
+    info.snapshot.taken_at -= 11
+    assert info.get_status(101) == "RUNNING"
+    assert connection.num_squeues() == 2
+
+
+def test_max_age_zero_always_reads_the_queue():
+    connection = StubConnection()
+    info = slurm_info(connection)
+
+    assert len(info.squeue(max_age=0)) == 2
+    assert len(info.squeue(max_age=0)) == 2
+    assert connection.num_squeues() == 2
+
+
+def test_submitting_and_cancelling_invalidate_without_reading_the_queue():
+    connection = StubConnection()
+    info = slurm_info(connection)
+    info.squeue()
+
+    assert info.sbatch("job.sh") == "103"
+    info.scancel(101)
+    assert connection.num_squeues() == 1
+
+    info.get_status(101)
+    assert connection.num_squeues() == 2
+
+
+def test_concurrent_lookups_wait_for_one_squeue():
+    connection = StubConnection(block=True)
+    info = slurm_info(connection)
+    statuses = []
+    threads = [threading.Thread(target=lambda: statuses.append(info.get_status(101))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+
+    assert connection.squeue_started.wait(timeout=10)
+    connection.release.set()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert statuses == ["RUNNING"] * 8
+    assert connection.num_squeues() == 1
+
+
+def test_a_snapshot_read_during_an_invalidation_is_not_kept():
+    connection = StubConnection(block=True)
+    info = slurm_info(connection)
+    reader = threading.Thread(target=info.squeue)
+    reader.start()
+
+    assert connection.squeue_started.wait(timeout=10)
+    info.invalidate()
+    connection.release.set()
+    reader.join(timeout=10)
+
+    assert info.snapshot is None
+    info.squeue()
+    assert connection.num_squeues() == 2
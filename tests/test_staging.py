@@ -0,0 +1,75 @@
+import json
+import os
+
+from slurm_utils.execution.staging import DataStager, list_files
+
+
+def make_source(tmp_path):
+    source = tmp_path / "data"
+    (source / "sub").mkdir(parents=True)
+    (source / "a.txt").write_text("a")
+    (source / "sub" / "b.txt").write_text("b")
+    return source
+
+
+def read_manifest(stager):
+    with open(stager.manifest_file, "r") as f:
+        return json.load(f)
+
+
+def test_stage_copies_the_data_and_writes_a_manifest(tmp_path, monkeypatch):
+    monkeypatch.setenv("SLURM_JOB_ID", "1")
+    source = make_source(tmp_path)
+    stager = DataStager(str(source), staging_root=str(tmp_path / "local"))
+
+    path = stager.stage()
+
+    assert path == stager.target
+    assert open(os.path.join(path, "sub", "b.txt")).read() == "b"
+    manifest = read_manifest(stager)
+    assert manifest["job_id"] == "1"
+    assert manifest["files"] == list_files(str(source))
+
+
+def test_later_trials_of_the_job_do_not_list_the_source(tmp_path, monkeypatch):
+    monkeypatch.setenv("SLURM_JOB_ID", "1")
+    source = make_source(tmp_path)
+    DataStager(str(source), staging_root=str(tmp_path / "local")).stage()
+    (source / "c.txt").write_text("c")
+
+    path = DataStager(str(source), staging_root=str(tmp_path / "local")).stage()
+
+    assert not os.path.exists(os.path.join(path, "c.txt"))
+
+
+def test_a_new_job_copies_changed_files_and_removes_deleted_ones(tmp_path, monkeypatch):
+    source = make_source(tmp_path)
+    monkeypatch.setenv("SLURM_JOB_ID", "1")
+    DataStager(str(source), staging_root=str(tmp_path / "local")).stage()
+
+    (source / "a.txt").write_text("changed")
+    os.remove(source / "sub" / "b.txt")
+    (source / "c.txt").write_text("c")
+    monkeypatch.setenv("SLURM_JOB_ID", "2")
+    stager = DataStager(str(source), staging_root=str(tmp_path / "local"))
+    path = stager.stage()
+
+    assert open(os.path.join(path, "a.txt")).read() == "changed"
+    assert open(os.path.join(path, "c.txt")).read() == "c"
+    assert not os.path.exists(os.path.join(path, "sub", "b.txt"))
+    assert set(read_manifest(stager)["files"]) == {"a.txt", "c.txt"}
+
+
+def test_single_files_and_missing_sources(tmp_path):
+    source = make_source(tmp_path)
+    stager = DataStager(str(source / "a.txt"), staging_root=str(tmp_path / "local"))
+    assert open(stager.stage()).read() == "a"
+
+    missing = str(tmp_path / "missing")
+    assert DataStager(missing, staging_root=str(tmp_path / "local")).stage() == missing
+
+
+def test_data_directories_with_the_same_name_do_not_collide(tmp_path):
+    first = DataStager(str(tmp_path / "x" / "data"), staging_root=str(tmp_path / "local"))
+    second = DataStager(str(tmp_path / "y" / "data"), staging_root=str(tmp_path / "local"))
+    assert first.target != second.target
@@ -0,0 +1,70 @@
+import json
+
+import pandas as pd
+from sherpa import Trial
+
+from slurm_utils.execution.step_metrics import StepMetricsReader
+from slurm_utils.execution.stopping import SuccessiveHalvingStoppingRule
+
+
+def append(run_dir, text):
+    with open(run_dir / StepMetricsReader.file_name, "a") as f:
+        f.write(text)
+
+
+def test_reader_returns_new_complete_lines(tmp_path):
+    reader = StepMetricsReader()
+    assert reader.read(1, str(tmp_path)) == []
+
+    append(tmp_path, json.dumps({"step": 1, "acc": 0.1}) + "\n" + '{"step": 2, "a')
+    assert reader.read(1, str(tmp_path)) == [{"step": 1, "acc": 0.1}]
+    # the second line is not complete yet
+    assert reader.read(1, str(tmp_path)) == []
+
+    append(tmp_path, 'cc": 0.2}\nnot json\n')
+    assert reader.read(1, str(tmp_path)) == [{"step": 2, "acc": 0.2}]
+
+
+def test_forget_reads_the_file_from_the_start(tmp_path):
+    reader = StepMetricsReader()
+    append(tmp_path, json.dumps({"step": 1}) + "\n")
+    reader.read(1, str(tmp_path))
+    reader.forget(1)
+    assert reader.read(1, str(tmp_path)) == [{"step": 1}]
+
+
+def results(curves: dict, finalized=()):
+    rows = []
+    for trial_id, objectives in curves.items():
+        for iteration, objective in enumerate(objectives, start=1):
+            rows.append({"Trial-ID": trial_id, "Status": "INTERMEDIATE", "Iteration": iteration, "Objective": objective})
+        if trial_id in finalized:
+            rows.append({"Trial-ID": trial_id, "Status": "COMPLETED", "Iteration": len(objectives),
+                         "Objective": max(objectives)})
+    return pd.DataFrame(rows)
+
+
+def test_successive_halving_keeps_the_best_trials_of_a_rung():
+    rule = SuccessiveHalvingStoppingRule(min_iterations=1, reduction_factor=3, min_trials=3)
+    curves = {1: [0.9, 0.9, 0.9], 2: [0.5, 0.5, 0.5], 3: [0.1, 0.1, 0.1]}
+    df = results(curves, finalized=(1,))
+
+    assert not rule.should_trial_stop(Trial(id=1, parameters={}), df, lower_is_better=False)
+    assert rule.should_trial_stop(Trial(id=2, parameters={}), df, lower_is_better=False)
+    assert rule.should_trial_stop(Trial(id=3, parameters={}), df, lower_is_better=False)
+    assert not rule.should_trial_stop(Trial(id=3, parameters={}), df, lower_is_better=True)
+
+
+def test_successive_halving_waits_for_enough_trials():
+    rule = SuccessiveHalvingStoppingRule(min_iterations=2, reduction_factor=3, min_trials=3)
+    df = results({1: [0.9, 0.9], 2: [0.1, 0.1], 3: [0.5]})
+
+    # trial 3 did not reach the first rung, only two trials are compared there
+    assert not rule.should_trial_stop(Trial(id=2, parameters={}), df, lower_is_better=False)
+    assert not rule.should_trial_stop(Trial(id=3, parameters={}), df, lower_is_better=False)
+    assert not rule.should_trial_stop(Trial(id=1, parameters={}), pd.DataFrame(), lower_is_better=False)
+
+
+def test_rung_iterations():
+    rule = SuccessiveHalvingStoppingRule(min_iterations=2, reduction_factor=3)
+    assert [rule.rung_iteration(iteration) for iteration in (2, 5, 6, 17, 18)] == [2, 2, 6, 6, 18]
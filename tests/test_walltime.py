@@ -0,0 +1,83 @@
+import json
+import time
+
+import pytest
+
+from slurm_utils.config.load import load_config
+from slurm_utils.config.resources import ResourceConfig
+from slurm_utils.execution.async_scheduler import AsyncLocalJobScheduler
+from slurm_utils.execution.local_scheduler import LocalJobScheduler
+from slurm_utils.execution.main import create_study
+from slurm_utils.execution.parameters import RunConfig
+from slurm_utils.execution.walltime import parse_slurm_time, RuntimeEstimator
+
+
+def create_scheduler(tmp_path, scheduler_class, algorithm):
+    config = {
+        "project_name": "project", "experiment_name": "experiment",
+        "data": {"local_data_dir": str(tmp_path), "remote_data_dir": str(tmp_path)},
+        "server_settings": {
+            "hostname": "host",
+            "sbatch_required": {"nodes": 1, "n_tasks_per_node": 1, "cpus-per-task": 1, "gres": "gpu:1"},
+            "host_specific": {"host": {}},
+        },
+        "run_settings": {"objective": "acc", "train_file": "main.py", "hyperparam_algorithm": algorithm,
+                         "hyperparameter_params": {"max_num_trials": 5}, "expected_trial_secs": 3600},
+        "parameters": {"a": [1, 2, 3, 4, 5]},
+    }
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps(config))
+    experiment_config = load_config(str(config_file))
+
+    config = RunConfig(experiment_config=experiment_config)
+    return scheduler_class(
+        study=create_study(config=config, work_dir=str(tmp_path)),
+        config=config,
+        executable="local",
+        work_dir=str(tmp_path),
+        data_dir=str(tmp_path),
+        resource_config=ResourceConfig(experiment_config=experiment_config)
+    )
+
+
+def test_parse_slurm_time():
+    assert parse_slurm_time("1-02:03:04") == 93784
+    assert parse_slurm_time("02:03:04") == 7384
+    assert parse_slurm_time("03:04") == 184
+    assert parse_slurm_time("UNLIMITED") is None
+
+
+def test_runtime_estimator_uses_the_default_until_enough_trials_finished():
+    estimator = RuntimeEstimator(quantile=0.5, min_samples=3, default_secs=100)
+    estimator.observe(10)
+    estimator.observe(20)
+    assert estimator.estimate() == 100
+
+    estimator.observe(None)
+    estimator.observe(30)
+    assert estimator.estimate() == 20
+
+
+@pytest.mark.parametrize("scheduler_class", [LocalJobScheduler, AsyncLocalJobScheduler])
+def test_closed_admission_defers_all_remaining_trials(tmp_path, monkeypatch, scheduler_class):
+    # the allocation ends before the first trial is expected to finish
+    monkeypatch.setenv("SLURM_JOB_END_TIME", str(int(time.time()) + 600))
+    scheduler = create_scheduler(tmp_path, scheduler_class, algorithm="random")
+
+    scheduler.loop_hyperparams()
+
+    deferred = json.loads((tmp_path / "deferred_trials.json").read_text())
+    assert sorted(trial["trial_id"] for trial in deferred) == [1, 2, 3, 4, 5]
+    # nothing was started
+    assert list(tmp_path.glob("run_*/output.out")) == []
+
+
+def test_grid_search_only_defers_the_rejected_trial(tmp_path, monkeypatch):
+    # a resumed grid search suggests its remaining points again
+    monkeypatch.setenv("SLURM_JOB_END_TIME", str(int(time.time()) + 600))
+    scheduler = create_scheduler(tmp_path, LocalJobScheduler, algorithm="grid")
+
+    scheduler.loop_hyperparams()
+
+    deferred = json.loads((tmp_path / "deferred_trials.json").read_text())
+    assert [trial["trial_id"] for trial in deferred] == [1]
@@ -0,0 +1,37 @@
+import sys
+
+from slurm_utils.execution.worker_pool import WorkerPool, WORKER_FILE
+
+TRIAL_MAIN = """import sys
+
+from absl import app, flags
+
+flags.DEFINE_integer("exit_code", 0, "")
+FLAGS = flags.FLAGS
+
+
+def main(argv):
+    # the worker must not have imported the slurm_utils package, it would delay its start by seconds
+    print("slurm_utils imported:", "slurm_utils" in sys.modules)
+    sys.exit(FLAGS.exit_code)
+"""
+
+
+def test_pool_workers_fork_trials_without_importing_slurm_utils(tmp_path):
+    main_file = tmp_path / "main.py"
+    main_file.write_text(TRIAL_MAIN)
+    pool = WorkerPool(
+        command=[sys.executable, WORKER_FILE, f"--main_file={main_file}"], num_workers=1, log_dir=str(tmp_path / "logs")
+    )
+    try:
+        for run_id, exit_code in [(1, 0), (2, 3)]:
+            flag_file = tmp_path / f"{run_id}.cfg"
+            flag_file.write_text(f"--exit_code={exit_code}\n")
+            output_file = tmp_path / f"{run_id}.out"
+
+            process = pool.submit(run_id, str(flag_file), str(output_file), env={})
+
+            assert process.wait() == exit_code
+            assert "slurm_utils imported: False" in output_file.read_text()
+    finally:
+        pool.close()